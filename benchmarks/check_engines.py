@@ -0,0 +1,57 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pricing.engines import ENGINES, check_engines
+from pricing.synthetic import edge_case_sheets, generate_sheets
+
+
+def build_sheets(args: argparse.Namespace) -> List:
+    sheets = edge_case_sheets(args.seed)
+    for density in args.densities:
+        sheets += generate_sheets(
+            args.sheets,
+            seed=args.seed,
+            coverage=args.coverage,
+            violation_rate=density,
+        )
+    return sheets
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check alternative engines against validate_prices/correct_prices.")
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES), help="Engines to check (default: all)")
+    parser.add_argument("--sheets", type=int, default=2000, help="Random sheets per violation rate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--densities", type=float, nargs="+", default=[0.0, 0.05, 0.5])
+    parser.add_argument("--coverage", type=float, default=0.8, help="Share of slots present per sheet")
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="Allowed relative/absolute price difference")
+    parser.add_argument("--min-speedup", type=float, default=0.0, help="Reject engines slower than this ratio")
+    parser.add_argument("--repeats", type=int, default=3, help="Timing runs per engine (best is kept)")
+    parser.add_argument("--output", default="-", help="JSON report path ('-' for stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    reports = check_engines(build_sheets(args), args.engines, args.tolerance, args.min_speedup, args.repeats)
+
+    text = json.dumps(reports, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+    rejected = [report for report in reports if not report["accepted"]]
+    for report in rejected:
+        for problem in report["problems"]:
+            print(f"REJECTED {report['engine']}: {problem}", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pricing import __version__
+from pricing.correction import project_prices, reset_to_reference
+from pricing.ruleset import CompiledRules
+from pricing.synthetic import generate_sheets, layout_rules
+from pricing.validation import count_violations, validate_prices
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def measure(operation: Callable, sheets: List[Dict[str, float]]) -> Dict:
+
+    latencies = []
+    started = time.perf_counter()
+    for prices in sheets:
+        before = time.perf_counter()
+        operation(prices)
+        latencies.append(time.perf_counter() - before)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "sheets": len(sheets),
+        "seconds": elapsed,
+        "throughput_per_s": len(sheets) / elapsed if elapsed else 0.0,
+        "latency_us": {
+            name: percentile(latencies, fraction) * 1e6
+            for name, fraction in [("p50", 0.50), ("p90", 0.90), ("p99", 0.99), ("max", 1.0)]
+        },
+    }
+
+
+def peak_memory(operation: Callable, sheets: List[Dict[str, float]]) -> int:
+    tracemalloc.start()
+    try:
+        for prices in sheets:
+            operation(prices)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def iteration_stats(sheets: List[Dict[str, float]], rules: CompiledRules) -> Dict:
+    histogram: Dict[int, int] = {}
+    for prices in sheets:
+        _corrected, iterations = reset_to_reference(prices, rules)
+        histogram[iterations] = histogram.get(iterations, 0) + 1
+    total = sum(iterations * count for iterations, count in histogram.items())
+    return {
+        "mean": total / len(sheets) if sheets else 0.0,
+        "max": max(histogram, default=0),
+        "histogram": {str(iterations): histogram[iterations] for iterations in sorted(histogram)},
+    }
+
+
+OPERATIONS = {
+    "validate": validate_prices,
+    "count_violations": count_violations,
+    "correct_reference": reset_to_reference,
+    "correct_projection": project_prices,
+}
+
+
+def run(args: argparse.Namespace) -> Dict:
+
+    # Extra variants and deductibles only count if the rules know about them.
+    rules = layout_rules(args.extra_variants, args.extra_deductibles)
+    results = []
+    for density in args.densities:
+        sheets = list(generate_sheets(
+            args.sheets,
+            seed=args.seed,
+            extra_variants=args.extra_variants,
+            extra_deductibles=args.extra_deductibles,
+            coverage=args.coverage,
+            violation_rate=density,
+        ))
+        memory_sample = sheets[:args.memory_sheets]
+
+        for name, operation in OPERATIONS.items():
+            result = {"operation": name, "violation_rate": density}
+            operation = partial(operation, rules=rules)
+            result.update(measure(operation, sheets))
+            result["peak_memory_bytes"] = peak_memory(operation, memory_sample)
+            if name == "correct_reference":
+                result["iterations"] = iteration_stats(sheets, rules)
+            results.append(result)
+
+    return {
+        "meta": {
+            "version": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "sheets": args.sheets,
+            "coverage": args.coverage,
+            "extra_variants": args.extra_variants,
+            "extra_deductibles": args.extra_deductibles,
+        },
+        "results": results,
+    }
+
+
+def regressions(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+
+    # Throughput drops larger than tolerance (a fraction) versus the baseline.
+    previous = {
+        (result["operation"], result["violation_rate"]): result["throughput_per_s"]
+        for result in baseline["results"]
+    }
+    found = []
+    for result in report["results"]:
+        old = previous.get((result["operation"], result["violation_rate"]))
+        if old and result["throughput_per_s"] < old * (1.0 - tolerance):
+            found.append(
+                f"{result['operation']} @ {result['violation_rate']}: "
+                f"{result['throughput_per_s']:.0f}/s vs {old:.0f}/s"
+            )
+    return found
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark price validation and correction.")
+    parser.add_argument("--sheets", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--densities", type=float, nargs="+", default=[0.0, 0.05, 0.25, 1.0])
+    parser.add_argument("--coverage", type=float, default=1.0, help="Share of slots present per sheet")
+    parser.add_argument("--extra-variants", type=int, default=0)
+    parser.add_argument("--extra-deductibles", type=int, default=0)
+    parser.add_argument("--memory-sheets", type=int, default=200, help="Sheets traced for peak memory")
+    parser.add_argument("--output", default="-", help="JSON report path ('-' for stdout)")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed throughput drop vs baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = run(args)
+
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        found = regressions(report, baseline, args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if found else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
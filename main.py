@@ -1,6 +1,17 @@
-from typing import Dict
+import argparse
+import asyncio
+import os
+import sys
+from typing import Dict, List, Optional
 from pricing.validation import validate_prices
-from pricing.correction import correct_prices
+from pricing.correction import correct_delta
+from pricing.cache import ResultCache
+from pricing.stream import process_stream
+from pricing.parallel import DEFAULT_CHUNK_SIZE, process_stream_parallel
+from pricing.worker import Worker, serve_socket
+from pricing.service import BatchingService, serve
+from pricing.markets import MarketRules
+from pricing.jobs import DEFAULT_SHARD_SIZE, run_job, work
 
 
 def analyze_and_fix_prices(prices: Dict[str, float]) -> Dict[str, float]:
@@ -17,33 +28,138 @@ def analyze_and_fix_prices(prices: Dict[str, float]) -> Dict[str, float]:
         return prices
     
     print("\n2. Applying automatic corrections...")
-    corrected_prices = correct_prices(prices)
+    corrected_prices = dict(prices)
+    delta = correct_delta(corrected_prices, apply=True)
     
     print("\n3. Validating corrected prices...")
-    remaining_issues = validate_prices(corrected_prices)
-    
-    if remaining_issues:
+    if delta.valid:
+        print(" All issues resolved!")
+    else:
+        remaining_issues = validate_prices(corrected_prices)
         print(f"\n   Still {len(remaining_issues)} issue(s) remaining:")
         for i, issue in enumerate(remaining_issues, 1):
             print(f"   {i}. {issue}")
-    else:
-        print(" All issues resolved!")
     
     print("\n4. Price changes:")
-    changes_made = False
-    for key in prices:
-        if prices[key] != corrected_prices[key]:
-            changes_made = True
-            print(f"   {key}: {prices[key]:.2f} → {corrected_prices[key]:.2f}")
+    for change in delta.changes:
+        print(f"   {change.key}: {change.old:.2f} → {change.new:.2f}")
     
-    if not changes_made:
+    if not delta.changes:
         print(" No changes needed")
     
     
     return corrected_prices
 
 
-if __name__ == "__main__":
+def _open(path: str, mode: str):
+    # Input is decoded with surrogateescape, so a line that is not UTF-8
+    # becomes an error record instead of stopping the run.
+    if path == "-":
+        if mode == "r":
+            sys.stdin.reconfigure(errors="surrogateescape")
+            return sys.stdin
+        return sys.stdout
+    errors = "surrogateescape" if mode == "r" else "strict"
+    return open(path, mode, encoding="utf-8", errors=errors, buffering=1 << 20)
+
+
+def run_stream(args: argparse.Namespace) -> None:
+    infile = _open(args.input, "r")
+    outfile = _open(args.output, "w")
+    try:
+        correct = not args.validate_only
+        if args.workers == 1:
+            cache = ResultCache(args.cache_size) if args.cache_size > 0 else None
+            process_stream(infile, outfile, correct=correct, strategy=args.strategy, cache=cache)
+        else:
+            process_stream_parallel(
+                infile, outfile,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                correct=correct,
+                strategy=args.strategy,
+                cache_size=args.cache_size,
+            )
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+
+
+def run_service(args: argparse.Namespace) -> None:
+    service = BatchingService(
+        max_batch_size=args.max_batch_size,
+        max_latency=args.max_latency_ms / 1000,
+        concurrency=args.workers or os.cpu_count() or 1,
+        processes=True,
+        strategy=args.strategy,
+        markets=MarketRules(args.markets) if args.markets else None,
+    )
+    try:
+        asyncio.run(serve(service, path=args.socket, port=args.port or 0))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_batch_job(args: argparse.Namespace) -> None:
+    outfile = _open(args.output, "w")
+    try:
+        run_job(
+            args.input, args.job_dir, outfile,
+            workers=args.workers or os.cpu_count() or 1,
+            shard_size=args.shard_size,
+            correct=not args.validate_only,
+            strategy=args.strategy,
+            host=args.host,
+            port=args.port or 0,
+            cache_size=args.cache_size,
+        )
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
+
+
+def join_job(args: argparse.Namespace) -> None:
+    host, _separator, port = args.join.rpartition(":")
+    work(host or "127.0.0.1", int(port), cache_size=args.cache_size)
+
+
+def run_worker(args: argparse.Namespace) -> None:
+    markets = MarketRules(args.markets) if args.markets else None
+    worker = Worker(cache_size=args.cache_size, strategy=args.strategy, markets=markets)
+    if args.socket:
+        serve_socket(args.socket, worker)
+    else:
+        # A request that is not UTF-8 gets an error response, as on a socket.
+        sys.stdin.reconfigure(errors="surrogateescape")
+        worker.serve(sys.stdin, sys.stdout)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Validate and correct insurance price sheets.")
+    parser.add_argument("--input", help="JSONL file with one price sheet per line ('-' for stdin)")
+    parser.add_argument("--output", default="-", help="JSONL file for results ('-' for stdout)")
+    parser.add_argument("--validate-only", action="store_true", help="Only report issues, do not correct")
+    parser.add_argument("--strategy", default="reference", choices=["reference", "projection", "component"])
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Sheets per worker task")
+    parser.add_argument("--cache-size", type=int, default=0, help="Cache results of up to N distinct sheets")
+    parser.add_argument("--serve", action="store_true", help="Answer JSON requests on stdin until EOF")
+    parser.add_argument("--socket", help="Answer JSON requests on this Unix socket")
+    parser.add_argument("--port", type=int, help="Serve micro-batched requests on this local TCP port")
+    parser.add_argument("--batching", action="store_true", help="Micro-batch requests on --socket (asyncio service)")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="Requests per micro-batch")
+    parser.add_argument("--markets", help="Directory of per-market rule configs (<market>.json)")
+    parser.add_argument("--job-dir", help="Run --input as a resumable sharded job with checkpoints in this directory")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Input lines per job shard")
+    parser.add_argument("--host", default="127.0.0.1", help="Address the job coordinator listens on")
+    parser.add_argument("--join", metavar="HOST:PORT", help="Work on the shards of a running job")
+    parser.add_argument("--max-latency-ms", type=float, default=2.0, help="Longest wait before a batch is sent")
+    return parser.parse_args(argv)
+
+
+def run_example() -> Dict[str, float]:
     example_prices = {
         "mtpl": 400,
         "limited_casco_compact_100": 820,
@@ -72,4 +188,20 @@ if __name__ == "__main__":
         "casco_premium_500": 780
     }
     
-    corrected = analyze_and_fix_prices(example_prices)
\ No newline at end of file
+    return analyze_and_fix_prices(example_prices)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.join:
+        join_job(args)
+    elif args.job_dir and args.input:
+        run_batch_job(args)
+    elif args.port or (args.socket and args.batching):
+        run_service(args)
+    elif args.serve or args.socket:
+        run_worker(args)
+    elif args.input:
+        run_stream(args)
+    else:
+        run_example()
\ No newline at end of file
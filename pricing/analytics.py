@@ -0,0 +1,431 @@
+import math
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from pricing.parallel import imap_chunks
+from pricing.ruleset import RULE_FAMILIES, CompiledRules, active_constraints, compile_rules, is_present, slot_values
+from pricing.validation import Violation
+
+
+DEFAULT_ACCURACY = 0.01
+MAX_BUCKETS = 2048
+QUANTILES = [("p50", 0.50), ("p90", 0.90), ("p99", 0.99)]
+STATS_CHUNK_SIZE = 4096
+
+
+class QuantileSketch:
+
+    # Log-bucketed histogram: a value x > 0 falls in bucket ceil(log_g(x))
+    # with g = (1 + a) / (1 - a), so any quantile is returned within relative
+    # error a. Negative values use a mirrored set of buckets. Merging adds
+    # bucket counts, so sketches from different workers combine exactly.
+    # Once a side holds more than max_buckets buckets, the smallest ones are
+    # folded together, which only loses precision right next to zero.
+
+    def __init__(self, relative_accuracy: float = DEFAULT_ACCURACY, max_buckets: int = MAX_BUCKETS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be between 0 and 1: {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+
+    def _bucket(self, magnitude: float) -> int:
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, bucket: int) -> float:
+        return 2 * self._gamma ** bucket / (self._gamma + 1)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value > 0:
+            store = self.positive
+        elif value < 0:
+            store, value = self.negative, -value
+        else:
+            self.zero += 1
+            return
+        bucket = self._bucket(value)
+        store[bucket] = store.get(bucket, 0) + 1
+        if len(store) > self.max_buckets:
+            self._collapse(store)
+
+    def _collapse(self, store: Dict[int, int]) -> None:
+        buckets = sorted(store)
+        excess = len(buckets) - self.max_buckets
+        target = buckets[excess]
+        for bucket in buckets[:excess]:
+            store[target] += store.pop(bucket)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for bucket, count in other_store.items():
+                store[bucket] = store.get(bucket, 0) + count
+            if len(store) > self.max_buckets:
+                self._collapse(store)
+        self.zero += other.zero
+        self.count += other.count
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "positive": sorted(self.positive.items()),
+            "negative": sorted(self.negative.items()),
+            "zero": self.zero,
+            "count": self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"], data["max_buckets"])
+        sketch.positive = {int(bucket): count for bucket, count in data["positive"]}
+        sketch.negative = {int(bucket): count for bucket, count in data["negative"]}
+        sketch.zero = data["zero"]
+        sketch.count = data["count"]
+        return sketch
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = fraction * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.negative, reverse=True):
+            seen += self.negative[bucket]
+            if seen > rank:
+                return -self._value(bucket)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for bucket in sorted(self.positive):
+            seen += self.positive[bucket]
+            if seen > rank:
+                return self._value(bucket)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+
+class Summary:
+
+    # Count, mean, variance (Welford, merged with Chan's formula), exact
+    # min/max and approximate quantiles of a stream of numbers.
+
+    def __init__(self, relative_accuracy: float = DEFAULT_ACCURACY):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sketch.add(value)
+
+    def merge(self, other: "Summary") -> "Summary":
+        if other.count:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self._m2 += other._m2 + delta * delta * self.count * other.count / count
+            self.mean += delta * other.count / count
+            self.count = count
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self._m2,
+            "min": self.min,
+            "max": self.max,
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Summary":
+        summary = cls()
+        summary.count = data["count"]
+        summary.mean = data["mean"]
+        summary._m2 = data["m2"]
+        summary.min = data["min"]
+        summary.max = data["max"]
+        summary.sketch = QuantileSketch.from_dict(data["sketch"])
+        return summary
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def result(self) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        result = {
+            "count": self.count,
+            "mean": self.mean,
+            "variance": self.variance,
+            "std": math.sqrt(self.variance),
+            "min": self.min,
+        }
+        for name, fraction in QUANTILES:
+            # Bucket midpoints can stray past the exact extremes.
+            result[name] = min(max(self.sketch.quantile(fraction), self.min), self.max)
+        result["max"] = self.max
+        return result
+
+
+class _Counts:
+
+    def __init__(self, relative_accuracy: float):
+        self.checked = 0
+        self.violations = 0
+        self.gap = Summary(relative_accuracy)
+
+    def merge(self, other: "_Counts") -> None:
+        self.checked += other.checked
+        self.violations += other.violations
+        self.gap.merge(other.gap)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"checked": self.checked, "violations": self.violations, "gap": self.gap.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "_Counts":
+        counts = cls(DEFAULT_ACCURACY)
+        counts.checked = data["checked"]
+        counts.violations = data["violations"]
+        counts.gap = Summary.from_dict(data["gap"])
+        return counts
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "checked": self.checked,
+            "violations": self.violations,
+            "rate": self.violations / self.checked if self.checked else 0.0,
+            "gap": self.gap.result(),
+        }
+
+
+class PortfolioStats:
+
+    # Validates sheets and keeps online statistics about them in memory that
+    # depends on the catalog, not on the number of sheets:
+    #   per rule family: constraints checked, violations, and the gap of each
+    #     violation (how far the lower price is at or above the higher one)
+    #   per slot: sheets where it was priced and took part in a violation,
+    #     the gaps of those violations, and its drift from the reference price
+    # Aggregates built over different parts of a portfolio (e.g. by workers)
+    # merge into the same numbers a single pass would give, up to the
+    # relative accuracy of the quantiles. add() checks the rules itself;
+    # add_violations() records what validation already found, which is how
+    # analyze_sheet, the streams and batch jobs feed a stats sink.
+
+    def __init__(
+        self,
+        rules: Optional[CompiledRules] = None,
+        missing: str = "skip",
+        relative_accuracy: float = DEFAULT_ACCURACY
+    ):
+        self.rules = rules or compile_rules()
+        self.missing = missing
+        self.relative_accuracy = relative_accuracy
+        self.sheets = 0
+        self.invalid_sheets = 0
+        self.families = {family: _Counts(relative_accuracy) for family in RULE_FAMILIES}
+        self.slots = [_Counts(relative_accuracy) for _ in self.rules.keys]
+        self.drift = [Summary(relative_accuracy) for _ in self.rules.keys]
+
+    def empty(self) -> "PortfolioStats":
+        # A fresh aggregate with the same settings, for a worker to fill and
+        # merge back.
+        return PortfolioStats(self.rules, self.missing, self.relative_accuracy)
+
+    def add(self, prices: Dict[str, float]) -> int:
+        # Returns the number of violations found in the sheet.
+        return self.add_values(slot_values(prices, self.rules))
+
+    def add_violations(self, prices: Dict[str, float], violations: Sequence[Violation]) -> int:
+
+        # prices must already have passed validation under self.rules with
+        # missing="skip", and violations are what find_violations returned.
+        # Only the constraints around priced slots are visited to count the
+        # checks; nothing is compared again.
+        if self.missing != "skip":
+            return self.add(prices)
+
+        rules = self.rules
+        reference = rules.reference
+        constraints = rules.constraints
+        families = self.families
+        slots = self.slots
+
+        present = set()
+        for key, price in prices.items():
+            if is_present(price):
+                slot = rules.slots[key]
+                present.add(slot)
+                slots[slot].checked += 1
+                self.drift[slot].add(price - reference[slot])
+
+        for slot in present:
+            for index in rules.touching[slot]:
+                lower, higher, family = constraints[index]
+                if lower == slot and higher in present:
+                    families[family].checked += 1
+
+        violated_slots = set()
+        for violation in violations:
+            lower, higher, family = violation.constraint
+            gap = violation.lower_price - violation.higher_price
+            counts = families[family]
+            counts.violations += 1
+            counts.gap.add(gap)
+            slots[lower].gap.add(gap)
+            slots[higher].gap.add(gap)
+            violated_slots.add(lower)
+            violated_slots.add(higher)
+
+        for slot in violated_slots:
+            slots[slot].violations += 1
+        self.sheets += 1
+        if violations:
+            self.invalid_sheets += 1
+        return len(violations)
+
+    def add_values(self, values: List[float]) -> int:
+        reference = self.rules.reference
+        families = self.families
+        slots = self.slots
+        violated_slots = set()
+        violations = 0
+
+        for slot, price in enumerate(values):
+            if is_present(price):
+                slots[slot].checked += 1
+                self.drift[slot].add(price - reference[slot])
+
+        for lower, higher, family in active_constraints(self.rules, values, self.missing):
+            lower_price, higher_price = values[lower], values[higher]
+            if not (is_present(lower_price) and is_present(higher_price)):
+                continue
+            counts = families[family]
+            counts.checked += 1
+            if lower_price >= higher_price:
+                gap = lower_price - higher_price
+                counts.violations += 1
+                counts.gap.add(gap)
+                slots[lower].gap.add(gap)
+                slots[higher].gap.add(gap)
+                violated_slots.add(lower)
+                violated_slots.add(higher)
+                violations += 1
+
+        for slot in violated_slots:
+            slots[slot].violations += 1
+        self.sheets += 1
+        if violations:
+            self.invalid_sheets += 1
+        return violations
+
+    def merge(self, other: "PortfolioStats") -> "PortfolioStats":
+        if other.rules.config != self.rules.config or other.missing != self.missing:
+            raise ValueError("Cannot merge statistics built with different rules")
+        self.sheets += other.sheets
+        self.invalid_sheets += other.invalid_sheets
+        for family, counts in other.families.items():
+            self.families[family].merge(counts)
+        for mine, theirs in zip(self.slots, other.slots):
+            mine.merge(theirs)
+        for mine, theirs in zip(self.drift, other.drift):
+            mine.merge(theirs)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        # JSON-ready partial aggregate, e.g. for a batch job shard. The rules
+        # are not included; from_dict is given the same rules again.
+        return {
+            "missing": self.missing,
+            "relative_accuracy": self.relative_accuracy,
+            "sheets": self.sheets,
+            "invalid_sheets": self.invalid_sheets,
+            "families": {family: counts.to_dict() for family, counts in self.families.items()},
+            "slots": [counts.to_dict() for counts in self.slots],
+            "drift": [summary.to_dict() for summary in self.drift],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], rules: Optional[CompiledRules] = None) -> "PortfolioStats":
+        stats = cls(rules, data["missing"], data["relative_accuracy"])
+        if len(data["slots"]) != len(stats.rules.keys):
+            raise ValueError("Statistics were built for a different catalog")
+        stats.sheets = data["sheets"]
+        stats.invalid_sheets = data["invalid_sheets"]
+        stats.families = {family: _Counts.from_dict(counts) for family, counts in data["families"].items()}
+        stats.slots = [_Counts.from_dict(counts) for counts in data["slots"]]
+        stats.drift = [Summary.from_dict(summary) for summary in data["drift"]]
+        return stats
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "sheets": self.sheets,
+            "invalid_sheets": self.invalid_sheets,
+            "families": {family: counts.result() for family, counts in self.families.items()},
+            "slots": {
+                key: {
+                    "priced": counts.checked,
+                    "violated_sheets": counts.violations,
+                    "rate": counts.violations / counts.checked if counts.checked else 0.0,
+                    "gap": counts.gap.result(),
+                    "drift": drift.result(),
+                }
+                for key, counts, drift in zip(self.rules.keys, self.slots, self.drift)
+                if counts.checked
+            },
+        }
+
+
+def _stats_chunk(
+    sheets: List[Dict[str, float]],
+    rules: Optional[CompiledRules],
+    missing: str,
+    relative_accuracy: float
+) -> List[PortfolioStats]:
+    stats = PortfolioStats(rules, missing, relative_accuracy)
+    for prices in sheets:
+        stats.add(prices)
+    return [stats]
+
+
+def collect_stats(
+    sheets: Iterable[Dict[str, float]],
+    workers: Optional[int] = 1,
+    chunk_size: int = STATS_CHUNK_SIZE,
+    missing: str = "skip",
+    relative_accuracy: float = DEFAULT_ACCURACY,
+    rules: Optional[CompiledRules] = None
+) -> PortfolioStats:
+
+    # Each worker aggregates whole chunks; the partial aggregates are merged
+    # as they come back, so memory stays bounded for any portfolio size.
+    # This is its own pass over the sheets, separate from process_stream.
+    rules = rules or compile_rules()
+    function = partial(_stats_chunk, rules=rules, missing=missing, relative_accuracy=relative_accuracy)
+    total = PortfolioStats(rules, missing, relative_accuracy)
+    for part in imap_chunks(function, sheets, workers, chunk_size):
+        total.merge(part)
+    return total
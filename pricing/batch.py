@@ -0,0 +1,202 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from pricing.correction import MAX_ITERATIONS
+from pricing.ruleset import (
+    CompiledRules,
+    DEDUCTIBLE,
+    HIERARCHY,
+    VARIANT,
+    check_missing_policy,
+    compile_bridges,
+    compile_rules,
+    key_slot,
+)
+
+
+HIERARCHY_VIOLATION = 1
+VARIANT_VIOLATION = 2
+DEDUCTIBLE_VIOLATION = 4
+
+FAMILY_FLAGS = {
+    HIERARCHY: HIERARCHY_VIOLATION,
+    VARIANT: VARIANT_VIOLATION,
+    DEDUCTIBLE: DEDUCTIBLE_VIOLATION,
+}
+
+
+def pack_sheets(
+    sheets: Iterable[Dict[str, float]],
+    rules: Optional[CompiledRules] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    # One row per sheet, one column per slot of the compiled layout.
+    rules = rules or compile_rules()
+    sheets = list(sheets)
+    values = np.full((len(sheets), len(rules.keys)), np.nan)
+    slots = rules.slots
+
+    for i, prices in enumerate(sheets):
+        row = values[i]
+        for key, price in prices.items():
+            slot = slots.get(key)
+            if slot is None:
+                slot = key_slot(key, rules)
+            row[slot] = price
+
+    return values, ~np.isnan(values)
+
+
+def constraint_columns(rules: CompiledRules, missing: str) -> Tuple[np.ndarray, np.ndarray, List[str], List]:
+
+    # One column per compiled constraint, then (for "nearest") one per bridge
+    # across missing slots, with the gap slots each bridge needs to be empty.
+    check_missing_policy(missing)
+    constraints = list(rules.constraints)
+    gaps: List = [None] * len(constraints)
+    if missing == "nearest":
+        bridges = compile_bridges(rules)
+        constraints += bridges
+        gaps += [bridge.gap_slots for bridge in bridges]
+
+    lower = np.fromiter((c.lower for c in constraints), dtype=np.intp, count=len(constraints))
+    higher = np.fromiter((c.higher for c in constraints), dtype=np.intp, count=len(constraints))
+    return lower, higher, [c.family for c in constraints], gaps
+
+
+def applicable_matrix(present: np.ndarray, lower: np.ndarray, higher: np.ndarray, gaps: List) -> np.ndarray:
+
+    # sheets x columns: both ends present and, for bridges, the gap empty.
+    applicable = present[:, lower] & present[:, higher]
+    bridged = [column for column, gap in enumerate(gaps) if gap is not None]
+    if bridged:
+        gap_matrix = np.zeros((present.shape[1], len(bridged)), dtype=np.int32)
+        for position, column in enumerate(bridged):
+            gap_matrix[list(gaps[column]), position] = 1
+        gap_filled = (present.astype(np.int32) @ gap_matrix) > 0
+        applicable[:, bridged] &= ~gap_filled
+    return applicable
+
+
+def violation_matrix(
+    values: np.ndarray,
+    present: np.ndarray,
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> np.ndarray:
+
+    # sheets x constraints boolean matrix, one column per compiled constraint
+    # (followed by one per bridge with missing="nearest").
+    rules = rules or compile_rules()
+    lower, higher, _families, gaps = constraint_columns(rules, missing)
+    return (values[:, lower] >= values[:, higher]) & applicable_matrix(present, lower, higher, gaps)
+
+
+def validate_packed(
+    values: np.ndarray,
+    present: np.ndarray,
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    rules = rules or compile_rules()
+    _lower, _higher, families, _gaps = constraint_columns(rules, missing)
+    violated = violation_matrix(values, present, rules, missing)
+
+    counts = violated.sum(axis=1)
+    flags = np.zeros(len(values), dtype=np.int64)
+    for family, flag in FAMILY_FLAGS.items():
+        columns = [column for column, column_family in enumerate(families) if column_family == family]
+        flags |= violated[:, columns].any(axis=1) * flag
+
+    return counts, flags
+
+
+def validate_batch(
+    sheets: Iterable[Dict[str, float]],
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> Tuple[np.ndarray, np.ndarray]:
+    values, present = pack_sheets(sheets, rules)
+    return validate_packed(values, present, rules, missing)
+
+
+def describe_flags(flags: int) -> List[str]:
+    return [family for family, flag in FAMILY_FLAGS.items() if flags & flag]
+
+
+def reset_rows(
+    values: np.ndarray,
+    applicable: np.ndarray,
+    lower: np.ndarray,
+    higher: np.ndarray,
+    reference: np.ndarray,
+    max_iterations: int = MAX_ITERATIONS
+) -> np.ndarray:
+
+    # The reference-reset loop over rows of values. reference is one table
+    # for every row, or one row of reference prices per row of values. Only
+    # rows that still violate a rule are revisited in later rounds.
+    corrected = values.copy()
+    active = np.arange(len(values))
+
+    for _ in range(max_iterations):
+        rows = corrected[active]
+        violated = (rows[:, lower] >= rows[:, higher]) & applicable
+
+        still_active = violated.any(axis=1)
+        if not still_active.any():
+            break
+        active = active[still_active]
+        applicable = applicable[still_active]
+        violated = violated[still_active]
+
+        reset = np.zeros((len(active), values.shape[1]), dtype=bool)
+        hit_rows, hit_constraints = np.nonzero(violated)
+        reset[hit_rows, lower[hit_constraints]] = True
+        reset[hit_rows, higher[hit_constraints]] = True
+
+        row_reference = reference if reference.ndim == 1 else reference[active]
+        corrected[active] = np.where(reset, row_reference, corrected[active])
+
+    return corrected
+
+
+def correct_packed(
+    values: np.ndarray,
+    present: np.ndarray,
+    rules: Optional[CompiledRules] = None,
+    max_iterations: int = MAX_ITERATIONS,
+    missing: str = "skip"
+) -> np.ndarray:
+
+    # Reference-reset correction for a whole batch; row for row the same
+    # result as correct_prices. Presence does not change during correction,
+    # so which constraints apply to each row is worked out once.
+    rules = rules or compile_rules()
+    lower, higher, _families, gaps = constraint_columns(rules, missing)
+    reference = np.asarray(rules.reference, dtype=values.dtype)
+    applicable = applicable_matrix(present, lower, higher, gaps)
+    return reset_rows(values, applicable, lower, higher, reference, max_iterations)
+
+
+def correct_batch(
+    sheets: Iterable[Dict[str, float]],
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> List[Dict[str, float]]:
+
+    rules = rules or compile_rules()
+    sheets = list(sheets)
+    values, present = pack_sheets(sheets, rules)
+    corrected = correct_packed(values, present, rules, missing=missing)
+
+    results = []
+    for i, prices in enumerate(sheets):
+        result = dict(prices)
+        for slot in np.flatnonzero(corrected[i] != values[i]):
+            if present[i, slot]:
+                result[rules.keys[slot]] = float(corrected[i, slot])
+        results.append(result)
+    return results
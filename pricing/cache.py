@@ -0,0 +1,97 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from pricing.correction import correct_prices
+from pricing.ruleset import CompiledRules, rules_signature
+from pricing.validation import validate_prices
+
+
+def sheet_fingerprint(prices: Dict[str, float]) -> bytes:
+
+    # Key order does not matter, but 870 and 870.0 are different sheets
+    # because their issue messages differ.
+    canonical = json.dumps(prices, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+
+class ResultCache:
+
+    # Opt-in LRU cache of validation and correction results keyed by sheet
+    # fingerprint. Entries are dropped when the values in rules.py change;
+    # results for explicitly passed rules are keyed by their config as well.
+
+    def __init__(self, maxsize: int = 10000):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be positive: {maxsize}")
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._signature = rules_signature()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_rules(self) -> None:
+        signature = rules_signature()
+        if signature != self._signature:
+            self._signature = signature
+            self._entries.clear()
+            self.invalidations += 1
+
+    def _lookup(self, key: Hashable) -> Optional[Any]:
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def _store(self, key: Hashable, result: Any) -> None:
+        self._entries[key] = result
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def validate(self, prices: Dict[str, float], rules: Optional[CompiledRules] = None) -> Tuple[str, ...]:
+        self._check_rules()
+        key = ("validate", rules and rules.config, sheet_fingerprint(prices))
+
+        issues = self._lookup(key)
+        if issues is None:
+            issues = tuple(validate_prices(prices, rules))
+            self._store(key, issues)
+        return issues
+
+    def correct(
+        self,
+        prices: Dict[str, float],
+        strategy: str = "reference",
+        rules: Optional[CompiledRules] = None
+    ) -> Dict[str, float]:
+        self._check_rules()
+        key = ("correct", strategy, rules and rules.config, sheet_fingerprint(prices))
+
+        corrected = self._lookup(key)
+        if corrected is None:
+            corrected = tuple(correct_prices(prices, strategy, rules).items())
+            self._store(key, corrected)
+        return dict(corrected)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,12 +1,13 @@
-from typing import Dict, Optional
-from pricing.parsing import parse_price_key, build_structured
-from pricing.validation import validate_prices
-from pricing.rules import (
-    REFERENCE_PRICES,
-    VARIANT_STEP_PERCENT,
-    DEDUCTIBLE_STEP_PERCENT,
-    VARIANT_ORDER,
-    DEDUCTIBLE_ORDER,
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from pricing import instrumentation
+from pricing.ruleset import (
+    CompiledRules,
+    Constraint,
+    active_constraints,
+    compile_rules,
+    is_present,
+    reference_price,
+    slot_values,
 )
 
 
@@ -15,139 +16,370 @@ def calculate_reference_price(
     variant: Optional[str],
     deductible: Optional[int]
 ) -> float:
-    
-    base_price = REFERENCE_PRICES.get(product, 700)
-    
-    if variant is None or deductible is None:
-        return base_price
-
-
-    if variant in ["compact", "basic"]:
-        variant_multiplier = 1.0
-    elif variant == "comfort":
-        variant_multiplier = 1.0 + VARIANT_STEP_PERCENT
-    elif variant == "premium":
-        variant_multiplier = 1.0 + 2 * VARIANT_STEP_PERCENT
-    else:
-        variant_multiplier = 1.0
-    
-
-    if deductible == 100:
-        deductible_multiplier = 1.0
-    elif deductible == 200:
-        deductible_multiplier = 1.0 - DEDUCTIBLE_STEP_PERCENT
-    elif deductible == 500:
-        deductible_multiplier = 1.0 - 2 * DEDUCTIBLE_STEP_PERCENT
-    else:
-        deductible_multiplier = 1.0
-    
-    return base_price * variant_multiplier * deductible_multiplier
 
+    # Correction itself reads the precomputed CompiledRules.reference table.
+    return reference_price(product, variant, deductible)
+
+
+def correct_prices(
+    prices: Dict[str, float],
+    strategy: str = "reference",
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> Dict[str, float]:
+
+    if strategy == "projection":
+        return project_prices(prices, rules=rules, missing=missing)
+    if strategy == "component":
+        corrected, _components = repair_components(prices, rules, missing)
+        return corrected
+    if strategy != "reference":
+        raise ValueError(f"Unknown correction strategy: {strategy}")
+
+    corrected, _iterations = reset_to_reference(prices, rules, missing=missing)
+    return corrected
+
+
+MAX_ITERATIONS = 10
+
+
+class Change(NamedTuple):
+    key: str
+    old: float
+    new: float
+    rule: Optional[str]
+
+
+class CorrectionDelta(NamedTuple):
+    changes: List[Change]
+    valid: bool
+
+
+def _reference_pass(
+    values: List[float],
+    rules: CompiledRules,
+    max_iterations: int,
+    constraints: Sequence[Constraint]
+) -> Tuple[Dict[int, str], int, bool]:
+
+    # Resets slots of violated constraints to the reference table in place.
+    # Returns the family of the rule that first triggered each reset slot,
+    # the number of rounds that reset prices, and whether the result is valid.
+    triggered: Dict[int, str] = {}
+    keys_reset: List[int] = []
+    converged = False
 
-def correct_prices(prices: Dict[str, float]) -> Dict[str, float]:
-   
-    corrected = prices.copy()
-    max_iterations = 10
-    
     for _ in range(max_iterations):
-       
-        issues = validate_prices(corrected)
-        
-        if not issues:
-            break
-       
-        structured = build_structured(corrected)
-        keys_to_correct = set()
-        
-        
-        mtpl_price = structured.get("mtpl", {}).get(None, {}).get(None)
-        
-        if mtpl_price is not None and "limited_casco" in structured:
-            for variant in structured["limited_casco"]:
-                for deductible, lc_price in structured["limited_casco"][variant].items():
-                    if mtpl_price >= lc_price:
-                        keys_to_correct.add("mtpl")
-                        keys_to_correct.add(f"limited_casco_{variant}_{deductible}")
-        
-
-        if "limited_casco" in structured and "casco" in structured:
-            for variant in VARIANT_ORDER:
-                if variant not in structured["limited_casco"] or variant not in structured["casco"]:
-                    continue
-                
-                for deductible in DEDUCTIBLE_ORDER:
-                    lc_price = structured["limited_casco"][variant].get(deductible)
-                    casco_price = structured["casco"][variant].get(deductible)
-                    
-                    if lc_price is not None and casco_price is not None:
-                        if lc_price >= casco_price:
-                            keys_to_correct.add(f"limited_casco_{variant}_{deductible}")
-                            keys_to_correct.add(f"casco_{variant}_{deductible}")
-        
-
-        
-        for product in ["limited_casco", "casco"]:
-            if product not in structured:
-                continue
-            
-            for deductible in DEDUCTIBLE_ORDER:
-                compact = structured[product].get("compact", {}).get(deductible)
-                basic = structured[product].get("basic", {}).get(deductible)
-                comfort = structured[product].get("comfort", {}).get(deductible)
-                premium = structured[product].get("premium", {}).get(deductible)
-                
-                
-                if compact is not None and comfort is not None:
-                    if compact >= comfort:
-                        keys_to_correct.add(f"{product}_compact_{deductible}")
-                        keys_to_correct.add(f"{product}_comfort_{deductible}")
-                
-                
-                if basic is not None and comfort is not None:
-                    if basic >= comfort:
-                        keys_to_correct.add(f"{product}_basic_{deductible}")
-                        keys_to_correct.add(f"{product}_comfort_{deductible}")
-                
-                
-                if comfort is not None and premium is not None:
-                    if comfort >= premium:
-                        keys_to_correct.add(f"{product}_comfort_{deductible}")
-                        keys_to_correct.add(f"{product}_premium_{deductible}")
-        
-  
-        
-        for product in ["limited_casco", "casco"]:
-            if product not in structured:
-                continue
-            
-            for variant in VARIANT_ORDER:
-                if variant not in structured[product]:
-                    continue
-                
-                p100 = structured[product][variant].get(100)
-                p200 = structured[product][variant].get(200)
-                p500 = structured[product][variant].get(500)
-                
-               
-                if p100 is not None and p200 is not None:
-                    if p100 <= p200:
-                        keys_to_correct.add(f"{product}_{variant}_100")
-                        keys_to_correct.add(f"{product}_{variant}_200")
-                
-                
-                if p200 is not None and p500 is not None:
-                    if p200 <= p500:
-                        keys_to_correct.add(f"{product}_{variant}_200")
-                        keys_to_correct.add(f"{product}_{variant}_500")
-        
-
-        
-        if not keys_to_correct:
+
+        slots_to_correct: Dict[int, str] = {}
+
+        for lower, higher, family in constraints:
+            if values[lower] >= values[higher]:
+                slots_to_correct.setdefault(lower, family)
+                slots_to_correct.setdefault(higher, family)
+
+        if not slots_to_correct:
+            converged = True
             break
-        
-        for key in keys_to_correct:
-            product, variant, deductible = parse_price_key(key)
-            corrected[key] = calculate_reference_price(product, variant, deductible)
-    
+
+        keys_reset.append(len(slots_to_correct))
+        for slot, family in slots_to_correct.items():
+            values[slot] = rules.reference[slot]
+            triggered.setdefault(slot, family)
+
+    if not converged:
+        converged = not any(values[lower] >= values[higher] for lower, higher, _family in constraints)
+
+    stats = instrumentation.current()
+    if stats is not None:
+        stats.record_correction("reference", keys_reset, converged)
+
+    return triggered, len(keys_reset), converged
+
+
+def reset_to_reference(
+    prices: Dict[str, float],
+    rules: Optional[CompiledRules] = None,
+    max_iterations: int = MAX_ITERATIONS,
+    missing: str = "skip"
+) -> Tuple[Dict[str, float], int]:
+
+    # Returns the corrected prices and the number of rounds that reset prices.
+    rules = rules or compile_rules()
+    values = slot_values(prices, rules)
+    constraints = active_constraints(rules, values, missing)
+    triggered, iterations, _converged = _reference_pass(values, rules, max_iterations, constraints)
+
+    corrected = prices.copy()
+    for slot in triggered:
+        corrected[rules.keys[slot]] = values[slot]
+
+    return corrected, iterations
+
+
+def _find(parent: Dict[int, int], slot: int) -> int:
+    parent.setdefault(slot, slot)
+    while parent[slot] != slot:
+        parent[slot] = parent[parent[slot]]
+        slot = parent[slot]
+    return slot
+
+
+def _union(parent: Dict[int, int], first: int, second: int) -> None:
+    first, second = _find(parent, first), _find(parent, second)
+    if first != second:
+        parent[second] = first
+
+
+def repair_violated(
+    values: List[float],
+    rules: CompiledRules,
+    constraints: Sequence[Constraint],
+    touching: Sequence[Sequence[int]],
+    violated: Iterable[int]
+) -> Tuple[Dict[int, str], int, bool]:
+
+    # Groups the slots of the violated constraints into connected components
+    # (union-find) and repairs each one on its own: its slots go back to the
+    # reference table, then only the constraints on its boundary are checked.
+    # A neighbour that now breaks a rule joins the component and the boundary
+    # moves out one step. Untouched parts of the sheet are never revisited.
+    # Returns the family that pulled in each reset slot, the number of
+    # components and whether every touched constraint now holds.
+    parent: Dict[int, int] = {}
+    triggered: Dict[int, str] = {}
+    for index in violated:
+        lower, higher, family = constraints[index]
+        triggered.setdefault(lower, family)
+        triggered.setdefault(higher, family)
+        _union(parent, lower, higher)
+
+    components: Dict[int, List[int]] = {}
+    for slot in triggered:
+        components.setdefault(_find(parent, slot), []).append(slot)
+
+    reference = rules.reference
+    checked: List[int] = []
+    for frontier in components.values():
+        while frontier:
+            for slot in frontier:
+                values[slot] = reference[slot]
+            grown = []
+            for slot in frontier:
+                for index in touching[slot]:
+                    lower, higher, family = constraints[index]
+                    other = higher if lower == slot else lower
+                    checked.append(index)
+                    # Slots already pulled into any component end up at
+                    # their reference price, which satisfies the rule.
+                    if other in triggered:
+                        continue
+                    if values[lower] >= values[higher]:
+                        triggered[other] = family
+                        grown.append(other)
+            frontier = grown
+
+    converged = not any(
+        values[constraints[index].lower] >= values[constraints[index].higher] for index in checked
+    )
+
+    stats = instrumentation.current()
+    if stats is not None:
+        stats.record_correction("component", [len(triggered)] if triggered else [], converged)
+
+    return triggered, len(components), converged
+
+
+def _component_inputs(
+    values: List[float],
+    rules: CompiledRules,
+    missing: str
+) -> Tuple[Sequence[Constraint], Sequence[Sequence[int]]]:
+
+    constraints = active_constraints(rules, values, missing)
+    if constraints is rules.constraints:
+        return constraints, rules.touching
+    touching: List[List[int]] = [[] for _ in rules.keys]
+    for index, (lower, higher, _family) in enumerate(constraints):
+        touching[lower].append(index)
+        touching[higher].append(index)
+    return constraints, touching
+
+
+def repair_components(
+    prices: Dict[str, float],
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> Tuple[Dict[str, float], int]:
+
+    # Returns the corrected prices and the number of violation components.
+    # Whenever reset_to_reference converges, both give the same prices.
+    rules = rules or compile_rules()
+    values = slot_values(prices, rules)
+    constraints, touching = _component_inputs(values, rules, missing)
+    violated = [
+        index for index, (lower, higher, _family) in enumerate(constraints)
+        if values[lower] >= values[higher]
+    ]
+    triggered, components, _converged = repair_violated(values, rules, constraints, touching, violated)
+
+    corrected = prices.copy()
+    for slot in triggered:
+        corrected[rules.keys[slot]] = values[slot]
+
+    return corrected, components
+
+
+def _violated_components(values: List[float], constraints: Sequence[Constraint]) -> Dict[int, str]:
+
+    # Slots of every connected group of priced rules that holds a broken
+    # rule, each with the family of the first broken rule in its group.
+    parent: Dict[int, int] = {}
+    for lower, higher, _family in constraints:
+        if is_present(values[lower]) and is_present(values[higher]):
+            _union(parent, lower, higher)
+
+    families: Dict[int, str] = {}
+    for lower, higher, family in constraints:
+        if values[lower] >= values[higher]:
+            families.setdefault(_find(parent, lower), family)
+
+    return {
+        slot: families[_find(parent, slot)]
+        for slot in list(parent)
+        if _find(parent, slot) in families
+    }
+
+
+def _projection_pass(values: List[float], constraints: Sequence[Constraint], min_gap: float) -> Dict[int, float]:
+
+    # Minimax isotonic regression over the partial order of the rules: each
+    # price becomes the midpoint between the highest price that must be
+    # below it and the lowest price that must be above it. Prices are shifted
+    # by min_gap per level of the order first, so the result is strictly
+    # ordered with at least min_gap between neighbours. The fit is clamped
+    # at 0 before shifting back, which keeps the order and the gaps, so
+    # small prices never come out negative. Only connected groups of rules
+    # that contain a violation take part, so valid parts of the sheet never
+    # move. Returns the new price of every slot that moves.
+    stats = instrumentation.current()
+
+    components = _violated_components(values, constraints)
+    if not components:
+        if stats is not None:
+            stats.record_correction("projection", [], True)
+        return {}
+
+    successors: Dict[int, List[int]] = {}
+    predecessors: Dict[int, List[int]] = {}
+    for lower, higher, _family in constraints:
+        if lower not in components or not is_present(values[higher]):
+            continue
+        successors.setdefault(lower, []).append(higher)
+        predecessors.setdefault(higher, []).append(lower)
+
+    slots = set(successors) | set(predecessors)
+    pending = {slot: len(predecessors.get(slot, [])) for slot in slots}
+    order = [slot for slot in sorted(slots) if pending[slot] == 0]
+    for slot in order:
+        for higher in successors.get(slot, []):
+            pending[higher] -= 1
+            if pending[higher] == 0:
+                order.append(higher)
+
+    depth = {}
+    for slot in order:
+        depth[slot] = max((depth[lower] + 1 for lower in predecessors.get(slot, [])), default=0)
+
+    shifted = {slot: values[slot] - min_gap * depth[slot] for slot in slots}
+
+    floor = {}
+    for slot in order:
+        floor[slot] = max([shifted[slot]] + [floor[lower] for lower in predecessors.get(slot, [])])
+
+    ceiling = {}
+    for slot in reversed(order):
+        ceiling[slot] = min([shifted[slot]] + [ceiling[higher] for higher in successors.get(slot, [])])
+
+    moved = {}
+    for slot in sorted(slots):
+        price = max((floor[slot] + ceiling[slot]) / 2, 0.0) + min_gap * depth[slot]
+        if price != values[slot]:
+            moved[slot] = price
+
+    if stats is not None:
+        stats.record_correction("projection", [len(moved)], True)
+
+    return moved
+
+
+def project_prices(
+    prices: Dict[str, float],
+    min_gap: float = 1.0,
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> Dict[str, float]:
+
+    rules = rules or compile_rules()
+    values = slot_values(prices, rules)
+    constraints = active_constraints(rules, values, missing)
+
+    corrected = prices.copy()
+    for slot, price in _projection_pass(values, constraints, min_gap).items():
+        corrected[rules.keys[slot]] = price
+
     return corrected
 
+
+def correct_delta(
+    prices: Dict[str, float],
+    strategy: str = "reference",
+    rules: Optional[CompiledRules] = None,
+    apply: bool = False,
+    missing: str = "skip"
+) -> CorrectionDelta:
+
+    # Only the prices that change, with the rule family that triggered each
+    # change. With apply=True the changes are also written into prices.
+    rules = rules or compile_rules()
+    values = slot_values(prices, rules)
+    constraints = active_constraints(rules, values, missing)
+
+    if strategy == "projection":
+        # Each moved slot is credited to the first originally broken rule
+        # it takes part in, or else to the first one in its group.
+        violated_by: Dict[int, str] = {}
+        for lower, higher, family in constraints:
+            if values[lower] >= values[higher]:
+                violated_by.setdefault(lower, family)
+                violated_by.setdefault(higher, family)
+        components = _violated_components(values, constraints)
+        moved = _projection_pass(values, constraints, 1.0)
+        triggered = {}
+        for slot, price in moved.items():
+            triggered[slot] = violated_by.get(slot, components[slot])
+            values[slot] = price
+        valid = True
+    elif strategy == "reference":
+        triggered, _iterations, valid = _reference_pass(values, rules, MAX_ITERATIONS, constraints)
+    elif strategy == "component":
+        constraints, touching = _component_inputs(values, rules, missing)
+        violated = [
+            index for index, (lower, higher, _family) in enumerate(constraints)
+            if values[lower] >= values[higher]
+        ]
+        triggered, _components, valid = repair_violated(values, rules, constraints, touching, violated)
+    else:
+        raise ValueError(f"Unknown correction strategy: {strategy}")
+
+    changes = []
+    for slot in sorted(triggered):
+        key = rules.keys[slot]
+        if values[slot] != prices[key]:
+            changes.append(Change(key, prices[key], values[slot], triggered[slot]))
+
+    if apply:
+        for change in changes:
+            prices[change.key] = change.new
+
+    return CorrectionDelta(changes, valid)
@@ -0,0 +1,182 @@
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from pricing.correction import correct_prices
+from pricing.pricebook import PriceBook
+from pricing.ruleset import CompiledRules, Constraint, compile_rules
+from pricing.validation import find_violations
+
+
+Sheets = Sequence[Dict[str, float]]
+
+# A verdict is the sorted list of broken constraints, each as (lower key,
+# higher key, rule family); engines must agree on it for every sheet.
+Verdict = Tuple[Tuple[str, str, str], ...]
+
+
+class Engine(NamedTuple):
+    name: str
+    validate: Optional[Callable[[Sheets], List[Verdict]]]
+    correct: Optional[Callable[[Sheets], List[Dict[str, float]]]]
+
+
+ENGINES: Dict[str, Engine] = {}
+
+
+def register_engine(
+    name: str,
+    validate: Optional[Callable[[Sheets], List[Verdict]]] = None,
+    correct: Optional[Callable[[Sheets], List[Dict[str, float]]]] = None
+) -> Engine:
+
+    # Engines work on a whole list of sheets so batch backends can be
+    # measured fairly. Either function may be left out.
+    if name in ENGINES:
+        raise ValueError(f"Engine already registered: {name}")
+    if validate is None and correct is None:
+        raise ValueError(f"Engine {name} has neither validate nor correct")
+    engine = Engine(name, validate, correct)
+    ENGINES[name] = engine
+    return engine
+
+
+def verdict(constraints: Iterable[Constraint], rules: Optional[CompiledRules] = None) -> Verdict:
+    keys = (rules or compile_rules()).keys
+    return tuple(sorted((keys[lower], keys[higher], family) for lower, higher, family in constraints))
+
+
+def _reference_validate(sheets: Sheets) -> List[Verdict]:
+    rules = compile_rules()
+    return [
+        verdict([violation.constraint for violation in find_violations(prices, rules)], rules)
+        for prices in sheets
+    ]
+
+
+def _reference_correct(sheets: Sheets) -> List[Dict[str, float]]:
+    return [correct_prices(prices) for prices in sheets]
+
+
+def _pricebook_validate(sheets: Sheets) -> List[Verdict]:
+    rules = compile_rules()
+    return [
+        verdict([violation.constraint for violation in PriceBook(prices, rules).violations()], rules)
+        for prices in sheets
+    ]
+
+
+# validate_prices / correct_prices are the audited behaviour; every other
+# engine is checked against them.
+REFERENCE = register_engine("python", _reference_validate, _reference_correct)
+register_engine("pricebook", _pricebook_validate)
+
+try:
+    import numpy as np
+
+    from pricing.batch import correct_batch, pack_sheets, violation_matrix
+except ImportError:
+    pass
+else:
+    def _batch_validate(sheets: Sheets) -> List[Verdict]:
+        rules = compile_rules()
+        violated = violation_matrix(*pack_sheets(sheets, rules), rules)
+        return [
+            verdict([rules.constraints[column] for column in np.flatnonzero(row)], rules)
+            for row in violated
+        ]
+
+    register_engine("batch", _batch_validate, correct_batch)
+
+
+def _timed(function: Callable[[Sheets], List], sheets: Sheets, repeats: int) -> Tuple[List, float]:
+    best = math.inf
+    result: List = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function(sheets)
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def prices_match(expected: Dict[str, float], actual: Dict[str, float], tolerance: float) -> bool:
+    if expected.keys() != actual.keys():
+        return False
+    return all(
+        math.isclose(actual[key], price, rel_tol=tolerance, abs_tol=tolerance)
+        for key, price in expected.items()
+    )
+
+
+def compare_engine(
+    engine: Engine,
+    sheets: Sheets,
+    tolerance: float = 1e-9,
+    min_speedup: float = 0.0,
+    repeats: int = 3,
+    max_examples: int = 5,
+    reference: Engine = REFERENCE
+) -> Dict[str, Any]:
+
+    # Runs engine and reference on the same sheets. The engine is rejected
+    # when any verdict or corrected price differs, or when it runs at less
+    # than min_speedup times the reference speed.
+    report: Dict[str, Any] = {"engine": engine.name, "sheets": len(sheets), "checks": {}, "problems": []}
+
+    checks = [
+        ("validate", engine.validate, reference.validate),
+        ("correct", engine.correct, reference.correct),
+    ]
+    for name, candidate, audited in checks:
+        if candidate is None:
+            continue
+        expected, reference_seconds = _timed(audited, sheets, repeats)
+        actual, engine_seconds = _timed(candidate, sheets, repeats)
+
+        if name == "validate":
+            mismatches = [index for index, (a, b) in enumerate(zip(expected, actual)) if a != b]
+        else:
+            mismatches = [
+                index for index, (a, b) in enumerate(zip(expected, actual))
+                if not prices_match(a, b, tolerance)
+            ]
+        if len(actual) != len(expected):
+            mismatches.append(min(len(actual), len(expected)))
+
+        speedup = reference_seconds / engine_seconds if engine_seconds else math.inf
+        report["checks"][name] = {
+            "mismatches": len(mismatches),
+            "reference_seconds": reference_seconds,
+            "engine_seconds": engine_seconds,
+            "speedup": speedup,
+        }
+
+        for index in mismatches[:max_examples]:
+            report["problems"].append(
+                f"{name} disagrees on sheet {index}: "
+                f"expected {expected[index] if index < len(expected) else None!r}, "
+                f"got {actual[index] if index < len(actual) else None!r}"
+            )
+        if speedup < min_speedup:
+            report["problems"].append(f"{name} speedup {speedup:.2f}x is below {min_speedup:.2f}x")
+
+    report["accepted"] = not report["problems"]
+    return report
+
+
+def check_engines(
+    sheets: Sheets,
+    names: Optional[Sequence[str]] = None,
+    tolerance: float = 1e-9,
+    min_speedup: float = 0.0,
+    repeats: int = 3
+) -> List[Dict[str, Any]]:
+
+    names = names or [name for name in ENGINES if name != REFERENCE.name]
+    reports = []
+    for name in names:
+        engine = ENGINES.get(name)
+        if engine is None:
+            raise ValueError(f"Unknown engine: {name}")
+        reports.append(compare_engine(engine, sheets, tolerance, min_speedup, repeats))
+    return reports
@@ -0,0 +1,112 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from pricing.ruleset import RULE_FAMILIES
+
+
+Callback = Callable[[str, Dict[str, Any]], None]
+
+
+class Instrumentation:
+
+    # Counters for rule evaluation and correction. Validation and correction
+    # only look at the active instance, so with none installed the cost is a
+    # single global lookup per call.
+
+    def __init__(self, callback: Optional[Callback] = None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self) -> None:
+        self.evaluations = {family: 0 for family in RULE_FAMILIES}
+        self.violations = {family: 0 for family in RULE_FAMILIES}
+        self.seconds = {family: 0.0 for family in RULE_FAMILIES}
+        self.sheets_validated = 0
+        self.sheets_corrected = 0
+        self.iterations: Dict[int, int] = {}
+        self.keys_reset: List[int] = []
+        self.not_converged = 0
+
+    def record_rule(self, family: str, evaluated: int, violated: int, seconds: float) -> None:
+        self.evaluations[family] = self.evaluations.get(family, 0) + evaluated
+        self.violations[family] = self.violations.get(family, 0) + violated
+        self.seconds[family] = self.seconds.get(family, 0.0) + seconds
+        if self.callback is not None:
+            self.callback("rule", {
+                "family": family,
+                "evaluated": evaluated,
+                "violated": violated,
+                "seconds": seconds,
+            })
+
+    def record_validation(self) -> None:
+        self.sheets_validated += 1
+
+    def record_correction(self, strategy: str, keys_reset: List[int], converged: bool) -> None:
+        # keys_reset holds the number of keys reset in each iteration.
+        self.sheets_corrected += 1
+        iterations = len(keys_reset)
+        self.iterations[iterations] = self.iterations.get(iterations, 0) + 1
+
+        for iteration, count in enumerate(keys_reset):
+            if iteration < len(self.keys_reset):
+                self.keys_reset[iteration] += count
+            else:
+                self.keys_reset.append(count)
+
+        if not converged:
+            self.not_converged += 1
+
+        if self.callback is not None:
+            self.callback("correction", {
+                "strategy": strategy,
+                "iterations": iterations,
+                "keys_reset": list(keys_reset),
+                "converged": converged,
+            })
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "rules": {
+                family: {
+                    "evaluations": self.evaluations[family],
+                    "violations": self.violations[family],
+                    "seconds": self.seconds[family],
+                }
+                for family in self.evaluations
+            },
+            "sheets_validated": self.sheets_validated,
+            "sheets_corrected": self.sheets_corrected,
+            "iterations": dict(sorted(self.iterations.items())),
+            "keys_reset_per_iteration": list(self.keys_reset),
+            "not_converged": self.not_converged,
+        }
+
+
+_active: Optional[Instrumentation] = None
+
+
+def current() -> Optional[Instrumentation]:
+    return _active
+
+
+def enable(instrumentation: Optional[Instrumentation] = None) -> Instrumentation:
+    global _active
+    _active = instrumentation or Instrumentation()
+    return _active
+
+
+def disable() -> None:
+    global _active
+    _active = None
+
+
+@contextmanager
+def instrumented(callback: Optional[Callback] = None) -> Iterator[Instrumentation]:
+    global _active
+    previous = _active
+    stats = enable(Instrumentation(callback))
+    try:
+        yield stats
+    finally:
+        _active = previous
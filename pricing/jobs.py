@@ -0,0 +1,459 @@
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from multiprocessing import Process
+from typing import Any, Dict, IO, List, Optional, Tuple
+
+from pricing.analytics import PortfolioStats
+from pricing.cache import ResultCache
+from pricing.stream import check_stats_rules, process_line
+
+
+# A job directory holds:
+#   manifest.json          input path, options and the byte range of each shard
+#   shard-00000.jsonl      results for shard 0, in input order
+#   shard-00000.stats      partial PortfolioStats of shard 0, for jobs run with stats
+#   shard-00000.done       checkpoint, written only after the results are in place
+# A shard is finished exactly when its checkpoint exists and still matches
+# the record count and sha256 of its results (and statistics), so a
+# restarted job picks up after the last finished shard, and a truncated or
+# corrupt output is redone instead of merged.
+#
+# Workers talk to the coordinator over TCP, one JSON object per line:
+#   worker -> {"op": "lease", "worker": "host-1"}
+#   coord  -> {"op": "shard", "shard": 3, "lines": [[line_number, text], ...], "correct": true, "strategy": "...", "stats": false}
+#             {"op": "wait", "seconds": 0.2} while other workers hold the remaining shards
+#             {"op": "done"} once every shard is finished
+#   worker -> {"op": "result", "shard": 3, "results": [...]}, plus "stats": {...} when asked for
+#   coord  -> {"op": "ok"}, or {"op": "error", "error": "..."} for a result
+#             that does not belong to a leased shard of this job
+# A shard leased to a worker that disconnects or exceeds lease_timeout goes
+# back to the queue, so workers can join and leave at any time.
+MANIFEST = "manifest.json"
+DEFAULT_SHARD_SIZE = 10000
+WAIT_SECONDS = 0.2
+
+
+def _shard_path(job_dir: str, shard: int, suffix: str) -> str:
+    return os.path.join(job_dir, f"shard-{shard:05d}.{suffix}")
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    temporary = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(temporary, "wb") as handle:
+        handle.write(data)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temporary, path)
+
+
+def _input_stamp(path: str) -> Dict[str, int]:
+    status = os.stat(path)
+    return {"size": status.st_size, "mtime_ns": status.st_mtime_ns}
+
+
+def create_job(
+    input_path: str,
+    job_dir: str,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    correct: bool = True,
+    strategy: str = "reference",
+    stats: bool = False
+) -> Dict[str, Any]:
+
+    # Splits the input into shards of shard_size lines. An existing manifest
+    # for the same input and options is reused, which is how a job resumes.
+    if shard_size < 1:
+        raise ValueError(f"shard_size must be positive: {shard_size}")
+
+    os.makedirs(job_dir, exist_ok=True)
+    manifest_path = os.path.join(job_dir, MANIFEST)
+    options = {
+        "input": os.path.abspath(input_path),
+        "input_stamp": _input_stamp(input_path),
+        "shard_size": shard_size,
+        "correct": correct,
+        "strategy": strategy,
+        "stats": stats,
+    }
+
+    if os.path.exists(manifest_path):
+        manifest = load_manifest(job_dir)
+        if {key: manifest.get(key) for key in options} != options:
+            raise ValueError(f"Job directory {job_dir} belongs to a different input or options")
+        return manifest
+
+    shards: List[List[int]] = []
+    with open(input_path, "rb") as handle:
+        offset = 0
+        first_line = 1
+        lines = 0
+        start = 0
+        for line in handle:
+            offset += len(line)
+            lines += 1
+            if lines == shard_size:
+                shards.append([start, offset, first_line])
+                start, first_line, lines = offset, first_line + shard_size, 0
+        if lines:
+            shards.append([start, offset, first_line])
+
+    manifest = {**options, "shards": shards}
+    _write_atomic(manifest_path, json.dumps(manifest).encode("utf-8"))
+    return manifest
+
+
+def load_manifest(job_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(job_dir, MANIFEST), encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _checkpoint_valid(job_dir: str, shard: int, stats: bool = False) -> bool:
+    try:
+        with open(_shard_path(job_dir, shard, "done"), "rb") as handle:
+            checkpoint = json.loads(handle.read())
+        with open(_shard_path(job_dir, shard, "jsonl"), "rb") as handle:
+            data = handle.read()
+        if stats:
+            with open(_shard_path(job_dir, shard, "stats"), "rb") as handle:
+                stats_data = handle.read()
+    except (OSError, ValueError):
+        return False
+    return (
+        isinstance(checkpoint, dict)
+        and checkpoint.get("records") == data.count(b"\n")
+        and checkpoint.get("sha256") == hashlib.sha256(data).hexdigest()
+        and (not stats or checkpoint.get("stats_sha256") == hashlib.sha256(stats_data).hexdigest())
+    )
+
+
+def finished_shards(job_dir: str, manifest: Dict[str, Any]) -> List[int]:
+    stats = manifest.get("stats", False)
+    return [shard for shard in range(len(manifest["shards"])) if _checkpoint_valid(job_dir, shard, stats)]
+
+
+def _load_shard_stats(job_dir: str, shard: int) -> PortfolioStats:
+    # Job workers validate with the rules in rules.py.
+    try:
+        with open(_shard_path(job_dir, shard, "stats"), encoding="utf-8") as handle:
+            data = json.load(handle)
+    except FileNotFoundError:
+        raise ValueError(f"Shard {shard} of job {job_dir} has no statistics") from None
+    return PortfolioStats.from_dict(data)
+
+
+def read_shard(manifest: Dict[str, Any], shard: int) -> List[Tuple[int, str]]:
+    start, stop, first_line = manifest["shards"][shard]
+    with open(manifest["input"], "rb") as handle:
+        handle.seek(start)
+        data = handle.read(stop - start)
+    # Shard offsets were found by splitting on b"\n" only, so split the same
+    # way. Bytes that are not UTF-8 are left for process_line to report.
+    lines = data.split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    return [
+        (first_line + index, line.decode("utf-8", "surrogateescape"))
+        for index, line in enumerate(lines)
+        if line.strip()
+    ]
+
+
+def _send(stream: IO[bytes], message: Dict[str, Any]) -> None:
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        coordinator = self.server.coordinator
+        leased: List[int] = []
+        try:
+            for raw in iter(self.rfile.readline, b""):
+                try:
+                    message = json.loads(raw)
+                except ValueError as error:
+                    _send(self.wfile, {"op": "error", "error": f"Invalid message: {error}"})
+                    continue
+                if not isinstance(message, dict):
+                    reply = {"op": "error", "error": "Expected a JSON object per message"}
+                elif message.get("op") == "lease":
+                    reply = coordinator.lease(message.get("worker", "?"))
+                    if reply["op"] == "shard":
+                        leased.append(reply["shard"])
+                elif message.get("op") == "result":
+                    try:
+                        coordinator.complete(message["shard"], message["results"], message.get("stats"))
+                    except (KeyError, TypeError, ValueError) as error:
+                        reply = {"op": "error", "error": str(error)}
+                    else:
+                        if message["shard"] in leased:
+                            leased.remove(message["shard"])
+                        reply = {"op": "ok"}
+                else:
+                    reply = {"op": "error", "error": f"Unknown operation: {message.get('op')}"}
+                _send(self.wfile, reply)
+        except (OSError, ValueError):
+            pass
+        finally:
+            # The worker left; whatever it still held is handed out again.
+            coordinator.release(leased)
+
+
+class _CoordinatorServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Coordinator:
+
+    # Hands out unfinished shards of a job and records their results.
+
+    def __init__(self, job_dir: str, host: str = "127.0.0.1", port: int = 0, lease_timeout: float = 600.0):
+        self.job_dir = job_dir
+        self.manifest = load_manifest(job_dir)
+        self.lease_timeout = lease_timeout
+
+        done = set(finished_shards(job_dir, self.manifest))
+        self.skipped = len(done)
+        self._done = done
+        self._pending = deque(shard for shard in range(len(self.manifest["shards"])) if shard not in done)
+        self._leases: Dict[int, Tuple[str, float]] = {}
+        # Record count of every shard handed out so far; results are only
+        # accepted for these.
+        self._issued: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        if not self._pending:
+            self._finished.set()
+
+        self._server = _CoordinatorServer((host, port), _CoordinatorHandler)
+        self._server.coordinator = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def _expire_leases(self) -> None:
+        now = time.monotonic()
+        for shard, (_worker, deadline) in list(self._leases.items()):
+            if deadline < now:
+                del self._leases[shard]
+                self._pending.appendleft(shard)
+
+    def lease(self, worker: str) -> Dict[str, Any]:
+        with self._lock:
+            self._expire_leases()
+            if self._finished.is_set():
+                return {"op": "done"}
+            if not self._pending:
+                return {"op": "wait", "seconds": WAIT_SECONDS}
+            shard = self._pending.popleft()
+            self._leases[shard] = (worker, time.monotonic() + self.lease_timeout)
+        lines = read_shard(self.manifest, shard)
+        with self._lock:
+            self._issued[shard] = len(lines)
+        return {
+            "op": "shard",
+            "shard": shard,
+            "lines": lines,
+            "correct": self.manifest["correct"],
+            "strategy": self.manifest["strategy"],
+            "stats": self.manifest.get("stats", False),
+        }
+
+    def complete(
+        self,
+        shard: int,
+        results: List[Dict[str, Any]],
+        stats: Optional[Dict[str, Any]] = None
+    ) -> None:
+        # Raises ValueError for a shard that is outside the job or was never
+        # leased, for a result list that does not match the shard's lines,
+        # and for missing or malformed statistics in a job run with stats.
+        shards = len(self.manifest["shards"])
+        if not isinstance(shard, int) or not 0 <= shard < shards:
+            raise ValueError(f"Shard {shard!r} is not part of this job ({shards} shard(s))")
+        with self._lock:
+            if shard in self._done:
+                # A second copy of a re-leased shard; the first one counts.
+                return
+            # A lease that expired still counts, the shard was handed out.
+            if shard not in self._leases and shard not in self._issued:
+                raise ValueError(f"Shard {shard} was never leased")
+            expected = self._issued.get(shard)
+            if expected is not None and len(results) != expected:
+                raise ValueError(f"Shard {shard} has {expected} record(s), got {len(results)}")
+            data = "".join(json.dumps(result) + "\n" for result in results).encode("utf-8")
+            checkpoint = {"records": len(results), "sha256": hashlib.sha256(data).hexdigest()}
+            if self.manifest.get("stats"):
+                if not isinstance(stats, dict):
+                    raise ValueError(f"Shard {shard} was sent without statistics")
+                partial = PortfolioStats.from_dict(stats)
+                if partial.sheets > len(results):
+                    raise ValueError(f"Shard {shard} has {len(results)} record(s), statistics cover {partial.sheets}")
+                stats_data = json.dumps(stats).encode("utf-8")
+                _write_atomic(_shard_path(self.job_dir, shard, "stats"), stats_data)
+                checkpoint["stats_sha256"] = hashlib.sha256(stats_data).hexdigest()
+            _write_atomic(_shard_path(self.job_dir, shard, "jsonl"), data)
+            _write_atomic(_shard_path(self.job_dir, shard, "done"), json.dumps(checkpoint).encode("utf-8"))
+
+            self._done.add(shard)
+            self._leases.pop(shard, None)
+            if shard in self._pending:
+                self._pending.remove(shard)
+            if all(index in self._done for index in range(shards)):
+                self._finished.set()
+
+    def release(self, shards: List[int]) -> None:
+        with self._lock:
+            for shard in shards:
+                if shard in self._leases and shard not in self._done:
+                    del self._leases[shard]
+                    self._pending.appendleft(shard)
+
+    def progress(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "shards": len(self.manifest["shards"]),
+                "done": len(self._done),
+                "leased": len(self._leases),
+                "pending": len(self._pending),
+                "resumed": self.skipped,
+            }
+
+    def start(self) -> "Coordinator":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "Coordinator":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def work(
+    host: str,
+    port: int,
+    worker: Optional[str] = None,
+    max_shards: Optional[int] = None,
+    cache_size: int = 0
+) -> int:
+
+    # Processes shards until the job is done (or max_shards have been
+    # processed) and returns how many this worker finished.
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    cache = ResultCache(cache_size) if cache_size > 0 else None
+    processed = 0
+
+    with socket.create_connection((host, port)) as connection:
+        stream = connection.makefile("rwb")
+        while max_shards is None or processed < max_shards:
+            _send(stream, {"op": "lease", "worker": worker})
+            line = stream.readline()
+            if not line:
+                break
+            reply = json.loads(line)
+            if reply["op"] == "done":
+                break
+            if reply["op"] == "wait":
+                time.sleep(reply["seconds"])
+                continue
+
+            stats = PortfolioStats() if reply.get("stats") else None
+            results = [
+                process_line(line_number, line, reply["correct"], reply["strategy"], cache, stats)
+                for line_number, line in reply["lines"]
+            ]
+            message = {"op": "result", "shard": reply["shard"], "results": results}
+            if stats is not None:
+                message["stats"] = stats.to_dict()
+            _send(stream, message)
+            answer = json.loads(stream.readline())
+            if answer["op"] == "error":
+                raise RuntimeError(f"Coordinator rejected shard {reply['shard']}: {answer['error']}")
+            processed += 1
+
+    return processed
+
+
+def merge_job(job_dir: str, outfile: IO[str], stats: Optional[PortfolioStats] = None) -> int:
+
+    # Concatenates shard outputs in shard order, so the merged output is the
+    # same however the shards were scheduled. stats, when given, receives
+    # the merged statistics of a job created with stats=True.
+    manifest = load_manifest(job_dir)
+    missing = len(manifest["shards"]) - len(finished_shards(job_dir, manifest))
+    if missing:
+        raise ValueError(f"Job {job_dir} has {missing} unfinished shard(s)")
+    if stats is not None and not manifest.get("stats"):
+        raise ValueError(f"Job {job_dir} was run without statistics")
+
+    records = 0
+    for shard in range(len(manifest["shards"])):
+        if stats is not None:
+            stats.merge(_load_shard_stats(job_dir, shard))
+        with open(_shard_path(job_dir, shard, "jsonl"), encoding="utf-8") as handle:
+            for line in handle:
+                outfile.write(line)
+                records += 1
+    outfile.flush()
+    return records
+
+
+def run_job(
+    input_path: str,
+    job_dir: str,
+    outfile: IO[str],
+    workers: int = 1,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    correct: bool = True,
+    strategy: str = "reference",
+    host: str = "127.0.0.1",
+    port: int = 0,
+    cache_size: int = 0,
+    stats: Optional[PortfolioStats] = None
+) -> int:
+
+    # Creates or resumes a job, serves it to `workers` local worker processes
+    # (remote workers may join through host:port as well) and merges the result.
+    # Raises RuntimeError if every local worker dies before the job is done;
+    # finished shards stay checkpointed, so rerunning resumes the job.
+    if stats is not None:
+        check_stats_rules(stats, None)
+    create_job(input_path, job_dir, shard_size, correct, strategy, stats is not None)
+    with Coordinator(job_dir, host, port) as coordinator:
+        address = coordinator.address
+        processes = [
+            Process(target=work, args=(address[0], address[1]), kwargs={"cache_size": cache_size}, daemon=True)
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        while not coordinator.wait(WAIT_SECONDS):
+            if processes and not any(process.is_alive() for process in processes) and not coordinator.wait(0):
+                progress = coordinator.progress()
+                raise RuntimeError(
+                    f"All {workers} workers exited with {progress['shards'] - progress['done']} "
+                    f"shard(s) of job {job_dir} unfinished"
+                )
+        for process in processes:
+            process.join()
+    return merge_job(job_dir, outfile, stats)
@@ -0,0 +1,191 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pricing.ruleset import CompiledRules, RuleConfig, compile_rules, current_config
+
+
+# A market config is a JSON object with any of the keys below; keys that are
+# left out take their value from rules.py. For example:
+#   {"reference_prices": {"mtpl": 350, "casco": 950}, "deductible_order": [0, 250, 500]}
+CONFIG_SUFFIX = ".json"
+MARKET_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+LIST_SETTINGS = ("product_order", "untiered_products", "variant_tiers", "deductible_order")
+
+
+def _duplicates(values: Iterable) -> List[str]:
+    seen, duplicates = set(), set()
+    for value in values:
+        if value in seen:
+            duplicates.add(str(value))
+        seen.add(value)
+    return sorted(duplicates)
+
+
+def _check_config(config: RuleConfig, source: str) -> None:
+
+    # A config that compiles into nonsense (a slot compared with itself, a
+    # string read as a list of one-letter tiers) must fail to load, so a
+    # reload keeps the last good version instead of swapping it in.
+    if not config.product_order:
+        raise ValueError(f"{source}: product_order must not be empty")
+    variants = [variant for tier in config.variant_tiers for variant in tier]
+    if any(not tier for tier in config.variant_tiers):
+        raise ValueError(f"{source}: variant_tiers must not contain empty tiers")
+    if not all(isinstance(variant, str) and variant for variant in variants):
+        raise ValueError(f"{source}: variants must be non-empty strings")
+    for name, values in [
+        ("product_order", config.product_order),
+        ("variant_tiers", variants),
+        ("deductible_order", config.deductible_order),
+    ]:
+        duplicates = _duplicates(values)
+        if duplicates:
+            raise ValueError(f"{source}: duplicate entries in {name}: {', '.join(duplicates)}")
+    unknown = set(config.untiered_products) - set(config.product_order)
+    if unknown:
+        raise ValueError(f"{source}: untiered products not in product_order: {', '.join(sorted(unknown))}")
+    missing = set(config.product_order) - set(dict(config.reference_prices))
+    if missing:
+        raise ValueError(f"{source}: no reference price for: {', '.join(sorted(missing))}")
+
+    # Correction falls back to the reference table, so steps or prices that
+    # make it break the config's own rules are rejected as well.
+    try:
+        compile_rules(config)
+    except ValueError as error:
+        raise ValueError(f"{source}: {error}") from None
+
+
+def parse_config(data: Dict[str, Any], source: str = "<config>", base: Optional[RuleConfig] = None) -> RuleConfig:
+
+    # Settings missing from data are taken from base (rules.py by default).
+    if not isinstance(data, dict):
+        raise ValueError(f"{source}: expected a JSON object")
+    unknown = set(data) - set(RuleConfig._fields)
+    if unknown:
+        raise ValueError(f"{source}: unknown rule settings: {', '.join(sorted(unknown))}")
+    for name in LIST_SETTINGS:
+        if name in data and not isinstance(data[name], (list, tuple)):
+            raise ValueError(f"{source}: {name} must be a list")
+    if any(not isinstance(tier, (list, tuple)) for tier in data.get("variant_tiers", [])):
+        raise ValueError(f"{source}: each entry of variant_tiers must be a list of variants")
+
+    defaults = base or current_config()
+    try:
+        config = RuleConfig(
+            # Partial reference prices override the defaults product by product.
+            reference_prices=tuple(
+                (str(product), float(price))
+                for product, price in {**dict(defaults.reference_prices), **data.get("reference_prices", {})}.items()
+            ),
+            product_order=tuple(data.get("product_order", defaults.product_order)),
+            untiered_products=tuple(data.get("untiered_products", defaults.untiered_products)),
+            product_labels=tuple(data.get("product_labels", dict(defaults.product_labels)).items()),
+            variant_tiers=tuple(tuple(tier) for tier in data.get("variant_tiers", defaults.variant_tiers)),
+            deductible_order=tuple(int(deductible) for deductible in data.get("deductible_order", defaults.deductible_order)),
+            variant_step_percent=float(data.get("variant_step_percent", defaults.variant_step_percent)),
+            deductible_step_percent=float(data.get("deductible_step_percent", defaults.deductible_step_percent)),
+        )
+    except (AttributeError, TypeError) as error:
+        raise ValueError(f"{source}: malformed rule settings: {error}") from None
+
+    _check_config(config, source)
+    return config
+
+
+def load_config(path: str) -> RuleConfig:
+    with open(path, encoding="utf-8") as handle:
+        try:
+            data = json.load(handle)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"{path}: {error}") from None
+    return parse_config(data, path)
+
+
+class MarketVersion(NamedTuple):
+    rules: CompiledRules
+    version: int
+    stamp: Tuple[int, int]
+    loaded_at: float
+
+
+class MarketRules:
+
+    # Compiled rules per market, loaded from <directory>/<market>.json.
+    # Each file is compiled once; get() stats it at most every check_interval
+    # seconds and recompiles only when its mtime or size changed. A reload
+    # replaces the market's entry in one assignment, so callers holding the
+    # previous CompiledRules keep using it until they finish. If a changed
+    # file fails to load, the last good version stays in service and the
+    # error is kept in errors[market].
+
+    def __init__(self, directory: str, check_interval: float = 1.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.errors: Dict[str, str] = {}
+        self._versions: Dict[str, MarketVersion] = {}
+        self._checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def path(self, market: str) -> str:
+        if not isinstance(market, str) or not MARKET_ID.match(market):
+            raise ValueError(f"Invalid market id: {market!r}")
+        return os.path.join(self.directory, market + CONFIG_SUFFIX)
+
+    def get(self, market: str) -> CompiledRules:
+        current = self._versions.get(market)
+        if current is not None and time.monotonic() - self._checked[market] < self.check_interval:
+            return current.rules
+        return self._refresh(market).rules
+
+    def version(self, market: str) -> int:
+        self.get(market)
+        return self._versions[market].version
+
+    def _refresh(self, market: str) -> MarketVersion:
+        path = self.path(market)
+        with self._lock:
+            current = self._versions.get(market)
+            self._checked[market] = time.monotonic()
+            try:
+                status = os.stat(path)
+            except FileNotFoundError:
+                if current is None:
+                    raise ValueError(f"Unknown market: {market}") from None
+                return current
+
+            stamp = (status.st_mtime_ns, status.st_size)
+            if current is not None and current.stamp == stamp:
+                return current
+
+            try:
+                rules = compile_rules(load_config(path))
+            except (OSError, ValueError) as error:
+                if current is None:
+                    raise ValueError(f"Cannot load market {market}: {error}") from None
+                self.errors[market] = str(error)
+                return current
+
+            version = MarketVersion(rules, current.version + 1 if current else 1, stamp, time.time())
+            self._versions[market] = version
+            self.errors.pop(market, None)
+            return version
+
+    def markets(self) -> Dict[str, int]:
+        # Loaded markets and their current version numbers.
+        return {market: entry.version for market, entry in self._versions.items()}
+
+
+def resolve_rules(market: Optional[str], markets: Optional[MarketRules]) -> Optional[CompiledRules]:
+    # Rules for a request's market, or None for the rules in rules.py.
+    if market is None:
+        return None
+    if markets is None:
+        raise ValueError("No market configs are loaded")
+    return markets.get(market)
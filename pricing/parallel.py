@@ -0,0 +1,148 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from pricing.cache import ResultCache
+from pricing.stream import analyze_sheet, process_line, read_sheets, write_results
+
+if TYPE_CHECKING:
+    from pricing.analytics import PortfolioStats
+
+
+DEFAULT_CHUNK_SIZE = 256
+
+# One result cache per worker process, created on first use.
+_worker_cache: Optional[ResultCache] = None
+
+
+def _get_worker_cache(cache_size: int) -> Optional[ResultCache]:
+    global _worker_cache
+    if cache_size <= 0:
+        return None
+    if _worker_cache is None or _worker_cache.maxsize != cache_size:
+        _worker_cache = ResultCache(cache_size)
+    return _worker_cache
+
+
+def _chunks(items: Iterable, chunk_size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def imap_chunks(
+    function: Callable[[List], List],
+    items: Iterable,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator:
+
+    # Runs function over chunks of items in a process pool and yields the
+    # results in input order. Only a few chunks per worker are in flight at
+    # once, so arbitrarily long inputs are never fully materialised.
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive: {chunk_size}")
+
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        for chunk in _chunks(items, chunk_size):
+            yield from function(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in _chunks(items, chunk_size):
+            pending.append(executor.submit(function, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _analyze_chunk(
+    sheets: List[Dict[str, float]],
+    correct: bool,
+    strategy: str,
+    cache_size: int = 0,
+    stats: Optional["PortfolioStats"] = None
+) -> List[Dict[str, Any]]:
+    cache = _get_worker_cache(cache_size)
+    results = []
+    for prices in sheets:
+        try:
+            results.append(analyze_sheet(prices, correct, strategy, cache, stats=stats))
+        except Exception as error:
+            results.append({"error": f"{type(error).__name__}: {error}"})
+    return results
+
+
+def _process_lines(
+    lines: List[Tuple[int, str]],
+    correct: bool,
+    strategy: str,
+    cache_size: int = 0,
+    stats: Optional["PortfolioStats"] = None
+) -> List[Dict[str, Any]]:
+    cache = _get_worker_cache(cache_size)
+    return [process_line(line_number, line, correct, strategy, cache, stats) for line_number, line in lines]
+
+
+def _with_stats(function: Callable, template: "PortfolioStats", chunk: List) -> List[Tuple[List, "PortfolioStats"]]:
+    # Each chunk fills its own partial statistics and returns them with its
+    # results, as one item, so the parent can merge them in input order.
+    stats = template.empty()
+    return [(function(chunk, stats=stats), stats)]
+
+
+def _merged_results(
+    function: Callable,
+    items: Iterable,
+    workers: Optional[int],
+    chunk_size: int,
+    stats: Optional["PortfolioStats"]
+) -> Iterator[Dict[str, Any]]:
+    if stats is None:
+        yield from imap_chunks(function, items, workers, chunk_size)
+        return
+    chunks = imap_chunks(partial(_with_stats, function, stats.empty()), items, workers, chunk_size)
+    for results, part in chunks:
+        stats.merge(part)
+        yield from results
+
+
+def run_parallel(
+    sheets: Iterable[Dict[str, float]],
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    correct: bool = True,
+    strategy: str = "reference",
+    cache_size: int = 0,
+    stats: Optional["PortfolioStats"] = None
+) -> Iterator[Dict[str, Any]]:
+
+    # stats, when given, is updated as the results are consumed.
+    function = partial(_analyze_chunk, correct=correct, strategy=strategy, cache_size=cache_size)
+    return _merged_results(function, sheets, workers, chunk_size, stats)
+
+
+def process_stream_parallel(
+    infile: IO[str],
+    outfile: IO[str],
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    correct: bool = True,
+    strategy: str = "reference",
+    cache_size: int = 0,
+    stats: Optional["PortfolioStats"] = None
+) -> int:
+
+    function = partial(_process_lines, correct=correct, strategy=strategy, cache_size=cache_size)
+    results = _merged_results(function, read_sheets(infile), workers, chunk_size, stats)
+    return write_results(results, outfile)
@@ -1,6 +1,35 @@
-from typing import Optional, Tuple, Dict
+from functools import lru_cache
+from typing import Iterator, Optional, Tuple, Dict
 
 
+class PriceKey:
+
+    # One instance per slot of a compiled layout, so lookups in the
+    # validation and correction hot paths never parse or allocate.
+    __slots__ = ("key", "product", "variant", "deductible", "slot")
+
+    def __init__(
+        self,
+        key: str,
+        product: str,
+        variant: Optional[str],
+        deductible: Optional[int],
+        slot: Optional[int] = None
+    ):
+        self.key = key
+        self.product = product
+        self.variant = variant
+        self.deductible = deductible
+        self.slot = slot
+
+    def __iter__(self) -> Iterator:
+        return iter((self.product, self.variant, self.deductible))
+
+    def __repr__(self) -> str:
+        return f"PriceKey({self.key!r}, slot={self.slot})"
+
+
+@lru_cache(maxsize=65536)
 def parse_price_key(key: str) -> Tuple[str, Optional[str], Optional[int]]:
 
     if key == "mtpl":
@@ -0,0 +1,83 @@
+from typing import Dict, List, Optional, Set
+
+from pricing.correction import Change, repair_violated
+from pricing.ruleset import MISSING, CompiledRules, compile_rules, is_present, key_slot
+from pricing.validation import Violation
+
+
+class PriceBook:
+
+    # Keeps a price sheet in slot form together with the set of currently
+    # violated constraints. Each update only rechecks the constraints that
+    # involve the changed slot.
+
+    def __init__(self, prices: Optional[Dict[str, float]] = None, rules: Optional[CompiledRules] = None):
+        self._rules = rules or compile_rules()
+        self._values: List[float] = [MISSING] * len(self._rules.keys)
+        self._violated: Set[int] = set()
+
+        for key, price in (prices or {}).items():
+            self.set(key, price)
+
+    def _check(self, index: int) -> None:
+        lower, higher, _family = self._rules.constraints[index]
+
+        if self._values[lower] >= self._values[higher]:
+            self._violated.add(index)
+        else:
+            self._violated.discard(index)
+
+    def _store(self, key: str, price: Optional[float]) -> None:
+        slot = key_slot(key, self._rules)
+        self._values[slot] = MISSING if price is None else price
+        for index in self._rules.touching[slot]:
+            self._check(index)
+
+    def set(self, key: str, price: float) -> None:
+        self._store(key, price)
+
+    def remove(self, key: str) -> None:
+        self._store(key, None)
+
+    def get(self, key: str) -> Optional[float]:
+        price = self._values[key_slot(key, self._rules)]
+        return price if is_present(price) else None
+
+    def prices(self) -> Dict[str, float]:
+        return {
+            key: price
+            for key, price in zip(self._rules.keys, self._values)
+            if is_present(price)
+        }
+
+    def violations(self) -> List[Violation]:
+        violations = []
+        for index in sorted(self._violated):
+            lower, higher, _family = self._rules.constraints[index]
+            violations.append(Violation(self._rules, index, self._values[lower], self._values[higher]))
+        return violations
+
+    def issues(self) -> List[str]:
+        return [violation.message for violation in self.violations()]
+
+    def is_valid(self) -> bool:
+        return not self._violated
+
+    def repair(self) -> List[Change]:
+        # Component repair driven by the violations already tracked, so the
+        # cost depends on how much is broken, not on the size of the sheet.
+        if not self._violated:
+            return []
+        rules = self._rules
+        before = list(self._values)
+        triggered, _components, _converged = repair_violated(
+            self._values, rules, rules.constraints, rules.touching, sorted(self._violated)
+        )
+
+        changes = []
+        for slot in sorted(triggered):
+            for index in rules.touching[slot]:
+                self._check(index)
+            if self._values[slot] != before[slot] and is_present(before[slot]):
+                changes.append(Change(rules.keys[slot], before[slot], self._values[slot], triggered[slot]))
+        return changes
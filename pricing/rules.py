@@ -4,7 +4,22 @@ REFERENCE_PRICES = {
     "casco": 900,
 }
 
-VARIANT_ORDER = ["compact", "basic", "comfort", "premium"]
+# Cheapest first. Products listed in UNTIERED_PRODUCTS have a single price
+# (e.g. "mtpl"); all others are priced per variant and deductible.
+PRODUCT_ORDER = ["mtpl", "limited_casco", "casco"]
+UNTIERED_PRODUCTS = ["mtpl"]
+PRODUCT_LABELS = {
+    "mtpl": "MTPL",
+    "limited_casco": "Limited Casco",
+    "casco": "Casco",
+}
+
+# Cheapest tier first. Variants in the same tier are not ordered against
+# each other (compact and basic may be priced either way).
+VARIANT_TIERS = [["compact", "basic"], ["comfort"], ["premium"]]
+VARIANT_ORDER = [variant for tier in VARIANT_TIERS for variant in tier]
+
+# Most expensive first: a higher deductible means a lower price.
 DEDUCTIBLE_ORDER = [100, 200, 500]
 
 VARIANT_STEP_PERCENT = 0.07
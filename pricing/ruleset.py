@@ -0,0 +1,403 @@
+from functools import lru_cache
+from math import isnan
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pricing import rules as business_rules
+from pricing.parsing import PriceKey, parse_price_key
+
+
+HIERARCHY = "hierarchy"
+VARIANT = "variant"
+DEDUCTIBLE = "deductible"
+
+RULE_FAMILIES = (HIERARCHY, VARIANT, DEDUCTIBLE)
+
+# Placeholder for slots without a price. Every comparison with NaN is
+# False, so constraints on missing slots never fire.
+MISSING = float("nan")
+
+# What to do when a slot in the middle of a chain has no price:
+#   "skip"    - a constraint is checked only when both of its slots are
+#               present, so nothing is compared across the gap.
+#   "nearest" - additionally compare across the gap: when every slot of the
+#               groups between two present slots is missing, the nearest
+#               present tier, product or deductible on each side must still
+#               be ordered (e.g. basic < premium when no comfort is sold).
+MISSING_POLICIES = ("skip", "nearest")
+
+# Deductible steps are spread evenly when step * levels would exceed this,
+# so the reference price of a long deductible chain stays positive and
+# above the products below it.
+MAX_DEDUCTIBLE_DISCOUNT = 0.3
+
+
+class Constraint(NamedTuple):
+    lower: int
+    higher: int
+    family: str
+
+
+class Bridge(NamedTuple):
+    # A comparison across missing groups of a chain. It applies only when
+    # every slot in gap (a presence bitmask) is missing.
+    lower: int
+    higher: int
+    family: str
+    gap: int
+    gap_slots: Tuple[int, ...]
+
+
+class RuleConfig(NamedTuple):
+    # Hashable snapshot of the values in rules.py (or a market config file).
+    reference_prices: Tuple[Tuple[str, float], ...]
+    product_order: Tuple[str, ...]
+    untiered_products: Tuple[str, ...]
+    product_labels: Tuple[Tuple[str, str], ...]
+    variant_tiers: Tuple[Tuple[str, ...], ...]
+    deductible_order: Tuple[int, ...]
+    variant_step_percent: float
+    deductible_step_percent: float
+
+
+class CompiledRules(NamedTuple):
+    keys: Tuple[str, ...]
+    price_keys: Tuple[PriceKey, ...]
+    slots: Dict[str, int]
+    constraints: Tuple[Constraint, ...]
+    touching: Tuple[Tuple[int, ...], ...]
+    by_family: Dict[str, Tuple[int, ...]]
+    reference: Tuple[float, ...]
+    config: RuleConfig
+    labels: Dict[str, str]
+
+
+def current_config() -> RuleConfig:
+    return RuleConfig(
+        tuple(business_rules.REFERENCE_PRICES.items()),
+        tuple(business_rules.PRODUCT_ORDER),
+        tuple(business_rules.UNTIERED_PRODUCTS),
+        tuple(business_rules.PRODUCT_LABELS.items()),
+        tuple(map(tuple, business_rules.VARIANT_TIERS)),
+        tuple(business_rules.DEDUCTIBLE_ORDER),
+        business_rules.VARIANT_STEP_PERCENT,
+        business_rules.DEDUCTIBLE_STEP_PERCENT,
+    )
+
+
+def variant_tier(variant: str, config: Optional[RuleConfig] = None) -> Optional[int]:
+    config = config or current_config()
+    for index, tier in enumerate(config.variant_tiers):
+        if variant in tier:
+            return index
+    return None
+
+
+def reference_price(
+    product: str,
+    variant: Optional[str],
+    deductible: Optional[int],
+    config: Optional[RuleConfig] = None
+) -> float:
+
+    # One step up per variant tier and one step down per deductible level,
+    # with the deductible discount capped at MAX_DEDUCTIBLE_DISCOUNT.
+    # Unknown variants and deductibles get no adjustment; a product without
+    # a reference price has no reference at all.
+    config = config or current_config()
+    base_price = dict(config.reference_prices).get(product)
+    if base_price is None:
+        raise ValueError(f"No reference price for product: {product}")
+
+    if variant is None or deductible is None:
+        return base_price
+
+    tier = variant_tier(variant, config)
+    variant_multiplier = 1.0
+    if tier is not None:
+        variant_multiplier = 1.0 + tier * config.variant_step_percent
+
+    deductible_multiplier = 1.0
+    if deductible in config.deductible_order:
+        level = config.deductible_order.index(deductible)
+        levels = max(len(config.deductible_order) - 1, 1)
+        step = min(config.deductible_step_percent, MAX_DEDUCTIBLE_DISCOUNT / levels)
+        deductible_multiplier = 1.0 - level * step
+
+    return base_price * variant_multiplier * deductible_multiplier
+
+
+def compile_rules(config: Optional[RuleConfig] = None) -> CompiledRules:
+    # Cached per set of rule values, so editing rules.py (or patching it in
+    # tests) yields a freshly compiled layout and reference table.
+    if config is not None:
+        return _compile(config)
+    return _compile_current(rules_signature())
+
+
+@lru_cache(maxsize=8)
+def _compile_current(signature: Tuple) -> CompiledRules:
+    return _compile(current_config())
+
+
+@lru_cache(maxsize=32)
+def _compile(config: RuleConfig) -> CompiledRules:
+
+    # Every order is a chain, and only neighbours in a chain are compared,
+    # so the number of constraints grows linearly with the catalog.
+    product_order = config.product_order
+    untiered = set(config.untiered_products)
+    variant_tiers = config.variant_tiers
+    variant_order = [variant for tier in variant_tiers for variant in tier]
+    deductible_order = config.deductible_order
+
+    price_keys: List[PriceKey] = []
+    for product in product_order:
+        if product in untiered:
+            price_keys.append(PriceKey(product, product, None, None, len(price_keys)))
+            continue
+        for variant in variant_order:
+            for deductible in deductible_order:
+                key = f"{product}_{variant}_{deductible}"
+                price_keys.append(PriceKey(key, product, variant, deductible, len(price_keys)))
+
+    keys = [price_key.key for price_key in price_keys]
+    slots = {key: slot for slot, key in enumerate(keys)}
+    tiered = [product for product in product_order if product not in untiered]
+
+    def slot(product: str, variant: str, deductible: int) -> int:
+        if product in untiered:
+            return slots[product]
+        return slots[f"{product}_{variant}_{deductible}"]
+
+    constraints: List[Constraint] = []
+
+    # Neighbouring products are compared per variant and deductible. A
+    # product with a single price is compared with every slot of its neighbour.
+    for lower, higher in zip(product_order, product_order[1:]):
+        if lower in untiered and higher in untiered:
+            constraints.append(Constraint(slots[lower], slots[higher], HIERARCHY))
+            continue
+        for variant in variant_order:
+            for deductible in deductible_order:
+                constraints.append(Constraint(
+                    slot(lower, variant, deductible),
+                    slot(higher, variant, deductible),
+                    HIERARCHY,
+                ))
+
+    for product in tiered:
+        for deductible in deductible_order:
+            for lower_tier, higher_tier in zip(variant_tiers, variant_tiers[1:]):
+                for lower in lower_tier:
+                    for higher in higher_tier:
+                        constraints.append(Constraint(
+                            slot(product, lower, deductible),
+                            slot(product, higher, deductible),
+                            VARIANT,
+                        ))
+
+    # A higher deductible means a lower price.
+    for product in tiered:
+        for variant in variant_order:
+            for higher, lower in zip(deductible_order, deductible_order[1:]):
+                constraints.append(Constraint(
+                    slot(product, variant, lower),
+                    slot(product, variant, higher),
+                    DEDUCTIBLE,
+                ))
+
+    # Indices of the constraints each slot takes part in.
+    touching: List[List[int]] = [[] for _ in keys]
+    for index, constraint in enumerate(constraints):
+        touching[constraint.lower].append(index)
+        touching[constraint.higher].append(index)
+
+    by_family = {
+        family: tuple(index for index, constraint in enumerate(constraints) if constraint.family == family)
+        for family in RULE_FAMILIES
+    }
+
+    # Correction falls back to the reference table, so it must be a valid sheet.
+    reference = [reference_price(*price_key, config) for price_key in price_keys]
+    for key, price in zip(keys, reference):
+        if not price > 0:
+            raise ValueError(f"Reference price of {key} is not positive: {price}")
+    for lower, higher, _family in constraints:
+        if reference[lower] >= reference[higher]:
+            raise ValueError(
+                f"Reference prices break their own rules: {keys[lower]} ({reference[lower]}) "
+                f"must be lower than {keys[higher]} ({reference[higher]})"
+            )
+
+    return CompiledRules(
+        tuple(keys),
+        tuple(price_keys),
+        slots,
+        tuple(constraints),
+        tuple(tuple(indices) for indices in touching),
+        by_family,
+        tuple(reference),
+        config,
+        dict(config.product_labels),
+    )
+
+
+def _chains(config: RuleConfig, slots: Dict[str, int]) -> List[Tuple[str, List[List[int]]]]:
+
+    # Every rule family as chains of slot groups, cheapest group first.
+    # Neighbouring groups are exactly the pairs _compile turns into
+    # constraints.
+    untiered = set(config.untiered_products)
+    variant_order = [variant for tier in config.variant_tiers for variant in tier]
+    tiered = [product for product in config.product_order if product not in untiered]
+
+    def slot(product: str, variant: str, deductible: int) -> int:
+        if product in untiered:
+            return slots[product]
+        return slots[f"{product}_{variant}_{deductible}"]
+
+    chains: List[Tuple[str, List[List[int]]]] = []
+    for variant in variant_order:
+        for deductible in config.deductible_order:
+            groups = [[slot(product, variant, deductible)] for product in config.product_order]
+            chains.append((HIERARCHY, groups))
+    for product in tiered:
+        for deductible in config.deductible_order:
+            groups = [[slot(product, variant, deductible) for variant in tier] for tier in config.variant_tiers]
+            chains.append((VARIANT, groups))
+    for product in tiered:
+        for variant in variant_order:
+            groups = [[slot(product, variant, deductible)] for deductible in reversed(config.deductible_order)]
+            chains.append((DEDUCTIBLE, groups))
+    return chains
+
+
+def compile_bridges(rules: CompiledRules) -> Tuple[Bridge, ...]:
+    return _bridges(rules.config)
+
+
+@lru_cache(maxsize=32)
+def _bridges(config: RuleConfig) -> Tuple[Bridge, ...]:
+
+    # Built on first use of the "nearest" policy only. A chain of n groups
+    # has O(n^2) bridges, one per pair of groups that are not neighbours.
+    rules = _compile(config)
+    bridges = {}
+    for family, groups in _chains(config, rules.slots):
+        for start in range(len(groups)):
+            gap_slots: List[int] = []
+            for end in range(start + 2, len(groups)):
+                gap_slots.extend(groups[end - 1])
+                gap = sum(1 << slot for slot in set(gap_slots))
+                for lower in groups[start]:
+                    for higher in groups[end]:
+                        if lower != higher:
+                            bridges.setdefault(
+                                (lower, higher, gap),
+                                Bridge(lower, higher, family, gap, tuple(sorted(set(gap_slots)))),
+                            )
+    return tuple(bridges.values())
+
+
+def check_missing_policy(missing: str) -> None:
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"Unknown missing-slot policy: {missing}")
+
+
+def presence_mask(values: List[float]) -> int:
+    # Bit n is set when slot n has a price.
+    mask = 0
+    for slot, price in enumerate(values):
+        if price == price:
+            mask |= 1 << slot
+    return mask
+
+
+def active_bridges(rules: CompiledRules, values: List[float]) -> List[Tuple[int, Bridge]]:
+
+    # Bridges whose both ends are present and whose gap is fully missing,
+    # with their index in compile_bridges(rules).
+    bridges = compile_bridges(rules)
+    if not bridges:
+        return []
+    mask = presence_mask(values)
+    return [
+        (index, bridge)
+        for index, bridge in enumerate(bridges)
+        if not mask & bridge.gap and mask >> bridge.lower & 1 and mask >> bridge.higher & 1
+    ]
+
+
+def active_constraints(rules: CompiledRules, values: List[float], missing: str = "skip") -> Tuple[Constraint, ...]:
+
+    # The constraints a sheet is held to under the given policy. Presence
+    # never changes during correction, so this is computed once per sheet.
+    check_missing_policy(missing)
+    if missing == "skip":
+        return rules.constraints
+    return rules.constraints + tuple(
+        Constraint(bridge.lower, bridge.higher, bridge.family) for _index, bridge in active_bridges(rules, values)
+    )
+
+
+def rules_signature() -> Tuple:
+
+    # Current values in rules.py. Anything derived from them (cached results,
+    # reference tables) must be rebuilt when this changes. A plain tuple is
+    # cheaper to build than a RuleConfig, and this runs on every call.
+    return (
+        tuple(business_rules.REFERENCE_PRICES.items()),
+        business_rules.VARIANT_STEP_PERCENT,
+        business_rules.DEDUCTIBLE_STEP_PERCENT,
+        tuple(business_rules.PRODUCT_ORDER),
+        tuple(business_rules.UNTIERED_PRODUCTS),
+        tuple(business_rules.PRODUCT_LABELS.items()),
+        tuple(map(tuple, business_rules.VARIANT_TIERS)),
+        tuple(business_rules.DEDUCTIBLE_ORDER),
+    )
+
+
+def product_label(product: str, rules: Optional[CompiledRules] = None) -> str:
+    labels = rules.labels if rules is not None else business_rules.PRODUCT_LABELS
+    return labels.get(product, product.replace("_", " ").title())
+
+
+def lookup_key(key: str, rules: Optional[CompiledRules] = None) -> PriceKey:
+
+    rules = rules or compile_rules()
+    slot = rules.slots.get(key)
+    if slot is not None:
+        return rules.price_keys[slot]
+    return PriceKey(key, *parse_price_key(key))
+
+
+def key_slot(key: str, rules: CompiledRules) -> int:
+
+    # Keys that parse but are not in the compiled layout (an unknown product,
+    # variant or deductible) are rejected rather than left out of every rule.
+    slot = rules.slots.get(key)
+    if slot is None:
+        parse_price_key(key)
+        raise ValueError(f"Price key is not in the catalog: {key}")
+    return slot
+
+
+def is_present(price: float) -> bool:
+    return not isnan(price)
+
+
+def slot_values(prices: Dict[str, float], rules: Optional[CompiledRules] = None) -> List[float]:
+
+    # Fixed-length list indexed by slot, MISSING where the sheet has no price.
+    # Malformed keys and keys outside the layout raise ValueError.
+    rules = rules or compile_rules()
+    values = [MISSING] * len(rules.keys)
+    slots = rules.slots
+
+    for key, price in prices.items():
+        slot = slots.get(key)
+        if slot is None:
+            slot = key_slot(key, rules)
+        values[slot] = price
+
+    return values
@@ -0,0 +1,198 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from pricing.batch import FAMILY_FLAGS, applicable_matrix, constraint_columns, pack_sheets, reset_rows
+from pricing.correction import MAX_ITERATIONS
+from pricing.markets import parse_config
+from pricing.ruleset import RULE_FAMILIES, CompiledRules, RuleConfig, compile_rules
+from pricing.storage import SheetFile
+
+
+# Upper bound on scenario x sheet x slot cells corrected at once. Chunks of
+# the portfolio are sized so that all scenarios fit in this budget together.
+CELL_BUDGET = 1 << 22
+
+
+class Scenario(NamedTuple):
+    name: str
+    config: RuleConfig
+
+
+def scenario(name: str, base: Optional[RuleConfig] = None, **overrides: Any) -> Scenario:
+
+    # A candidate rule set: base (rules.py by default) with the given
+    # settings replaced, e.g. scenario("steep", variant_step_percent=0.1).
+    return Scenario(name, parse_config(overrides, f"scenario {name}", base))
+
+
+class _Report:
+
+    def __init__(self, name: str, rules: CompiledRules):
+        self.name = name
+        self.sheets = 0
+        self.invalid_sheets = 0
+        self.violations = {family: 0 for family in RULE_FAMILIES}
+        self.changed_sheets = 0
+        self.changed_prices = 0
+        self.unresolved_sheets = 0
+        self.products = [price_key.product for price_key in rules.price_keys]
+        self.delta_by_slot = np.zeros(len(rules.keys))
+
+    def result(self) -> Dict[str, Any]:
+        by_product: Dict[str, float] = {}
+        for product, delta in zip(self.products, self.delta_by_slot.tolist()):
+            by_product[product] = by_product.get(product, 0.0) + delta
+        return {
+            "name": self.name,
+            "sheets": self.sheets,
+            "invalid_sheets": self.invalid_sheets,
+            "violations": dict(self.violations),
+            "total_violations": sum(self.violations.values()),
+            "changed_sheets": self.changed_sheets,
+            "changed_prices": self.changed_prices,
+            "unresolved_sheets": self.unresolved_sheets,
+            "premium_delta": {
+                "total": float(self.delta_by_slot.sum()),
+                "by_product": by_product,
+            },
+        }
+
+
+class _Group:
+
+    # Scenarios that share a layout (orders and tiers) share their slots and
+    # constraints, so violations are found once for all of them and only
+    # correction, which depends on the reference table, runs per scenario.
+
+    def __init__(self, source: CompiledRules, scenarios: List[Scenario], missing: str):
+        self.rules = compile_rules(scenarios[0].config)
+        self.reports = [_Report(item.name, self.rules) for item in scenarios]
+        self.reference = np.array([compile_rules(item.config).reference for item in scenarios])
+        self.lower, self.higher, families, self.gaps = constraint_columns(self.rules, missing)
+        self.family_columns = {
+            family: [column for column, column_family in enumerate(families) if column_family == family]
+            for family in FAMILY_FLAGS
+        }
+
+        # Portfolio columns that exist in this layout, and where they go.
+        shared = [(column, self.rules.slots[key]) for column, key in enumerate(source.keys) if key in self.rules.slots]
+        self.source_columns = np.array([column for column, _slot in shared], dtype=np.intp)
+        self.target_slots = np.array([slot for _column, slot in shared], dtype=np.intp)
+
+    def add(self, values: np.ndarray, present: np.ndarray, max_iterations: int) -> None:
+        rows = len(values)
+        slots = len(self.rules.keys)
+        mapped = np.full((rows, slots), np.nan)
+        mapped_present = np.zeros((rows, slots), dtype=bool)
+        mapped[:, self.target_slots] = values[:, self.source_columns]
+        mapped_present[:, self.target_slots] = present[:, self.source_columns]
+
+        applicable = applicable_matrix(mapped_present, self.lower, self.higher, self.gaps)
+        violated = (mapped[:, self.lower] >= mapped[:, self.higher]) & applicable
+        invalid_sheets = int(violated.any(axis=1).sum())
+        family_counts = {family: int(violated[:, columns].sum()) for family, columns in self.family_columns.items()}
+
+        # Every scenario of the group corrected in one stacked pass.
+        count = len(self.reports)
+        stacked = np.tile(mapped, (count, 1))
+        stacked_applicable = np.tile(applicable, (count, 1))
+        row_reference = np.repeat(self.reference, rows, axis=0)
+        corrected = reset_rows(stacked, stacked_applicable, self.lower, self.higher, row_reference, max_iterations)
+
+        unresolved = ((corrected[:, self.lower] >= corrected[:, self.higher]) & stacked_applicable).any(axis=1)
+        delta = np.where(np.tile(mapped_present, (count, 1)), corrected - stacked, 0.0)
+        changed = delta != 0
+
+        delta = delta.reshape(count, rows, slots)
+        changed = changed.reshape(count, rows, slots)
+        unresolved = unresolved.reshape(count, rows)
+
+        for index, report in enumerate(self.reports):
+            report.sheets += rows
+            report.invalid_sheets += invalid_sheets
+            for family, violations in family_counts.items():
+                report.violations[family] += violations
+            report.changed_sheets += int(changed[index].any(axis=1).sum())
+            report.changed_prices += int(changed[index].sum())
+            report.unresolved_sheets += int(unresolved[index].sum())
+            report.delta_by_slot += delta[index].sum(axis=0)
+
+
+def _layout(config: RuleConfig) -> Tuple:
+    return (config.product_order, config.untiered_products, config.variant_tiers, config.deductible_order)
+
+
+class Simulation:
+
+    # Accumulates scenario reports over chunks of a portfolio packed with
+    # the source rules (rules.py by default).
+
+    def __init__(
+        self,
+        scenarios: List[Scenario],
+        source: Optional[CompiledRules] = None,
+        missing: str = "skip",
+        max_iterations: int = MAX_ITERATIONS
+    ):
+        if not scenarios:
+            raise ValueError("At least one scenario is required")
+        names = [item.name for item in scenarios]
+        if len(set(names)) != len(names):
+            raise ValueError("Scenario names must be unique")
+
+        self.source = source or compile_rules()
+        self.names = names
+        self.max_iterations = max_iterations
+
+        grouped: Dict[Tuple, List[Scenario]] = {}
+        for item in scenarios:
+            grouped.setdefault(_layout(item.config), []).append(item)
+        self.groups = [_Group(self.source, items, missing) for items in grouped.values()]
+
+        widest = max(len(group.rules.keys) for group in self.groups)
+        self.chunk_rows = max(1, CELL_BUDGET // (len(scenarios) * widest))
+
+    def add(self, values: np.ndarray, present: np.ndarray) -> None:
+        for start in range(0, len(values), self.chunk_rows):
+            stop = start + self.chunk_rows
+            for group in self.groups:
+                group.add(values[start:stop], present[start:stop], self.max_iterations)
+
+    def results(self) -> List[Dict[str, Any]]:
+        reports = {report.name: report for group in self.groups for report in group.reports}
+        return [reports[name].result() for name in self.names]
+
+
+def simulate(
+    sheets: Iterable[Dict[str, float]],
+    scenarios: List[Scenario],
+    missing: str = "skip",
+    chunk_size: int = 65536
+) -> List[Dict[str, Any]]:
+
+    simulation = Simulation(scenarios, missing=missing)
+    chunk: List[Dict[str, float]] = []
+    for prices in sheets:
+        chunk.append(prices)
+        if len(chunk) >= chunk_size:
+            simulation.add(*pack_sheets(chunk, simulation.source))
+            chunk = []
+    if chunk:
+        simulation.add(*pack_sheets(chunk, simulation.source))
+    return simulation.results()
+
+
+def simulate_file(
+    path: str,
+    scenarios: List[Scenario],
+    missing: str = "skip",
+    chunk_rows: int = 65536
+) -> List[Dict[str, Any]]:
+
+    # One read of a stored portfolio for every scenario.
+    sheets = SheetFile(path)
+    simulation = Simulation(scenarios, sheets.rules, missing)
+    for values, present in sheets.chunks(chunk_rows):
+        simulation.add(np.asarray(values, dtype=np.float64), present)
+    return simulation.results()
@@ -0,0 +1,348 @@
+import asyncio
+import json
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from pricing.markets import MarketRules, resolve_rules
+from pricing.ruleset import CompiledRules
+from pricing.stream import analyze_sheet, error_message
+from pricing.worker import check_request, decode_request, remove_stale_socket
+
+
+# Latency percentiles are computed over the most recent requests only, so
+# metrics stay bounded however long the service runs.
+LATENCY_WINDOW = 10000
+
+# Longest request line a connection accepts. Sheets of large catalogs run to
+# hundreds of KB; a longer line is answered with an error and skipped.
+MAX_REQUEST_BYTES = 16 << 20
+
+Request = Tuple[Dict[str, float], bool, str, Optional[CompiledRules]]
+
+
+def analyze_batch(requests: List[Request]) -> List[Any]:
+
+    # Runs on the backend. Errors are returned in place of results so that
+    # one bad sheet does not fail the rest of its batch.
+    results: List[Any] = []
+    for prices, correct, strategy, rules in requests:
+        try:
+            results.append(analyze_sheet(prices, correct, strategy, rules=rules))
+        except Exception as error:
+            results.append(error)
+    return results
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class BatchingService:
+
+    # Collects concurrent requests into micro-batches. A batch is sent to the
+    # backend once it holds max_batch_size requests or its oldest request has
+    # waited max_latency seconds. The backend is an executor (threads by
+    # default, worker processes with processes=True, or any executor passed
+    # in), so the event loop never runs validation itself. At most
+    # `concurrency` batches are in flight; while they run, new requests queue
+    # up and form the next batch. submit() waits once max_queue requests are
+    # queued.
+
+    def __init__(
+        self,
+        max_batch_size: int = 64,
+        max_latency: float = 0.002,
+        max_queue: int = 1024,
+        concurrency: int = 1,
+        executor: Optional[Executor] = None,
+        processes: bool = False,
+        strategy: str = "reference",
+        markets: Optional[MarketRules] = None
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be positive: {max_batch_size}")
+        if max_queue < 1:
+            raise ValueError(f"max_queue must be positive: {max_queue}")
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be positive: {concurrency}")
+        if max_latency < 0:
+            raise ValueError(f"max_latency must not be negative: {max_latency}")
+
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.max_queue = max_queue
+        self.concurrency = concurrency
+        self.strategy = strategy
+        self.markets = markets
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._processes = processes
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.max_queue_depth = 0
+
+    async def start(self) -> None:
+        if self._batcher is not None:
+            return
+        self._queue = asyncio.Queue(self.max_queue)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self._processes else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.concurrency)
+        self._batcher = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Answers everything already queued before shutting down.
+        if self._batcher is None:
+            return
+        await self._queue.join()
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        self._batcher = None
+        if self._owns_executor:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def __aenter__(self) -> "BatchingService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def submit(
+        self,
+        prices: Dict[str, float],
+        correct: bool = True,
+        strategy: Optional[str] = None,
+        block: bool = True,
+        rules: Optional[CompiledRules] = None
+    ) -> Dict[str, Any]:
+
+        # Returns the analyze_sheet result for prices. With block=False a
+        # full queue raises asyncio.QueueFull instead of waiting.
+        if self._batcher is None:
+            raise RuntimeError("Service is not running")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        item = ((prices, correct, strategy or self.strategy, rules), future, loop.time())
+
+        if block:
+            await self._queue.put(item)
+        else:
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.rejected += 1
+                raise
+
+        self.submitted += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            await self._slots.acquire()
+            batch = [await queue.get()]
+            deadline = batch[0][2] + self.max_latency
+
+            while len(batch) < self.max_batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch: List[Tuple]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            self.batches += 1
+            self.batched_requests += len(batch)
+            requests = [request for request, _future, _queued in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, analyze_batch, requests)
+            except Exception as error:
+                results = [error] * len(batch)
+
+            finished = loop.time()
+            for (_request, future, queued), result in zip(batch, results):
+                self._latencies.append(finished - queued)
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    self.failed += 1
+                    future.set_exception(result)
+                else:
+                    self.completed += 1
+                    future.set_result(result)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+            self._slots.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight_batches": len(self._in_flight),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "latency_us": {
+                name: _percentile(latencies, fraction) * 1e6
+                for name, fraction in [("p50", 0.50), ("p90", 0.90), ("p99", 0.99), ("max", 1.0)]
+            },
+        }
+
+
+async def _answer(
+    service: BatchingService,
+    line: bytes,
+    writer: asyncio.StreamWriter,
+    lock: asyncio.Lock,
+    slots: asyncio.Semaphore
+) -> None:
+    request_id = None
+    try:
+        request = decode_request(line.decode("utf-8", "surrogateescape"))
+        request_id = request.get("id")
+        operation = check_request(request)
+        if operation == "ping":
+            result = {"ok": True}
+        elif operation == "stats":
+            result = service.metrics()
+        else:
+            rules = resolve_rules(request.get("market"), service.markets)
+            result = await service.submit(
+                request["prices"], operation == "correct", request.get("strategy"), rules=rules
+            )
+        response = {"id": request_id, **result}
+    except Exception as error:
+        response = {"id": request_id, "error": error_message(error)}
+
+    try:
+        await _respond(writer, lock, response)
+    finally:
+        slots.release()
+
+
+async def _respond(writer: asyncio.StreamWriter, lock: asyncio.Lock, response: Dict[str, Any]) -> None:
+    async with lock:
+        writer.write(json.dumps(response).encode("utf-8") + b"\n")
+        await writer.drain()
+
+
+async def _read_lines(reader: asyncio.StreamReader) -> AsyncIterator[Optional[bytes]]:
+
+    # Yields each request line, or None for a line longer than the reader's
+    # limit; the rest of that line is skipped so the next one reads cleanly.
+    while True:
+        try:
+            yield await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as error:
+            if error.partial:
+                yield error.partial
+            return
+        except asyncio.LimitOverrunError as error:
+            await reader.read(error.consumed)
+            while True:
+                try:
+                    await reader.readuntil(b"\n")
+                    break
+                except asyncio.IncompleteReadError:
+                    return
+                except asyncio.LimitOverrunError as more:
+                    await reader.read(more.consumed)
+            yield None
+
+
+async def _handle_connection(
+    service: BatchingService,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    limit: int = MAX_REQUEST_BYTES
+) -> None:
+
+    # Requests on one connection are answered as they complete, which may be
+    # out of order; clients match responses by id. At most max_queue requests
+    # per connection are read ahead of their answers, so a client that
+    # pipelines a huge burst is throttled by TCP instead of growing tasks.
+    lock = asyncio.Lock()
+    slots = asyncio.Semaphore(service.max_queue)
+    pending: Set[asyncio.Task] = set()
+    try:
+        async for line in _read_lines(reader):
+            if line is None:
+                await _respond(writer, lock, {"id": None, "error": f"Request line exceeds {limit} bytes"})
+                continue
+            if not line.strip():
+                continue
+            await slots.acquire()
+            task = asyncio.create_task(_answer(service, line, writer, lock, slots))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+    finally:
+        writer.close()
+
+
+async def start_server(
+    service: BatchingService,
+    path: Optional[str] = None,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    limit: int = MAX_REQUEST_BYTES
+) -> asyncio.AbstractServer:
+
+    # Speaks the worker's line protocol on a Unix socket when path is given,
+    # otherwise on a local TCP port. The service must already be started.
+    # Request lines may be up to limit bytes long.
+    def handler(reader, writer):
+        return _handle_connection(service, reader, writer, limit)
+
+    if path is not None:
+        remove_stale_socket(path)
+        return await asyncio.start_unix_server(handler, path, limit=limit)
+    return await asyncio.start_server(handler, host, port, limit=limit)
+
+
+async def serve(service: BatchingService, path: Optional[str] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+    async with service:
+        server = await start_server(service, path, host, port)
+        async with server:
+            await server.serve_forever()
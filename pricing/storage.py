@@ -0,0 +1,201 @@
+import json
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from pricing.batch import correct_packed, pack_sheets, validate_packed
+from pricing.ruleset import CompiledRules, compile_rules
+
+
+# File layout:
+#   MAGIC | uint32 header length | JSON header (padded) | rows
+# Each row holds one float per slot (NaN where missing) followed by a
+# little-endian presence bitmask. The header records the slot keys, so a
+# file can only be read against the layout it was written with.
+MAGIC = b"PRICEBIN"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+WRITE_BLOCK_ROWS = 4096
+
+
+def _record_dtype(dtype: np.dtype, slot_count: int) -> np.dtype:
+    mask_bytes = (slot_count + 7) // 8
+    return np.dtype([("values", dtype, (slot_count,)), ("mask", np.uint8, (mask_bytes,))])
+
+
+def _pack_mask(present: np.ndarray) -> np.ndarray:
+    return np.packbits(present, axis=1, bitorder="little")
+
+
+class SheetWriter:
+
+    def __init__(self, path: str, rules: Optional[CompiledRules] = None, dtype: str = "float64"):
+        self.rules = rules or compile_rules()
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        if self.dtype.kind != "f":
+            raise ValueError(f"Unsupported dtype: {dtype}")
+
+        self.record_dtype = _record_dtype(self.dtype, len(self.rules.keys))
+        self.rows = 0
+        self._pending: List[Dict[str, float]] = []
+        self._file = open(path, "wb")
+        self._write_header()
+
+    def _write_header(self) -> None:
+        header = json.dumps({
+            "format": "pricing-sheets",
+            "version": FORMAT_VERSION,
+            "dtype": self.dtype.str,
+            "keys": list(self.rules.keys),
+        }).encode("utf-8")
+        used = len(MAGIC) + 4 + len(header)
+        header += b" " * (-used % ALIGNMENT)
+
+        self._file.write(MAGIC)
+        self._file.write(struct.pack("<I", len(header)))
+        self._file.write(header)
+
+    def write_rows(self, values: np.ndarray, present: np.ndarray) -> None:
+        self._flush_pending()
+        records = np.empty(len(values), dtype=self.record_dtype)
+        records["values"] = np.where(present, values, np.nan)
+        records["mask"] = _pack_mask(present)
+        self._file.write(records.tobytes())
+        self.rows += len(values)
+
+    def write_sheet(self, prices: Dict[str, float]) -> None:
+        self._pending.append(prices)
+        if len(self._pending) >= WRITE_BLOCK_ROWS:
+            self._flush_pending()
+
+    def _flush_pending(self) -> None:
+        if not self._pending:
+            return
+        sheets, self._pending = self._pending, []
+        self.write_rows(*pack_sheets(sheets, self.rules))
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._flush_pending()
+        self._file.close()
+
+    def __enter__(self) -> "SheetWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class SheetFile:
+
+    # Memory-mapped, read-only view of a sheet file. values and mask are
+    # zero-copy views into the mapping.
+
+    def __init__(self, path: str, rules: Optional[CompiledRules] = None):
+        with open(path, "rb") as handle:
+            if handle.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a price sheet file: {path}")
+            (header_length,) = struct.unpack("<I", handle.read(4))
+            header = json.loads(handle.read(header_length))
+            handle.seek(0, 2)
+            file_size = handle.tell()
+
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported price sheet file version: {header.get('version')}")
+
+        self.rules = rules or compile_rules()
+        self.keys = tuple(header["keys"])
+        if self.keys != self.rules.keys:
+            raise ValueError(f"Price sheet file layout does not match the current rules: {path}")
+
+        self.dtype = np.dtype(header["dtype"])
+        self.record_dtype = _record_dtype(self.dtype, len(self.keys))
+        offset = len(MAGIC) + 4 + header_length
+        self.rows, partial = divmod(file_size - offset, self.record_dtype.itemsize)
+        if partial:
+            # A short trailing row means the file was cut off while written.
+            raise ValueError(
+                f"Price sheet file is truncated: {path} ends {partial} byte(s) into row {self.rows}"
+            )
+
+        if self.rows:
+            self._records = np.memmap(path, dtype=self.record_dtype, mode="r", offset=offset, shape=(self.rows,))
+        else:
+            self._records = np.empty(0, dtype=self.record_dtype)
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._records["values"]
+
+    @property
+    def mask(self) -> np.ndarray:
+        return self._records["mask"]
+
+    def present(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        return np.unpackbits(
+            self.mask[start:stop], axis=1, count=len(self.keys), bitorder="little"
+        ).astype(bool)
+
+    def chunks(self, chunk_rows: int = 65536) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        for start in range(0, self.rows, chunk_rows):
+            stop = min(start + chunk_rows, self.rows)
+            yield self.values[start:stop], self.present(start, stop)
+
+    def sheet(self, row: int) -> Dict[str, float]:
+        values = self.values[row]
+        present = self.present(row, row + 1)[0]
+        return {key: float(values[slot]) for slot, key in enumerate(self.keys) if present[slot]}
+
+    def __len__(self) -> int:
+        return self.rows
+
+
+def write_sheets(
+    path: str,
+    sheets: Iterable[Dict[str, float]],
+    rules: Optional[CompiledRules] = None,
+    dtype: str = "float64"
+) -> int:
+
+    with SheetWriter(path, rules, dtype) as writer:
+        for prices in sheets:
+            writer.write_sheet(prices)
+    return writer.rows
+
+
+def validate_file(
+    path: str,
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip",
+    chunk_rows: int = 65536
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    # rules must have the slot layout the file was written with.
+    sheets = SheetFile(path, rules)
+    counts = np.zeros(sheets.rows, dtype=np.int64)
+    flags = np.zeros(sheets.rows, dtype=np.int64)
+
+    start = 0
+    for values, present in sheets.chunks(chunk_rows):
+        stop = start + len(values)
+        counts[start:stop], flags[start:stop] = validate_packed(values, present, sheets.rules, missing)
+        start = stop
+
+    return counts, flags
+
+
+def correct_file(
+    source: str,
+    target: str,
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip",
+    chunk_rows: int = 65536
+) -> int:
+
+    sheets = SheetFile(source, rules)
+    with SheetWriter(target, sheets.rules, sheets.dtype.name) as writer:
+        for values, present in sheets.chunks(chunk_rows):
+            writer.write_rows(correct_packed(values, present, sheets.rules, missing=missing), present)
+    return writer.rows
@@ -0,0 +1,163 @@
+import json
+from typing import TYPE_CHECKING, Any, Dict, IO, Iterable, Iterator, Optional, Tuple
+
+from pricing.cache import ResultCache
+from pricing.validation import find_violations, validate_prices
+from pricing.correction import correct_delta
+from pricing.ruleset import CompiledRules, compile_rules
+
+if TYPE_CHECKING:
+    from pricing.analytics import PortfolioStats
+
+
+READ_CHUNK_BYTES = 1 << 20
+WRITE_BATCH_RECORDS = 1000
+
+
+def analyze_sheet(
+    prices: Dict[str, float],
+    correct: bool = True,
+    strategy: str = "reference",
+    cache: Optional[ResultCache] = None,
+    rules: Optional[CompiledRules] = None,
+    stats: Optional["PortfolioStats"] = None
+) -> Dict[str, Any]:
+
+    # With a stats sink the violations validation finds are recorded as
+    # well, so portfolio statistics come out of the same pass. The cache
+    # only keeps messages, so it is not used for validation then.
+    if stats is not None:
+        check_stats_rules(stats, rules)
+        violations = find_violations(prices, rules)
+        stats.add_violations(prices, violations)
+        issues = [violation.message for violation in violations]
+    elif cache is not None:
+        issues = list(cache.validate(prices, rules))
+    else:
+        issues = validate_prices(prices, rules)
+    result: Dict[str, Any] = {"issues": issues}
+
+    if correct:
+        if not issues:
+            result["corrected"] = dict(prices)
+            result["changed"] = []
+        elif cache is not None:
+            corrected = cache.correct(prices, strategy, rules)
+            result["corrected"] = corrected
+            result["changed"] = [key for key in prices if prices[key] != corrected[key]]
+        else:
+            corrected = dict(prices)
+            delta = correct_delta(corrected, strategy, rules, apply=True)
+            result["corrected"] = corrected
+            result["changed"] = [change.key for change in delta.changes]
+
+    return result
+
+
+def check_stats_rules(stats: "PortfolioStats", rules: Optional[CompiledRules]) -> None:
+    rules = rules or compile_rules()
+    if stats.rules is not rules and stats.rules.config != rules.config:
+        raise ValueError("Statistics were built for different rules")
+
+
+def read_sheets(infile: IO[str]) -> Iterator[Tuple[int, str]]:
+
+    # readlines(hint) pulls roughly READ_CHUNK_BYTES at a time, so memory
+    # stays bounded by the chunk size and never by the file size. Open the
+    # input with errors="surrogateescape" so that bytes which are not UTF-8
+    # reach process_line and fail only their own record.
+    line_number = 0
+    while True:
+        lines = infile.readlines(READ_CHUNK_BYTES)
+        if not lines:
+            return
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+
+
+def check_utf8(line: str) -> None:
+    # Raises UnicodeDecodeError for bytes smuggled in by surrogateescape.
+    if not line.isascii():
+        line.encode("utf-8", "surrogateescape").decode("utf-8")
+
+
+def error_message(error: Exception) -> str:
+
+    # ValueError and TypeError are how a bad record is reported and carry a
+    # readable message. Anything else (e.g. RecursionError from absurdly
+    # nested JSON) is named, so one record never stops a stream or server.
+    if isinstance(error, (ValueError, TypeError)):
+        return str(error)
+    return f"{type(error).__name__}: {error}"
+
+
+def _parse_record(line: str) -> Tuple[Any, Dict[str, float]]:
+    check_utf8(line)
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object per line")
+    sheet_id, prices = None, record
+    if "prices" in record:
+        sheet_id, prices = record.get("id"), record["prices"]
+    if not isinstance(prices, dict):
+        raise ValueError("Expected prices to be a JSON object")
+    return sheet_id, prices
+
+
+def process_line(
+    line_number: int,
+    line: str,
+    correct: bool = True,
+    strategy: str = "reference",
+    cache: Optional[ResultCache] = None,
+    stats: Optional["PortfolioStats"] = None
+) -> Dict[str, Any]:
+
+    try:
+        sheet_id, prices = _parse_record(line)
+        result = analyze_sheet(prices, correct, strategy, cache, stats=stats)
+    except Exception as error:
+        return {"line": line_number, "error": error_message(error)}
+
+    if sheet_id is not None:
+        return {"id": sheet_id, **result}
+    return {"line": line_number, **result}
+
+
+def write_results(results: Iterable[Dict[str, Any]], outfile: IO[str]) -> int:
+
+    buffer = []
+    count = 0
+
+    for result in results:
+        buffer.append(json.dumps(result))
+        buffer.append("\n")
+        count += 1
+
+        if len(buffer) >= 2 * WRITE_BATCH_RECORDS:
+            outfile.write("".join(buffer))
+            buffer.clear()
+
+    if buffer:
+        outfile.write("".join(buffer))
+    outfile.flush()
+
+    return count
+
+
+def process_stream(
+    infile: IO[str],
+    outfile: IO[str],
+    correct: bool = True,
+    strategy: str = "reference",
+    cache: Optional[ResultCache] = None,
+    stats: Optional["PortfolioStats"] = None
+) -> int:
+
+    results = (
+        process_line(line_number, line, correct, strategy, cache, stats)
+        for line_number, line in read_sheets(infile)
+    )
+    return write_results(results, outfile)
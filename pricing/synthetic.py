@@ -0,0 +1,141 @@
+import random
+from typing import Dict, Iterator, List, Optional
+
+from pricing import rules as business_rules
+from pricing.ruleset import MAX_DEDUCTIBLE_DISCOUNT, CompiledRules, compile_rules, current_config
+
+
+def sheet_layout(extra_variants: int = 0, extra_deductibles: int = 0) -> Dict[str, List]:
+
+    # The configured catalog, with extra variants added as new top tiers and
+    # extra deductibles added above the highest one.
+    tiers = [list(tier) for tier in business_rules.VARIANT_TIERS]
+    tiers += [[f"extra{i + 1}"] for i in range(extra_variants)]
+    deductible_order = business_rules.DEDUCTIBLE_ORDER
+    deductibles = deductible_order + [
+        deductible_order[-1] + 500 * (i + 1) for i in range(extra_deductibles)
+    ]
+    return {
+        "products": list(business_rules.PRODUCT_ORDER),
+        "tiers": tiers,
+        "variants": [variant for tier in tiers for variant in tier],
+        "deductibles": deductibles,
+    }
+
+
+def layout_rules(extra_variants: int = 0, extra_deductibles: int = 0) -> CompiledRules:
+
+    # Rules compiled for the extended catalog, so the extra keys take part in
+    # every rule instead of being rejected as unknown.
+    layout = sheet_layout(extra_variants, extra_deductibles)
+    config = current_config()._replace(
+        variant_tiers=tuple(tuple(tier) for tier in layout["tiers"]),
+        deductible_order=tuple(layout["deductibles"]),
+    )
+    return compile_rules(config)
+
+
+def generate_sheet(
+    rng: random.Random,
+    extra_variants: int = 0,
+    extra_deductibles: int = 0,
+    coverage: float = 1.0,
+    violation_rate: float = 0.0
+) -> Dict[str, float]:
+
+    # Builds a sheet that satisfies every rule, drops slots with probability
+    # 1 - coverage, then scrambles each remaining price with probability
+    # violation_rate.
+    layout = sheet_layout(extra_variants, extra_deductibles)
+    variants = layout["variants"]
+    deductibles = layout["deductibles"]
+    tiers = {variant: index for index, tier in enumerate(layout["tiers"]) for variant in tier}
+
+    scale = rng.uniform(0.8, 1.2)
+    prices: Dict[str, float] = {}
+    base = 0.0
+
+    for product in layout["products"]:
+        # Products without a reference price sit a step above the previous one.
+        base = business_rules.REFERENCE_PRICES.get(product, base / scale * 1.15) * scale
+
+        if product in business_rules.UNTIERED_PRODUCTS:
+            keys = {product: base}
+        else:
+            keys = {}
+            steps = max(len(deductibles) - 1, 1)
+            for variant in variants:
+                for index, deductible in enumerate(deductibles):
+                    variant_multiplier = 1.0 + business_rules.VARIANT_STEP_PERCENT * tiers[variant]
+                    # Spread over the capped discount however many deductibles
+                    # there are, so Limited Casco never drops below MTPL.
+                    deductible_multiplier = 1.0 - MAX_DEDUCTIBLE_DISCOUNT * index / steps
+                    keys[f"{product}_{variant}_{deductible}"] = base * variant_multiplier * deductible_multiplier
+
+        for key, price in keys.items():
+            if rng.random() >= coverage:
+                continue
+            if rng.random() < violation_rate:
+                price *= rng.uniform(0.5, 1.5)
+            prices[key] = round(price, 2)
+
+    return prices
+
+
+def generate_sheets(
+    count: int,
+    seed: int = 0,
+    extra_variants: int = 0,
+    extra_deductibles: int = 0,
+    coverage: float = 1.0,
+    violation_rate: float = 0.0,
+    rng: Optional[random.Random] = None
+) -> Iterator[Dict[str, float]]:
+
+    rng = rng or random.Random(seed)
+    for _ in range(count):
+        yield generate_sheet(rng, extra_variants, extra_deductibles, coverage, violation_rate)
+
+
+def edge_case_sheets(seed: int = 0) -> List[Dict[str, float]]:
+
+    # Hand-picked sheets that tend to expose engine differences: equal
+    # prices, ties between variants of one tier, gaps and extreme values.
+    # Keys outside the layout are left out; every engine rejects them.
+    rng = random.Random(seed)
+    layout = sheet_layout()
+    clean = generate_sheet(rng)
+    keys = list(clean)
+    tiered = [key for key in keys if key not in business_rules.UNTIERED_PRODUCTS]
+
+    sheets: List[Dict[str, float]] = [
+        {},
+        {keys[0]: clean[keys[0]]},
+        dict(clean),
+        {key: 500 for key in keys},
+        {key: 0 for key in keys},
+        {key: 1e-9 * (index + 1) for index, key in enumerate(keys)},
+        {key: 1e12 - index for index, key in enumerate(keys)},
+        {key: round(clean[key]) for key in keys},
+        {key: float(clean[key]) for key in keys[::2]},
+        {key: clean[key] for key in keys[1::3]},
+        {key: clean[key] for key in tiered},
+    ]
+
+    # Variants of one tier at exactly the same price.
+    for tier in layout["tiers"]:
+        if len(tier) > 1:
+            tied = dict(clean)
+            for key in tiered:
+                product, variant, deductible = key.rsplit("_", 2)
+                if variant in tier:
+                    tied[key] = clean[f"{product}_{tier[0]}_{deductible}"]
+            sheets.append(tied)
+
+    # Neighbours equal, one slot at a time.
+    for key in tiered[:: max(1, len(tiered) // 6)]:
+        equal = dict(clean)
+        equal[key] = clean[keys[0]]
+        sheets.append(equal)
+
+    return sheets
@@ -0,0 +1,251 @@
+import csv
+import io
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from pricing.batch import correct_packed, validate_packed
+from pricing.parsing import parse_price_key
+from pricing.ruleset import CompiledRules, compile_rules, key_slot
+
+
+# Wide tables: a header row of column names, then one row per segment. Columns
+# named after a price key (mtpl, casco_basic_100, ...) are read as prices, and
+# blank cells count as missing. A column that looks like a price key of a
+# catalog product but is not in the layout (casco_ultra_100) is an error.
+# Every other column (segment ids, notes) is carried through untouched.
+# Quoted cells are supported as long as they do not span lines. Blank lines
+# hold no row, but they still count for line numbers and are written back.
+READ_CHUNK_BYTES = 1 << 22
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+class TableLayout(NamedTuple):
+    columns: List[str]
+    price_columns: np.ndarray
+    slots: np.ndarray
+
+
+class TableChunk(NamedTuple):
+    first_line: int
+    rows: int
+    cells: List[bytes]
+    quoted: bool
+    values: np.ndarray
+    present: np.ndarray
+    line_numbers: np.ndarray
+    lines: int
+
+
+def table_layout(columns: List[str], rules: Optional[CompiledRules] = None) -> TableLayout:
+
+    # Maps the header to slots once; rows are then parsed column-wise.
+    rules = rules or compile_rules()
+    products = set(rules.config.product_order) | {product for product, _price in rules.config.reference_prices}
+    price_columns, slots = [], []
+    seen = {}
+    for column, name in enumerate(columns):
+        key = name.strip()
+        slot = rules.slots.get(key)
+        if slot is None:
+            try:
+                product, _variant, _deductible = parse_price_key(key)
+            except ValueError:
+                continue
+            if product not in products:
+                continue
+            slot = key_slot(key, rules)
+        if slot in seen:
+            raise ValueError(f"Column {key} appears twice (columns {seen[slot] + 1} and {column + 1})")
+        seen[slot] = column
+        price_columns.append(column)
+        slots.append(slot)
+    return TableLayout(columns, np.array(price_columns, dtype=np.intp), np.array(slots, dtype=np.intp))
+
+
+def _split_cells(data: bytes, width: int, first_line: int) -> Tuple[List[bytes], np.ndarray, bool]:
+
+    # Returns the chunk's cells row by row in one flat list, the line number
+    # of each row and whether the csv module was needed for quoted cells.
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n")
+    if b'"' not in data and b"\n\n" not in data and not data.startswith(b"\n"):
+        # Every line must hold exactly width - 1 commas; a short row next to
+        # a long one would otherwise still add up to rows * width cells.
+        raw = np.frombuffer(data, dtype=np.uint8)
+        ends = np.flatnonzero(raw == ord("\n"))
+        if not data.endswith(b"\n"):
+            ends = np.append(ends, len(raw))
+        commas = np.flatnonzero(raw == ord(","))
+        per_line = np.diff(np.searchsorted(commas, ends), prepend=0)
+        if (per_line == width - 1).all():
+            cells = data.rstrip(b"\n").replace(b"\n", b",").split(b",")
+            return cells, first_line + np.arange(len(ends)), False
+
+    lines = data.split(b"\n")
+    if not lines[-1]:
+        lines.pop()
+    numbered = [(first_line + index, line) for index, line in enumerate(lines) if line]
+    quoted = b'"' in data
+    if quoted:
+        text = [line.decode("utf-8") for _number, line in numbered]
+        rows = [[cell.encode("utf-8") for cell in row] for row in csv.reader(text)]
+    else:
+        rows = [line.split(b",") for _number, line in numbered]
+
+    for (number, _line), row in zip(numbered, rows):
+        if len(row) != width:
+            raise ValueError(f"Line {number}: expected {width} fields, found {len(row)}")
+    line_numbers = np.array([number for number, _line in numbered], dtype=np.int64)
+    return [cell for row in rows for cell in row], line_numbers, quoted
+
+
+def _parse_prices(
+    cells: List[bytes],
+    line_numbers: np.ndarray,
+    layout: TableLayout,
+    slot_count: int
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    # All price cells of the chunk are converted in one vectorised call;
+    # only a chunk containing a malformed number is parsed cell by cell.
+    rows = len(line_numbers)
+    values = np.full((rows, slot_count), np.nan)
+    if not rows or not len(layout.price_columns):
+        return values, ~np.isnan(values)
+
+    cells = np.array(cells, dtype=np.bytes_).reshape(rows, -1)[:, layout.price_columns]
+    cells[cells == b""] = b"nan"
+    try:
+        numbers = cells.astype(np.float64)
+    except ValueError:
+        numbers = np.empty(cells.shape)
+        for (row, column), cell in np.ndenumerate(cells):
+            try:
+                numbers[row, column] = float(cell.strip() or b"nan")
+            except ValueError:
+                name = layout.columns[layout.price_columns[column]].strip()
+                raise ValueError(
+                    f"Line {line_numbers[row]}: {name} is not a number: {cell.decode('utf-8', 'replace')!r}"
+                ) from None
+
+    values[:, layout.slots] = numbers
+    return values, ~np.isnan(values)
+
+
+class WideTable:
+
+    # Reads a wide CSV in chunks of roughly chunk_bytes, each turned straight
+    # into (rows × slots) arrays with a presence mask; no dictionary is built
+    # per row. The raw cells are kept so the table can be written back in
+    # the same column layout and with the line terminator of the header.
+
+    def __init__(self, path: str, rules: Optional[CompiledRules] = None, chunk_bytes: int = READ_CHUNK_BYTES):
+        if chunk_bytes < 1:
+            raise ValueError(f"chunk_bytes must be positive: {chunk_bytes}")
+        self.path = path
+        self.rules = rules or compile_rules()
+        self.chunk_bytes = chunk_bytes
+        with open(path, "rb") as handle:
+            self.header = handle.readline()
+        if not self.header.strip():
+            raise ValueError(f"{path}: missing header row")
+        self.newline = b"\r\n" if self.header.endswith(b"\r\n") else b"\n"
+        text = self.header[len(UTF8_BOM):] if self.header.startswith(UTF8_BOM) else self.header
+        self.columns = next(csv.reader([text.decode("utf-8").rstrip("\r\n")]))
+        self.layout = table_layout(self.columns, self.rules)
+
+    def chunks(self) -> Iterator[TableChunk]:
+        width = len(self.columns)
+        slot_count = len(self.rules.keys)
+        with open(self.path, "rb") as handle:
+            handle.readline()
+            first_line = 2
+            while True:
+                data = handle.read(self.chunk_bytes)
+                if not data:
+                    return
+                if not data.endswith(b"\n"):
+                    data += handle.readline()
+                lines = data.count(b"\n") + (not data.endswith(b"\n"))
+                cells, line_numbers, quoted = _split_cells(data, width, first_line)
+                values, present = _parse_prices(cells, line_numbers, self.layout, slot_count)
+                yield TableChunk(first_line, len(line_numbers), cells, quoted, values, present, line_numbers, lines)
+                first_line += lines
+
+
+def _quote(cell: bytes) -> bytes:
+    if b"," in cell or b'"' in cell or b"\n" in cell:
+        return b'"' + cell.replace(b'"', b'""') + b'"'
+    return cell
+
+
+def write_chunk(
+    outfile: BinaryIO,
+    layout: TableLayout,
+    chunk: TableChunk,
+    corrected: np.ndarray,
+    newline: bytes = b"\n"
+) -> int:
+
+    # Cells whose price did not change are written back byte for byte.
+    cells = list(chunk.cells)
+    width = len(layout.columns)
+    changed = (corrected != chunk.values) & chunk.present
+    rows, indices = np.nonzero(changed[:, layout.slots])
+    positions = rows * width + layout.price_columns[indices]
+    prices = corrected[rows, layout.slots[indices]]
+    for position, price in zip(positions.tolist(), prices.tolist()):
+        cells[position] = repr(price).encode()
+
+    if chunk.quoted:
+        cells = [_quote(cell) for cell in cells]
+    lines = [b",".join(cells[start:start + width]) for start in range(0, len(cells), width)]
+    if chunk.lines != chunk.rows:
+        # Blank lines of the source go back where they were.
+        rows_and_blanks = [b""] * chunk.lines
+        for number, line in zip((chunk.line_numbers - chunk.first_line).tolist(), lines):
+            rows_and_blanks[number] = line
+        lines = rows_and_blanks
+    if lines:
+        outfile.write(newline.join(lines) + newline)
+    return int(changed.sum())
+
+
+def validate_table(
+    path: str,
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip",
+    chunk_bytes: int = READ_CHUNK_BYTES
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    # Violation counts and family flags per data row, as validate_file.
+    table = WideTable(path, rules, chunk_bytes)
+    counts, flags = [], []
+    for chunk in table.chunks():
+        chunk_counts, chunk_flags = validate_packed(chunk.values, chunk.present, table.rules, missing)
+        counts.append(chunk_counts)
+        flags.append(chunk_flags)
+    if not counts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(counts), np.concatenate(flags)
+
+
+def correct_table(
+    source: str,
+    target: str,
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip",
+    chunk_bytes: int = READ_CHUNK_BYTES
+) -> int:
+
+    # Writes the table with the reference strategy applied, in the source
+    # column layout, and returns the number of prices changed.
+    table = WideTable(source, rules, chunk_bytes)
+    changed = 0
+    with open(target, "wb") as outfile:
+        outfile.write(table.header if table.header.endswith(b"\n") else table.header + table.newline)
+        for chunk in table.chunks():
+            corrected = correct_packed(chunk.values, chunk.present, table.rules, missing=missing)
+            changed += write_chunk(outfile, table.layout, chunk, corrected, table.newline)
+    return changed
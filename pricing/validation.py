@@ -1,107 +1,219 @@
-from typing import Dict, List
-from pricing.parsing import build_structured
-from pricing.rules import VARIANT_ORDER, DEDUCTIBLE_ORDER
-
-
-def validate_prices(prices: Dict[str, float]) -> List[str]:
-    
-    issues: List[str] = []
-
-    structured = build_structured(prices)
-    
-    mtpl_price = structured.get("mtpl", {}).get(None, {}).get(None)
-    
- 
-    if mtpl_price is not None and "limited_casco" in structured:
-        for variant in structured["limited_casco"]:
-            for deductible, lc_price in structured["limited_casco"][variant].items():
-                if mtpl_price >= lc_price:
-                    issues.append(
-                        f"MTPL ({mtpl_price}) must be lower than "
-                        f"Limited Casco {variant}_{deductible} ({lc_price})"
-                    )
-    
-
-    if "limited_casco" in structured and "casco" in structured:
-        for variant in VARIANT_ORDER:
-            if variant not in structured["limited_casco"]:
-                continue
-            if variant not in structured["casco"]:
-                continue
-                
-            for deductible in DEDUCTIBLE_ORDER:
-                lc_price = structured["limited_casco"][variant].get(deductible)
-                casco_price = structured["casco"][variant].get(deductible)
-                
-                if lc_price is not None and casco_price is not None:
-                    if lc_price >= casco_price:
-                        issues.append(
-                            f"Limited Casco {variant}_{deductible} ({lc_price}) "
-                            f"must be lower than Casco {variant}_{deductible} ({casco_price})"
-                        )
-    
-    
-    for product in ["limited_casco", "casco"]:
-        if product not in structured:
-            continue
-        
-        for deductible in DEDUCTIBLE_ORDER:
-            compact = structured[product].get("compact", {}).get(deductible)
-            basic = structured[product].get("basic", {}).get(deductible)
-            comfort = structured[product].get("comfort", {}).get(deductible)
-            premium = structured[product].get("premium", {}).get(deductible)
-            
-            
-            if compact is not None and comfort is not None:
-                if compact >= comfort:
-                    issues.append(
-                        f"{product} {deductible}: compact ({compact}) "
-                        f"must be lower than comfort ({comfort})"
-                    )
-            
-            
-            if basic is not None and comfort is not None:
-                if basic >= comfort:
-                    issues.append(
-                        f"{product} {deductible}: basic ({basic}) "
-                        f"must be lower than comfort ({comfort})"
-                    )
-            
-            
-            if comfort is not None and premium is not None:
-                if comfort >= premium:
-                    issues.append(
-                        f"{product} {deductible}: comfort ({comfort}) "
-                        f"must be lower than premium ({premium})"
-                    )
-    
-    
-    for product in ["limited_casco", "casco"]:
-        if product not in structured:
-            continue
-        
-        for variant in VARIANT_ORDER:
-            if variant not in structured[product]:
-                continue
-            
-            p100 = structured[product][variant].get(100)
-            p200 = structured[product][variant].get(200)
-            p500 = structured[product][variant].get(500)
-            
-        
-            if p100 is not None and p200 is not None:
-                if p100 <= p200:
-                    issues.append(
-                        f"{product} {variant}: deductible 100 ({p100}) "
-                        f"must be higher than deductible 200 ({p200})"
-                    )
-            
-            
-            if p200 is not None and p500 is not None:
-                if p200 <= p500:
-                    issues.append(
-                        f"{product} {variant}: deductible 200 ({p200}) "
-                        f"must be higher than deductible 500 ({p500})"
-                    )
-    
-    return issues
\ No newline at end of file
+from time import perf_counter
+from typing import Dict, List, Optional
+from pricing import instrumentation
+from pricing.ruleset import (
+    CompiledRules,
+    Constraint,
+    HIERARCHY,
+    VARIANT,
+    active_bridges,
+    check_missing_policy,
+    compile_bridges,
+    compile_rules,
+    product_label,
+    slot_values,
+)
+
+
+def describe_violation(
+    rules: CompiledRules,
+    constraint: Constraint,
+    lower_price: float,
+    higher_price: float
+) -> str:
+
+    lower_product, lower_variant, lower_deductible = rules.price_keys[constraint.lower]
+    higher_product, higher_variant, higher_deductible = rules.price_keys[constraint.higher]
+
+    if constraint.family == HIERARCHY:
+        lower_label = product_label(lower_product, rules)
+        higher_label = product_label(higher_product, rules)
+        if lower_variant is not None:
+            lower_label = f"{lower_label} {lower_variant}_{lower_deductible}"
+        if higher_variant is not None:
+            higher_label = f"{higher_label} {higher_variant}_{higher_deductible}"
+        return f"{lower_label} ({lower_price}) must be lower than {higher_label} ({higher_price})"
+
+    if constraint.family == VARIANT:
+        return (
+            f"{lower_product} {lower_deductible}: {lower_variant} ({lower_price}) "
+            f"must be lower than {higher_variant} ({higher_price})"
+        )
+
+    return (
+        f"{lower_product} {lower_variant}: deductible {higher_deductible} ({higher_price}) "
+        f"must be higher than deductible {lower_deductible} ({lower_price})"
+    )
+
+
+class Violation:
+
+    # A broken constraint. The message is only formatted when asked for.
+    __slots__ = ("rules", "index", "lower_price", "higher_price")
+
+    def __init__(self, rules: CompiledRules, index: int, lower_price: float, higher_price: float):
+        self.rules = rules
+        self.index = index
+        self.lower_price = lower_price
+        self.higher_price = higher_price
+
+    @property
+    def constraint(self) -> Constraint:
+        # Indices past the compiled constraints refer to bridges across
+        # missing slots (see MISSING_POLICIES).
+        constraints = self.rules.constraints
+        if self.index < len(constraints):
+            return constraints[self.index]
+        return compile_bridges(self.rules)[self.index - len(constraints)]
+
+    @property
+    def bridged(self) -> bool:
+        return self.index >= len(self.rules.constraints)
+
+    @property
+    def rule(self) -> str:
+        return self.constraint.family
+
+    @property
+    def lower_key(self) -> str:
+        return self.rules.keys[self.constraint.lower]
+
+    @property
+    def higher_key(self) -> str:
+        return self.rules.keys[self.constraint.higher]
+
+    @property
+    def message(self) -> str:
+        return describe_violation(self.rules, self.constraint, self.lower_price, self.higher_price)
+
+    def __str__(self) -> str:
+        return self.message
+
+    def __repr__(self) -> str:
+        return (
+            f"Violation({self.rule!r}, {self.lower_key}={self.lower_price!r}, "
+            f"{self.higher_key}={self.higher_price!r})"
+        )
+
+
+def _scan_instrumented(
+    rules: CompiledRules,
+    values: List[float],
+    stats: "instrumentation.Instrumentation",
+    first_only: bool = False
+) -> List[Violation]:
+
+    # Same scan as below, one rule family at a time so each can be timed.
+    stats.record_validation()
+    violations: List[Violation] = []
+
+    for family, indices in rules.by_family.items():
+        started = perf_counter()
+        evaluated = 0
+        found = 0
+        for index in indices:
+            lower, higher, _family = rules.constraints[index]
+            evaluated += 1
+            if values[lower] >= values[higher]:
+                violations.append(Violation(rules, index, values[lower], values[higher]))
+                found += 1
+                if first_only:
+                    break
+        stats.record_rule(family, evaluated, found, perf_counter() - started)
+        if first_only and violations:
+            break
+
+    violations.sort(key=lambda violation: violation.index)
+    return violations
+
+
+def _bridge_violations(rules: CompiledRules, values: List[float]) -> List[Violation]:
+    offset = len(rules.constraints)
+    return [
+        Violation(rules, offset + index, values[bridge.lower], values[bridge.higher])
+        for index, bridge in active_bridges(rules, values)
+        if values[bridge.lower] >= values[bridge.higher]
+    ]
+
+
+def find_violations(
+    prices: Dict[str, float],
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> List[Violation]:
+
+    check_missing_policy(missing)
+    rules = rules or compile_rules()
+    values = slot_values(prices, rules)
+
+    stats = instrumentation.current()
+    if stats is not None:
+        violations = _scan_instrumented(rules, values, stats)
+    else:
+        violations = []
+        for index, (lower, higher, _family) in enumerate(rules.constraints):
+            if values[lower] >= values[higher]:
+                violations.append(Violation(rules, index, values[lower], values[higher]))
+
+    if missing == "nearest":
+        violations.extend(_bridge_violations(rules, values))
+    return violations
+
+
+def count_violations(
+    prices: Dict[str, float],
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> int:
+
+    check_missing_policy(missing)
+    rules = rules or compile_rules()
+    values = slot_values(prices, rules)
+
+    stats = instrumentation.current()
+    if stats is not None:
+        count = len(_scan_instrumented(rules, values, stats))
+    else:
+        count = sum(1 for lower, higher, _family in rules.constraints if values[lower] >= values[higher])
+
+    if missing == "nearest":
+        count += len(_bridge_violations(rules, values))
+    return count
+
+
+def first_violation(
+    prices: Dict[str, float],
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> Optional[Violation]:
+
+    check_missing_policy(missing)
+    rules = rules or compile_rules()
+    values = slot_values(prices, rules)
+
+    stats = instrumentation.current()
+    if stats is not None:
+        violations = _scan_instrumented(rules, values, stats, first_only=True)
+        if violations:
+            return violations[0]
+    else:
+        for index, (lower, higher, _family) in enumerate(rules.constraints):
+            if values[lower] >= values[higher]:
+                return Violation(rules, index, values[lower], values[higher])
+
+    if missing == "nearest":
+        violations = _bridge_violations(rules, values)
+        return violations[0] if violations else None
+    return None
+
+
+def is_valid(prices: Dict[str, float], rules: Optional[CompiledRules] = None, missing: str = "skip") -> bool:
+    return first_violation(prices, rules, missing) is None
+
+
+def validate_prices(
+    prices: Dict[str, float],
+    rules: Optional[CompiledRules] = None,
+    missing: str = "skip"
+) -> List[str]:
+    return [violation.message for violation in find_violations(prices, rules, missing)]
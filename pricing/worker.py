@@ -0,0 +1,184 @@
+import errno
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+from typing import Any, Dict, IO, Optional
+
+from pricing.cache import ResultCache
+from pricing.markets import MarketRules, resolve_rules
+from pricing.stream import analyze_sheet, check_utf8, error_message
+
+
+# Requests are one JSON object per line:
+#   {"id": 7, "op": "correct", "prices": {...}, "strategy": "reference", "market": "de"}
+# op is "validate", "correct" (the default), "ping" or "stats". market picks
+# a rule config from the worker's MarketRules (rules.py when absent). Every
+# response echoes the request id, so clients can pipeline requests and match
+# answers without waiting for each one.
+OPERATIONS = ("validate", "correct", "ping", "stats")
+
+
+def decode_request(line: str) -> Dict[str, Any]:
+    # Lines may carry surrogate-escaped bytes that are not UTF-8; they are
+    # rejected here like any other malformed request.
+    check_utf8(line)
+    request = json.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError("Expected a JSON object per request")
+    return request
+
+
+def check_request(request: Dict[str, Any]) -> str:
+
+    # Fills in the default op and returns it, rejecting unknown operations
+    # and price requests without a prices object.
+    operation = request.setdefault("op", "correct")
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {operation}")
+    if operation in ("validate", "correct") and not isinstance(request.get("prices"), dict):
+        raise ValueError("Expected prices to be a JSON object")
+    return operation
+
+
+class Worker:
+
+    # Long-lived request handler. Imports and compiled rules are paid for
+    # once, and an optional result cache is shared across requests.
+
+    def __init__(
+        self,
+        cache_size: int = 0,
+        strategy: str = "reference",
+        markets: Optional[MarketRules] = None
+    ):
+        self.cache = ResultCache(cache_size) if cache_size > 0 else None
+        self.strategy = strategy
+        self.markets = markets
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def handle(self, line: str) -> Dict[str, Any]:
+        with self._lock:
+            self.requests += 1
+            request_id = None
+            try:
+                request = decode_request(line)
+                request_id = request.get("id")
+                check_request(request)
+                result = self._dispatch(request)
+            except Exception as error:
+                self.errors += 1
+                return {"id": request_id, "error": error_message(error)}
+            return {"id": request_id, **result}
+
+    def _dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        operation = request["op"]
+        if operation == "ping":
+            return {"ok": True}
+        if operation == "stats":
+            return self.stats()
+
+        strategy = request.get("strategy", self.strategy)
+        rules = resolve_rules(request.get("market"), self.markets)
+        return analyze_sheet(request["prices"], operation == "correct", strategy, self.cache, rules)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"requests": self.requests, "errors": self.errors}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        if self.markets is not None:
+            stats["markets"] = self.markets.markets()
+        return stats
+
+    def serve(self, infile: IO[str], outfile: IO[str]) -> int:
+
+        # Answers each request as soon as it is read. The response is flushed
+        # straight away so an interactive client never waits on a buffer.
+        count = 0
+        for line in iter(infile.readline, ""):
+            if not line.strip():
+                continue
+            outfile.write(json.dumps(self.handle(line)))
+            outfile.write("\n")
+            outfile.flush()
+            count += 1
+        return count
+
+
+class _ConnectionHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        infile = self.rfile
+        for raw in iter(infile.readline, b""):
+            if not raw.strip():
+                continue
+            response = self.server.worker.handle(raw.decode("utf-8", "surrogateescape"))
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def remove_stale_socket(path: str) -> None:
+    # A socket left behind by an earlier run is replaced; a socket some
+    # server still listens on, or any other file at the path, is an error
+    # rather than something to delete.
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f"Refusing to replace {path}: not a socket")
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError as error:
+        if error.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+            raise
+    else:
+        raise ValueError(f"Refusing to replace {path}: a server is listening on it")
+    finally:
+        probe.close()
+
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    # One thread per connection, all sharing a single Worker.
+    daemon_threads = True
+
+    def __init__(self, path: str, worker: Optional[Worker] = None):
+        remove_stale_socket(path)
+        self.worker = worker or Worker()
+        self._inode: Optional[int] = None
+        super().__init__(path, _ConnectionHandler)
+
+    def server_bind(self) -> None:
+        super().server_bind()
+        self._inode = os.stat(self.server_address).st_ino
+
+    def server_close(self) -> None:
+        # Only removes the socket this server bound; if the path has since
+        # been taken over, it belongs to someone else.
+        super().server_close()
+        try:
+            inode = os.stat(self.server_address).st_ino
+        except FileNotFoundError:
+            return
+        if inode == self._inode:
+            os.unlink(self.server_address)
+
+
+def serve_socket(path: str, worker: Optional[Worker] = None) -> None:
+    with WorkerServer(path, worker) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
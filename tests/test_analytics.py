@@ -0,0 +1,168 @@
+import io
+import json
+import random
+import statistics
+
+import pytest
+
+from pricing.analytics import PortfolioStats, QuantileSketch, Summary, collect_stats
+from pricing.correction import calculate_reference_price
+from pricing.ruleset import compile_rules
+from pricing.stream import analyze_sheet, process_stream
+from pricing.synthetic import generate_sheets
+from pricing.validation import count_violations, find_violations
+
+
+def test_summary_matches_exact_statistics():
+    rng = random.Random(1)
+    values = [rng.gauss(50, 20) for _ in range(20000)]
+    summary = Summary()
+    for value in values:
+        summary.add(value)
+
+    result = summary.result()
+    ordered = sorted(values)
+
+    assert result["count"] == len(values)
+    assert result["mean"] == pytest.approx(statistics.mean(values))
+    assert result["variance"] == pytest.approx(statistics.variance(values))
+    assert result["min"] == ordered[0]
+    assert result["max"] == ordered[-1]
+    for name, fraction in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99)]:
+        assert result[name] == pytest.approx(ordered[int(fraction * (len(values) - 1))], rel=0.03)
+
+
+def test_summary_merge_equals_single_pass():
+    rng = random.Random(2)
+    values = [rng.uniform(-100, 100) for _ in range(5000)]
+    whole, left, right = Summary(), Summary(), Summary()
+    for index, value in enumerate(values):
+        whole.add(value)
+        (left if index % 3 else right).add(value)
+
+    merged = left.merge(right).result()
+    expected = whole.result()
+
+    for name, value in expected.items():
+        assert merged[name] == pytest.approx(value)
+
+
+def test_sketch_memory_is_bounded():
+    sketch = QuantileSketch(max_buckets=64)
+    for exponent in range(-300, 300):
+        sketch.add(10.0 ** exponent)
+
+    assert len(sketch.positive) <= 64
+    assert sketch.quantile(1.0) == pytest.approx(1e299, rel=0.02)
+
+
+def test_portfolio_stats_counts_violations():
+    prices = {
+        "mtpl": 400,
+        "casco_basic_100": 700,
+        "casco_basic_200": 750,
+        "casco_comfort_100": 900,
+    }
+    stats = PortfolioStats()
+
+    assert stats.add(prices) == count_violations(prices) == 1
+    result = stats.result()
+
+    assert result["sheets"] == 1
+    assert result["invalid_sheets"] == 1
+    assert result["families"]["deductible"]["violations"] == 1
+    assert result["families"]["deductible"]["gap"]["max"] == 50
+    assert result["slots"]["casco_basic_200"]["violated_sheets"] == 1
+    assert result["slots"]["mtpl"]["violated_sheets"] == 0
+    assert result["slots"]["mtpl"]["drift"]["mean"] == 400 - calculate_reference_price("mtpl", None, None)
+    assert "casco_premium_500" not in result["slots"]
+
+
+def test_collect_stats_merges_partial_aggregates():
+    sheets = list(generate_sheets(600, seed=4, coverage=0.8, violation_rate=0.1))
+    single = PortfolioStats()
+    for prices in sheets:
+        single.add(prices)
+
+    expected = single.result()
+    merged = collect_stats(sheets, workers=1, chunk_size=64).result()
+
+    assert merged["sheets"] == expected["sheets"] == 600
+    assert merged["invalid_sheets"] == expected["invalid_sheets"]
+    assert merged["slots"].keys() == expected["slots"].keys()
+    for family, counts in expected["families"].items():
+        assert merged["families"][family]["violations"] == counts["violations"]
+        assert merged["families"][family]["gap"] == pytest.approx(counts["gap"])
+    for key, slot in expected["slots"].items():
+        assert merged["slots"][key]["drift"] == pytest.approx(slot["drift"])
+
+
+def test_collect_stats_with_worker_processes():
+    sheets = list(generate_sheets(200, seed=5, violation_rate=0.1))
+
+    result = collect_stats(sheets, workers=2, chunk_size=50).result()
+
+    assert result["sheets"] == 200
+    assert result["invalid_sheets"] == sum(1 for prices in sheets if count_violations(prices))
+
+
+def test_collect_stats_with_market_rules():
+    market = compile_rules(compile_rules().config._replace(deductible_order=(0, 300)))
+    sheets = [{"casco_basic_0": 900, "casco_basic_300": 950}, {"casco_basic_0": 950, "casco_basic_300": 900}]
+
+    stats = collect_stats(sheets, workers=2, chunk_size=1, rules=market)
+
+    assert stats.rules.config == market.config
+    assert stats.result()["invalid_sheets"] == 1
+    assert stats.result()["families"]["deductible"]["violations"] == 1
+
+
+def test_merge_rejects_different_rules():
+    other = compile_rules(compile_rules().config._replace(variant_step_percent=0.2))
+
+    with pytest.raises(ValueError, match="different rules"):
+        PortfolioStats().merge(PortfolioStats(other))
+
+
+def test_empty_summary():
+    assert Summary().result() == {"count": 0}
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_add_violations_matches_add():
+    sheets = list(generate_sheets(300, seed=6, coverage=0.7, violation_rate=0.2))
+    checked, recorded = PortfolioStats(), PortfolioStats()
+
+    for prices in sheets:
+        assert recorded.add_violations(prices, find_violations(prices)) == checked.add(prices)
+
+    assert recorded.result() == checked.result()
+
+
+def test_stats_survive_json_round_trip():
+    stats = collect_stats(generate_sheets(200, seed=7, violation_rate=0.2), workers=1)
+
+    restored = PortfolioStats.from_dict(json.loads(json.dumps(stats.to_dict())))
+
+    assert restored.result() == stats.result()
+    with pytest.raises(ValueError, match="different catalog"):
+        PortfolioStats.from_dict({**stats.to_dict(), "slots": []})
+
+
+def test_stream_feeds_stats_sink():
+    sheets = list(generate_sheets(150, seed=8, coverage=0.8, violation_rate=0.2))
+    text = "\n".join(json.dumps(prices) for prices in sheets) + "\nnot json\n"
+    stats, expected = PortfolioStats(), PortfolioStats()
+    for prices in sheets:
+        expected.add(prices)
+
+    process_stream(io.StringIO(text), io.StringIO(), stats=stats)
+
+    assert stats.result() == expected.result()
+
+
+def test_stats_sink_rejects_other_rules():
+    other = compile_rules(compile_rules().config._replace(variant_step_percent=0.2))
+
+    with pytest.raises(ValueError, match="different rules"):
+        analyze_sheet({"mtpl": 400}, stats=PortfolioStats(other))
@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from pricing.batch import (
+    DEDUCTIBLE_VIOLATION,
+    HIERARCHY_VIOLATION,
+    VARIANT_VIOLATION,
+    correct_batch,
+    describe_flags,
+    validate_batch,
+)
+from pricing.correction import correct_prices
+from pricing.validation import validate_prices
+
+
+def _random_sheet(rng):
+    prices = {}
+    if rng.random() < 0.9:
+        prices["mtpl"] = rng.randint(300, 900)
+    for product in ["limited_casco", "casco"]:
+        for variant in ["compact", "basic", "comfort", "premium"]:
+            for deductible in [100, 200, 500]:
+                if rng.random() < 0.8:
+                    prices[f"{product}_{variant}_{deductible}"] = rng.randint(300, 1200)
+    return prices
+
+
+def test_batch_matches_validate_prices():
+    rng = random.Random(7)
+    sheets = [_random_sheet(rng) for _ in range(200)]
+
+    counts, flags = validate_batch(sheets)
+
+    for sheet, count in zip(sheets, counts):
+        assert count == len(validate_prices(sheet))
+    assert all((count == 0) == (flag == 0) for count, flag in zip(counts, flags))
+
+
+def test_batch_valid_sheet():
+    prices = {
+        "mtpl": 400,
+        "limited_casco_basic_100": 700,
+        "limited_casco_basic_200": 630,
+        "casco_basic_100": 900,
+    }
+    counts, flags = validate_batch([prices])
+    assert counts[0] == 0
+    assert flags[0] == 0
+
+
+def test_batch_flags_per_rule_family():
+    sheets = [
+        {"mtpl": 450, "limited_casco_basic_100": 420},
+        {"casco_basic_100": 900, "casco_comfort_100": 850},
+        {"casco_basic_200": 800, "casco_basic_500": 850},
+    ]
+    counts, flags = validate_batch(sheets)
+
+    assert list(counts) == [1, 1, 1]
+    assert flags[0] == HIERARCHY_VIOLATION
+    assert flags[1] == VARIANT_VIOLATION
+    assert flags[2] == DEDUCTIBLE_VIOLATION
+    assert describe_flags(HIERARCHY_VIOLATION | DEDUCTIBLE_VIOLATION) == ["hierarchy", "deductible"]
+
+
+def test_batch_empty_and_partial_sheets():
+    counts, flags = validate_batch([{}, {"mtpl": 400}, {"casco_premium_500": 800}])
+    assert list(counts) == [0, 0, 0]
+    assert list(flags) == [0, 0, 0]
+
+
+def test_batch_rejects_invalid_keys():
+    with pytest.raises(ValueError, match="Unexpected key format"):
+        validate_batch([{"invalid_key": 100}])
+
+
+def test_correct_batch_matches_correct_prices():
+    rng = random.Random(9)
+    sheets = [_random_sheet(rng) for _ in range(200)]
+
+    for prices, corrected in zip(sheets, correct_batch(sheets)):
+        assert corrected == correct_prices(prices)
+
+
+def test_batch_nearest_policy_matches_scalar():
+    rng = random.Random(13)
+    sheets = [_random_sheet(rng) for _ in range(200)]
+
+    counts, flags = validate_batch(sheets, missing="nearest")
+
+    for sheet, count in zip(sheets, counts):
+        assert count == len(validate_prices(sheet, missing="nearest"))
+    for prices, corrected in zip(sheets, correct_batch(sheets, missing="nearest")):
+        assert corrected == correct_prices(prices, missing="nearest")
+    assert counts.sum() > validate_batch(sheets)[0].sum()
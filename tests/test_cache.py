@@ -0,0 +1,85 @@
+import pytest
+
+from pricing import rules
+from pricing.cache import ResultCache, sheet_fingerprint
+from pricing.correction import correct_prices
+from pricing.stream import analyze_sheet
+from pricing.validation import validate_prices
+
+
+PRICES = {
+    "mtpl": 400,
+    "limited_casco_basic_100": 820,
+    "casco_basic_100": 750,
+}
+
+
+def test_fingerprint_ignores_key_order():
+    reordered = dict(reversed(list(PRICES.items())))
+
+    assert sheet_fingerprint(PRICES) == sheet_fingerprint(reordered)
+    assert sheet_fingerprint(PRICES) != sheet_fingerprint({**PRICES, "mtpl": 401})
+
+
+def test_cache_hits_and_results():
+    cache = ResultCache()
+
+    assert list(cache.validate(PRICES)) == validate_prices(PRICES)
+    assert cache.validate(dict(PRICES)) == cache.validate(PRICES)
+    assert cache.correct(PRICES) == correct_prices(PRICES)
+    assert cache.correct(PRICES, strategy="projection") == correct_prices(PRICES, strategy="projection")
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+    assert stats["size"] == 3
+
+
+def test_cached_results_are_defensive_copies():
+    cache = ResultCache()
+
+    corrected = cache.correct(PRICES)
+    corrected["mtpl"] = 0
+
+    assert cache.correct(PRICES)["mtpl"] == 400
+    assert isinstance(cache.validate(PRICES), tuple)
+
+
+def test_lru_eviction():
+    cache = ResultCache(maxsize=2)
+    sheets = [{"mtpl": price} for price in (400, 410, 420)]
+
+    cache.validate(sheets[0])
+    cache.validate(sheets[1])
+    cache.validate(sheets[0])
+    cache.validate(sheets[2])
+
+    assert cache.stats()["evictions"] == 1
+    cache.validate(sheets[0])
+    assert cache.stats()["hits"] == 2
+    cache.validate(sheets[1])
+    assert cache.stats()["misses"] == 4
+
+
+def test_invalidated_when_reference_values_change(monkeypatch):
+    cache = ResultCache()
+    cache.correct(PRICES)
+
+    monkeypatch.setitem(rules.REFERENCE_PRICES, "casco", 950)
+    corrected = cache.correct(PRICES)
+
+    assert corrected["casco_basic_100"] == 950
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_rejects_bad_size():
+    with pytest.raises(ValueError, match="maxsize"):
+        ResultCache(maxsize=0)
+
+
+def test_analyze_sheet_with_cache():
+    cache = ResultCache()
+
+    assert analyze_sheet(PRICES, cache=cache) == analyze_sheet(PRICES)
+    assert analyze_sheet(PRICES, cache=cache) == analyze_sheet(PRICES)
+    assert cache.stats()["hits"] == 2
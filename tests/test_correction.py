@@ -1,5 +1,16 @@
+import random
+
 import pytest
-from pricing.correction import calculate_reference_price, correct_prices
+from pricing import rules
+from pricing.correction import (
+    calculate_reference_price,
+    correct_delta,
+    correct_prices,
+    repair_components,
+    reset_to_reference,
+)
+from pricing.ruleset import compile_rules
+from pricing.synthetic import edge_case_sheets, generate_sheets
 from pricing.validation import validate_prices
 
 
@@ -108,4 +119,178 @@ def test_correct_prices_with_perfect_input():
     corrected = correct_prices(prices)
     
     for key in prices:
-        assert corrected[key] == pytest.approx(prices[key], rel=0.01)
\ No newline at end of file
+        assert corrected[key] == pytest.approx(prices[key], rel=0.01)
+
+
+def test_projection_strategy_fixes_all_violations():
+    prices = {
+        "mtpl": 1000,
+        "limited_casco_basic_100": 100,
+        "limited_casco_basic_200": 150,
+        "casco_basic_100": 50,
+        "casco_comfort_100": 40,
+    }
+
+    corrected = correct_prices(prices, strategy="projection")
+
+    assert validate_prices(corrected) == []
+
+
+def test_projection_strategy_keeps_valid_prices():
+    prices = {
+        "mtpl": 400,
+        "limited_casco_basic_100": 700,
+        "limited_casco_basic_200": 630,
+        "casco_basic_100": 900,
+    }
+
+    assert correct_prices(prices, strategy="projection") == prices
+
+
+def test_projection_only_moves_violating_prices():
+    prices = {
+        "mtpl": 400,
+        "casco_basic_100": 700,
+        "casco_basic_200": 750,
+        "casco_comfort_500": 900,
+    }
+
+    corrected = correct_prices(prices, strategy="projection")
+
+    assert corrected["mtpl"] == 400
+    assert corrected["casco_comfort_500"] == 900
+    assert corrected["casco_basic_100"] > corrected["casco_basic_200"]
+    assert validate_prices(corrected) == []
+
+
+def test_projection_leaves_unrelated_prices_alone():
+    prices = {
+        "mtpl": 400,
+        "limited_casco_basic_500": 400.5,
+        "casco_premium_100": 900,
+        "casco_premium_200": 950,
+    }
+
+    delta = correct_delta(prices, strategy="projection")
+
+    assert [change.key for change in delta.changes] == ["casco_premium_100", "casco_premium_200"]
+    assert all(change.rule == "deductible" for change in delta.changes)
+    assert delta.valid
+
+
+def test_projection_on_random_sheets():
+    rng = random.Random(3)
+    for _ in range(100):
+        prices = {"mtpl": rng.randint(300, 1200)}
+        for product in ["limited_casco", "casco"]:
+            for variant in ["compact", "basic", "comfort", "premium"]:
+                for deductible in [100, 200, 500]:
+                    if rng.random() < 0.7:
+                        prices[f"{product}_{variant}_{deductible}"] = rng.randint(300, 1200)
+
+        corrected = correct_prices(prices, strategy="projection")
+
+        assert validate_prices(corrected) == []
+        assert set(corrected) == set(prices)
+
+
+def test_projection_never_goes_negative():
+    sheets = [
+        {"mtpl": 0.5, "limited_casco_basic_100": 0.4, "casco_basic_100": 0.3},
+        {key: 0.0 for key in compile_rules().keys},
+        *edge_case_sheets(),
+    ]
+    for prices in sheets:
+        corrected = correct_prices(prices, strategy="projection")
+
+        assert min(corrected.values(), default=0) >= 0
+        assert validate_prices(corrected) == []
+
+
+def test_component_strategy_matches_reference():
+    for prices in generate_sheets(300, seed=5, coverage=0.8, violation_rate=0.2):
+        expected, _iterations = reset_to_reference(prices)
+        corrected = correct_prices(prices, strategy="component")
+
+        assert corrected == expected
+        assert validate_prices(corrected) == []
+
+
+def test_component_strategy_repairs_components_separately():
+    prices = {
+        "mtpl": 400,
+        "casco_basic_100": 700,
+        "casco_basic_200": 750,
+        "casco_comfort_500": 1200,
+        "limited_casco_premium_100": 200,
+        "limited_casco_premium_200": 900,
+    }
+
+    corrected, components = repair_components(prices)
+
+    assert components == 2
+    assert corrected["mtpl"] == 400
+    assert corrected["casco_comfort_500"] == 1200
+    assert corrected["casco_basic_100"] == calculate_reference_price("casco", "basic", 100)
+    assert validate_prices(corrected) == []
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError, match="Unknown correction strategy"):
+        correct_prices({"mtpl": 400}, strategy="magic")
+
+
+def test_correction_follows_changed_reference_values(monkeypatch):
+    monkeypatch.setitem(rules.REFERENCE_PRICES, "casco", 1000)
+    corrected = correct_prices({"limited_casco_basic_100": 820, "casco_basic_100": 750})
+
+    assert corrected["casco_basic_100"] == 1000
+
+
+def test_correct_delta_lists_only_changes():
+    prices = {
+        "mtpl": 400,
+        "casco_basic_100": 700,
+        "casco_basic_200": 750,
+        "casco_comfort_500": 900,
+    }
+
+    delta = correct_delta(prices)
+    corrected = correct_prices(prices)
+
+    assert delta.valid
+    assert {change.key for change in delta.changes} == {
+        key for key in prices if prices[key] != corrected[key]
+    }
+    for change in delta.changes:
+        assert change.old == prices[change.key]
+        assert change.new == corrected[change.key]
+        assert change.rule == "deductible"
+    assert prices["casco_basic_200"] == 750
+
+
+def test_correct_delta_apply_in_place():
+    prices = {"mtpl": 1000, "limited_casco_basic_100": 100, "casco_basic_100": 50}
+    expected = correct_prices(prices, strategy="projection")
+
+    delta = correct_delta(prices, strategy="projection", apply=True)
+
+    assert prices == expected
+    assert all(change.rule == "hierarchy" for change in delta.changes)
+
+
+def test_correct_delta_valid_prices():
+    delta = correct_delta({"mtpl": 400, "casco_basic_100": 900})
+
+    assert delta.changes == []
+    assert delta.valid
+
+
+def test_correction_across_missing_deductible():
+    prices = {"casco_basic_100": 800, "casco_basic_500": 850}
+
+    assert correct_prices(prices) == prices
+    for strategy in ["reference", "projection"]:
+        corrected = correct_prices(prices, strategy, missing="nearest")
+        assert corrected != prices
+        assert validate_prices(corrected, missing="nearest") == []
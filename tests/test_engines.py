@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from pricing.correction import correct_prices
+from pricing.engines import ENGINES, Engine, check_engines, compare_engine, register_engine
+from pricing.synthetic import edge_case_sheets, generate_sheets
+from pricing.validation import validate_prices
+
+
+SHEETS = edge_case_sheets() + list(generate_sheets(100, seed=8, coverage=0.8, violation_rate=0.2))
+
+
+def test_edge_case_sheets_cover_ties_and_gaps():
+    sheets = edge_case_sheets()
+
+    assert {} in sheets
+    assert any(len(set(prices.values())) == 1 and len(prices) > 1 for prices in sheets)
+    assert any(validate_prices(prices) for prices in sheets)
+
+
+def test_registered_engines_match_reference():
+    reports = check_engines(SHEETS, repeats=1)
+
+    assert {report["engine"] for report in reports} == set(ENGINES) - {"python"}
+    for report in reports:
+        assert report["accepted"], report["problems"]
+        assert all(check["mismatches"] == 0 for check in report["checks"].values())
+
+
+def test_disagreeing_engine_is_rejected():
+    def off_by_a_cent(sheets):
+        return [{key: price + 0.01 for key, price in correct_prices(prices).items()} for prices in sheets]
+
+    report = compare_engine(Engine("sloppy", None, off_by_a_cent), SHEETS, repeats=1)
+
+    assert not report["accepted"]
+    assert report["checks"]["correct"]["mismatches"] == sum(1 for prices in SHEETS if prices)
+    assert report["problems"][0].startswith("correct disagrees on sheet")
+
+    loose = compare_engine(Engine("sloppy", None, off_by_a_cent), SHEETS, tolerance=0.02, repeats=1)
+    assert loose["accepted"]
+
+
+def test_engine_breaking_different_constraints_is_rejected():
+    reference = ENGINES["python"]
+
+    def swapped(sheets):
+        # Same violation count and families, other constraints.
+        return [
+            tuple((higher, lower, family) for lower, higher, family in found)
+            for found in reference.validate(sheets)
+        ]
+
+    report = compare_engine(Engine("swapped", swapped, None), SHEETS, repeats=1)
+
+    assert not report["accepted"]
+    assert report["checks"]["validate"]["mismatches"] == sum(1 for prices in SHEETS if validate_prices(prices))
+
+
+def test_slow_engine_is_rejected():
+    reference = ENGINES["python"]
+
+    def slow(sheets):
+        time.sleep(0.05)
+        return reference.validate(sheets)
+
+    report = compare_engine(Engine("slow", slow, None), SHEETS[:5], min_speedup=0.9, repeats=1)
+
+    assert report["checks"]["validate"]["mismatches"] == 0
+    assert report["checks"]["validate"]["speedup"] < 0.9
+    assert not report["accepted"]
+
+
+def test_register_engine_rejects_duplicates():
+    with pytest.raises(ValueError, match="already registered: python"):
+        register_engine("python", validate=lambda sheets: [])
+    with pytest.raises(ValueError, match="Unknown engine: nope"):
+        check_engines(SHEETS, ["nope"])
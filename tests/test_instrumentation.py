@@ -0,0 +1,68 @@
+from pricing import instrumentation
+from pricing.correction import correct_prices, reset_to_reference
+from pricing.validation import count_violations, is_valid, validate_prices
+
+
+PRICES = {
+    "mtpl": 450,
+    "limited_casco_basic_100": 420,
+    "limited_casco_basic_200": 450,
+    "casco_basic_100": 400,
+}
+
+
+def test_disabled_by_default():
+    assert instrumentation.current() is None
+
+
+def test_rule_counters():
+    with instrumentation.instrumented() as stats:
+        issues = validate_prices(PRICES)
+        count_violations(PRICES)
+
+    snapshot = stats.snapshot()
+    assert instrumentation.current() is None
+    assert snapshot["sheets_validated"] == 2
+    assert snapshot["rules"]["hierarchy"]["evaluations"] == 2 * 24
+    assert sum(rule["violations"] for rule in snapshot["rules"].values()) == 2 * len(issues)
+    assert all(rule["seconds"] >= 0 for rule in snapshot["rules"].values())
+
+
+def test_fail_fast_counts_only_what_it_evaluates():
+    with instrumentation.instrumented() as stats:
+        assert not is_valid(PRICES)
+
+    snapshot = stats.snapshot()
+    assert snapshot["rules"]["hierarchy"]["violations"] == 1
+    assert snapshot["rules"]["variant"]["evaluations"] == 0
+
+
+def test_correction_counters():
+    with instrumentation.instrumented() as stats:
+        corrected, iterations = reset_to_reference(PRICES)
+        correct_prices({"mtpl": 400}, strategy="projection")
+
+    snapshot = stats.snapshot()
+    assert snapshot["sheets_corrected"] == 2
+    assert snapshot["iterations"][iterations] == 1
+    assert len(snapshot["keys_reset_per_iteration"]) == iterations
+    assert snapshot["not_converged"] == 0
+
+
+def test_not_converged_is_counted():
+    with instrumentation.instrumented() as stats:
+        reset_to_reference(PRICES, max_iterations=0)
+
+    assert stats.snapshot()["not_converged"] == 1
+
+
+def test_callback_hook():
+    events = []
+    with instrumentation.instrumented(callback=lambda event, data: events.append((event, data))):
+        validate_prices(PRICES)
+        correct_prices(PRICES)
+
+    names = [event for event, _data in events]
+    assert names.count("rule") >= 3
+    assert names[-1] == "correction"
+    assert events[-1][1]["strategy"] == "reference"
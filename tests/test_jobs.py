@@ -0,0 +1,218 @@
+import io
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+from pricing.analytics import PortfolioStats
+from pricing.jobs import Coordinator, create_job, finished_shards, load_manifest, merge_job, run_job, work
+from pricing.stream import process_stream
+from pricing.synthetic import generate_sheets
+
+
+def _input(tmp_path, count=95):
+    lines = [json.dumps(prices) for prices in generate_sheets(count, seed=9, violation_rate=0.1)]
+    lines.insert(10, "")
+    lines.insert(20, "not json")
+    path = tmp_path / "sheets.jsonl"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def _expected(path):
+    outfile = io.StringIO()
+    with open(path) as infile:
+        process_stream(infile, outfile)
+    return outfile.getvalue()
+
+
+def _merged(job_dir):
+    outfile = io.StringIO()
+    merge_job(job_dir, outfile)
+    return outfile.getvalue()
+
+
+def test_create_job_splits_into_shards(tmp_path):
+    path = _input(tmp_path)
+    manifest = create_job(path, str(tmp_path / "job"), shard_size=10)
+
+    assert len(manifest["shards"]) == 10
+    assert manifest["shards"][1][2] == 11
+    assert create_job(path, str(tmp_path / "job"), shard_size=10) == manifest
+    with pytest.raises(ValueError, match="different input or options"):
+        create_job(path, str(tmp_path / "job"), shard_size=20)
+
+
+def test_workers_join_and_leave(tmp_path):
+    path = _input(tmp_path)
+    job_dir = str(tmp_path / "job")
+    create_job(path, job_dir, shard_size=7)
+
+    with Coordinator(job_dir) as coordinator:
+        host, port = coordinator.address
+        # One worker leaves after two shards, two more join later.
+        assert work(host, port, "early", max_shards=2) == 2
+        threads = [threading.Thread(target=work, args=(host, port, f"late-{i}")) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        assert coordinator.wait(10)
+        for thread in threads:
+            thread.join()
+        assert coordinator.progress()["done"] == 14
+
+    assert _merged(job_dir) == _expected(path)
+
+
+def test_resume_after_crash(tmp_path):
+    path = _input(tmp_path)
+    job_dir = str(tmp_path / "job")
+    create_job(path, job_dir, shard_size=10)
+
+    with Coordinator(job_dir) as coordinator:
+        work(*coordinator.address, max_shards=4)
+
+    manifest = load_manifest(job_dir)
+    assert finished_shards(job_dir, manifest) == [0, 1, 2, 3]
+    with pytest.raises(ValueError, match="6 unfinished"):
+        merge_job(job_dir, io.StringIO())
+
+    # A shard output without its checkpoint counts as unfinished.
+    os.remove(os.path.join(job_dir, "shard-00003.done"))
+
+    with Coordinator(job_dir) as coordinator:
+        assert coordinator.progress()["resumed"] == 3
+        assert work(*coordinator.address) == 7
+
+    assert _merged(job_dir) == _expected(path)
+
+
+def test_dropped_lease_is_handed_out_again(tmp_path):
+    path = _input(tmp_path)
+    job_dir = str(tmp_path / "job")
+    create_job(path, job_dir, shard_size=50)
+
+    with Coordinator(job_dir) as coordinator:
+        coordinator.lease("crashed")
+        coordinator.release([0])
+        assert coordinator.progress()["pending"] == 2
+        assert work(*coordinator.address) == 2
+
+
+def test_run_job_with_local_processes(tmp_path):
+    path = _input(tmp_path)
+    outfile = io.StringIO()
+
+    count = run_job(path, str(tmp_path / "job"), outfile, workers=2, shard_size=20)
+
+    assert count == 96
+    assert outfile.getvalue() == _expected(path)
+
+
+def _exit_immediately(host, port, cache_size=0):
+    return 0
+
+
+def test_run_job_fails_when_all_workers_exit(tmp_path, monkeypatch):
+    path = _input(tmp_path)
+    monkeypatch.setattr("pricing.jobs.work", _exit_immediately)
+
+    with pytest.raises(RuntimeError, match="workers exited"):
+        run_job(path, str(tmp_path / "job"), io.StringIO(), workers=2, shard_size=20)
+
+
+def test_coordinator_rejects_stray_and_unleased_results(tmp_path):
+    path = _input(tmp_path)
+    job_dir = str(tmp_path / "job")
+    create_job(path, job_dir, shard_size=50)
+
+    with Coordinator(job_dir) as coordinator:
+        with socket.create_connection(coordinator.address) as connection:
+            stream = connection.makefile("rwb")
+
+            def send(message):
+                stream.write(json.dumps(message).encode("utf-8") + b"\n")
+                stream.flush()
+                return json.loads(stream.readline())
+
+            assert send([1, 2])["op"] == "error"
+            assert send({"op": "result", "shard": 7, "results": []})["op"] == "error"
+            assert send({"op": "result", "shard": 0, "results": [{}] * 50})["op"] == "error"
+            shard = send({"op": "lease", "worker": "w"})
+            assert send({"op": "result", "shard": shard["shard"], "results": [{}]})["op"] == "error"
+            stream.close()
+
+        assert not coordinator.wait(0)
+        assert coordinator.progress()["done"] == 0
+        assert work(*coordinator.address) == 2
+
+    assert not os.path.exists(os.path.join(job_dir, "shard-00007.jsonl"))
+    assert _merged(job_dir) == _expected(path)
+
+
+def test_job_reports_undecodable_lines(tmp_path):
+    path = tmp_path / "sheets.jsonl"
+    path.write_bytes(b'{"mtpl": 400}\n\xff\n{"mtpl": 400}\n')
+    outfile = io.StringIO()
+
+    assert run_job(str(path), str(tmp_path / "job"), outfile, workers=1, shard_size=2) == 3
+
+    records = [json.loads(line) for line in outfile.getvalue().splitlines()]
+    assert "can't decode byte 0xff" in records[1]["error"]
+    assert records[2] == {"line": 3, "issues": [], "corrected": {"mtpl": 400}, "changed": []}
+
+
+def test_corrupt_shard_output_is_redone(tmp_path):
+    path = _input(tmp_path)
+    job_dir = str(tmp_path / "job")
+    create_job(path, job_dir, shard_size=50)
+
+    with Coordinator(job_dir) as coordinator:
+        work(*coordinator.address)
+
+    output = os.path.join(job_dir, "shard-00001.jsonl")
+    with open(output, "rb") as handle:
+        data = handle.read()
+    with open(output, "wb") as handle:
+        handle.write(data[: len(data) // 2])
+
+    assert finished_shards(job_dir, load_manifest(job_dir)) == [0]
+    with pytest.raises(ValueError, match="1 unfinished"):
+        merge_job(job_dir, io.StringIO())
+
+    with Coordinator(job_dir) as coordinator:
+        assert coordinator.progress()["resumed"] == 1
+        assert work(*coordinator.address) == 1
+
+    assert _merged(job_dir) == _expected(path)
+
+
+def test_run_job_collects_stats_from_shards(tmp_path):
+    path = _input(tmp_path)
+    job_dir = str(tmp_path / "job")
+    stats, expected = PortfolioStats(), PortfolioStats()
+
+    run_job(path, job_dir, io.StringIO(), workers=2, shard_size=20, stats=stats)
+    with open(path) as infile:
+        process_stream(infile, io.StringIO(), stats=expected)
+
+    assert stats.result()["sheets"] == expected.result()["sheets"] == 95
+    assert stats.result()["invalid_sheets"] == expected.result()["invalid_sheets"]
+    for family, counts in expected.result()["families"].items():
+        assert stats.result()["families"][family]["checked"] == counts["checked"]
+        assert stats.result()["families"][family]["violations"] == counts["violations"]
+
+    os.remove(os.path.join(job_dir, "shard-00002.stats"))
+    assert finished_shards(job_dir, load_manifest(job_dir)) == [0, 1, 3, 4]
+
+
+def test_merge_job_needs_a_job_run_with_stats(tmp_path):
+    path = _input(tmp_path)
+    job_dir = str(tmp_path / "job")
+    run_job(path, job_dir, io.StringIO(), shard_size=50)
+
+    with pytest.raises(ValueError, match="without statistics"):
+        merge_job(job_dir, io.StringIO(), PortfolioStats())
+    with pytest.raises(ValueError, match="different input or options"):
+        create_job(path, job_dir, shard_size=50, stats=True)
@@ -0,0 +1,157 @@
+import io
+import json
+import os
+
+import pytest
+
+from pricing.cache import ResultCache
+from pricing.correction import correct_prices
+from pricing.markets import MarketRules, parse_config
+from pricing.ruleset import compile_rules, current_config
+from pricing.validation import validate_prices
+from pricing.worker import Worker
+
+
+def _write(directory, market, config, bump=0):
+    path = directory / f"{market}.json"
+    path.write_text(json.dumps(config))
+    if bump:
+        # Force a new mtime even on filesystems with coarse timestamps.
+        status = os.stat(path)
+        os.utime(path, ns=(status.st_atime_ns, status.st_mtime_ns + bump))
+    return path
+
+
+def test_parse_config_defaults_to_rules_py():
+    config = parse_config({"reference_prices": {"mtpl": 350}})
+
+    assert dict(config.reference_prices) == {**dict(current_config().reference_prices), "mtpl": 350.0}
+    assert config._replace(reference_prices=current_config().reference_prices) == current_config()
+
+
+def test_parse_config_rejects_unknown_settings():
+    with pytest.raises(ValueError, match="unknown rule settings: deductibles"):
+        parse_config({"deductibles": [100]})
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"deductible_order": [100, 200, 200]}, "duplicate entries in deductible_order: 200"),
+    ({"variant_tiers": [["basic"], ["comfort", "basic"]]}, "duplicate entries in variant_tiers: basic"),
+    ({"product_order": ["mtpl", "casco", "casco"]}, "duplicate entries in product_order: casco"),
+    ({"variant_tiers": "abc"}, "variant_tiers must be a list"),
+    ({"variant_tiers": ["basic", "comfort"]}, "each entry of variant_tiers must be a list"),
+    ({"variant_tiers": [["basic"], []]}, "must not contain empty tiers"),
+    ({"deductible_order": "100"}, "deductible_order must be a list"),
+    ({"untiered_products": ["mtpl", "gap"]}, "untiered products not in product_order: gap"),
+    ({"product_order": ["mtpl", "limited_casco", "plus", "casco"]}, "no reference price for: plus"),
+    ({"variant_step_percent": -0.1}, "compact_100 .* must be lower than .*comfort_100"),
+    ({"deductible_step_percent": 0}, "must be lower than"),
+    ({"deductible_step_percent": float("nan")}, "is not positive"),
+    ({"reference_prices": {"casco": 650}}, "limited_casco_compact_100 .* must be lower than casco_compact_100"),
+])
+def test_parse_config_rejects_invalid_values(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse_config(data, "de.json")
+
+
+def test_invalid_reload_keeps_last_good_version(tmp_path):
+    _write(tmp_path, "de", {"deductible_order": [100, 200, 500]})
+    markets = MarketRules(str(tmp_path), check_interval=0)
+    before = markets.get("de")
+
+    _write(tmp_path, "de", {"deductible_order": [100, 200, 200]}, bump=10**9)
+
+    assert markets.get("de") is before
+    assert "duplicate entries in deductible_order" in markets.errors["de"]
+
+    _write(tmp_path, "de", {"deductible_step_percent": -0.05}, bump=2 * 10**9)
+
+    assert markets.get("de") is before
+    assert "must be lower than" in markets.errors["de"]
+
+
+def test_market_rules_are_compiled_per_market(tmp_path):
+    _write(tmp_path, "de", {"deductible_order": [0, 300], "reference_prices": {"casco": 1000}})
+    _write(tmp_path, "at", {"variant_tiers": [["basic"], ["premium"]]})
+    markets = MarketRules(str(tmp_path))
+
+    de = markets.get("de")
+    at = markets.get("at")
+
+    assert "casco_basic_300" in de.slots
+    assert "casco_basic_100" not in de.slots
+    assert "casco_comfort_100" not in at.slots
+    assert markets.get("de") is de
+    assert de.reference[de.slots["casco_basic_0"]] == 1000.0
+
+    prices = {"casco_basic_0": 900, "casco_basic_300": 950}
+    assert validate_prices(prices, de) == ["casco basic: deductible 0 (900) must be higher than deductible 300 (950)"]
+    with pytest.raises(ValueError, match="not in the catalog: casco_basic_0"):
+        validate_prices(prices)
+    assert correct_prices(prices, rules=de)["casco_basic_300"] == pytest.approx(900.0)
+
+
+def test_market_hot_reload_keeps_old_version(tmp_path):
+    _write(tmp_path, "de", {"reference_prices": {"mtpl": 400}})
+    markets = MarketRules(str(tmp_path), check_interval=0)
+    before = markets.get("de")
+
+    _write(tmp_path, "de", {"reference_prices": {"mtpl": 450}}, bump=10**9)
+    after = markets.get("de")
+
+    assert after is not before
+    assert markets.version("de") == 2
+    assert before.reference[before.slots["mtpl"]] == 400.0
+    assert after.reference[after.slots["mtpl"]] == 450.0
+
+    (tmp_path / "de.json").write_text("{not json")
+    os.utime(tmp_path / "de.json", ns=(0, os.stat(tmp_path / "de.json").st_mtime_ns + 2 * 10**9))
+    assert markets.get("de") is after
+    assert "de" in markets.errors
+
+
+def test_market_checks_are_throttled(tmp_path):
+    _write(tmp_path, "de", {"reference_prices": {"mtpl": 400}})
+    markets = MarketRules(str(tmp_path), check_interval=3600)
+    before = markets.get("de")
+
+    _write(tmp_path, "de", {"reference_prices": {"mtpl": 450}}, bump=10**9)
+
+    assert markets.get("de") is before
+
+
+def test_unknown_and_invalid_markets(tmp_path):
+    markets = MarketRules(str(tmp_path))
+
+    with pytest.raises(ValueError, match="Unknown market: fr"):
+        markets.get("fr")
+    with pytest.raises(ValueError, match="Invalid market id"):
+        markets.get("../rules")
+
+
+def test_worker_routes_requests_by_market(tmp_path):
+    _write(tmp_path, "de", {"deductible_order": [0, 300]})
+    worker = Worker(cache_size=10, markets=MarketRules(str(tmp_path)))
+    prices = {"casco_basic_0": 900, "casco_basic_300": 950}
+    requests = [
+        {"id": 1, "op": "validate", "prices": prices, "market": "de"},
+        {"id": 2, "op": "validate", "prices": prices},
+        {"id": 3, "op": "validate", "prices": prices, "market": "fr"},
+    ]
+    outfile = io.StringIO()
+    worker.serve(io.StringIO("".join(json.dumps(request) + "\n" for request in requests)), outfile)
+    responses = [json.loads(line) for line in outfile.getvalue().splitlines()]
+
+    assert len(responses[0]["issues"]) == 1
+    assert responses[1]["error"] == "Price key is not in the catalog: casco_basic_0"
+    assert responses[2]["error"] == "Unknown market: fr"
+
+
+def test_cache_keeps_markets_apart():
+    cache = ResultCache()
+    prices = {"casco_basic_0": 900, "casco_basic_300": 950}
+    de = compile_rules(parse_config({"deductible_order": [0, 300]}))
+
+    assert len(cache.validate(prices, de)) == 1
+    with pytest.raises(ValueError, match="not in the catalog"):
+        cache.validate(prices)
@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+
+from pricing.analytics import PortfolioStats, collect_stats
+from pricing.parallel import imap_chunks, process_stream_parallel, run_parallel
+from pricing.stream import analyze_sheet, process_stream
+from pricing.synthetic import generate_sheets
+
+
+SHEETS = [
+    {"mtpl": 400, "limited_casco_basic_100": 820, "casco_basic_100": 750},
+    {"mtpl": 400, "casco_basic_100": 900},
+    {"invalid_key": 100},
+    {"casco_basic_100": 700, "casco_basic_200": 750},
+    {"mtpl": 1000, "limited_casco_basic_100": 100, "casco_basic_100": 50},
+]
+
+
+def _double(chunk):
+    return [item * 2 for item in chunk]
+
+
+def test_imap_chunks_keeps_order():
+    assert list(imap_chunks(_double, range(100), workers=3, chunk_size=7)) == [i * 2 for i in range(100)]
+
+
+def test_imap_chunks_rejects_bad_chunk_size():
+    with pytest.raises(ValueError, match="chunk_size"):
+        list(imap_chunks(_double, range(3), workers=1, chunk_size=0))
+
+
+def test_run_parallel_matches_sequential():
+    results = list(run_parallel(SHEETS, workers=2, chunk_size=2))
+
+    assert len(results) == len(SHEETS)
+    for prices, result in zip(SHEETS, results):
+        if "invalid_key" in prices:
+            assert "Unexpected key format" in result["error"]
+        else:
+            assert result == analyze_sheet(prices)
+
+
+def test_parallel_stream_matches_sequential():
+    text = "\n".join(json.dumps(prices) for prices in SHEETS) + "\n"
+
+    sequential = io.StringIO()
+    process_stream(io.StringIO(text), sequential)
+
+    parallel = io.StringIO()
+    count = process_stream_parallel(io.StringIO(text), parallel, workers=2, chunk_size=2)
+
+    assert count == len(SHEETS)
+    assert parallel.getvalue() == sequential.getvalue()
+
+
+def test_parallel_stream_merges_stats_from_chunks():
+    sheets = list(generate_sheets(120, seed=3, violation_rate=0.2))
+    text = "\n".join(json.dumps(prices) for prices in sheets) + "\n"
+    stats = PortfolioStats()
+
+    process_stream_parallel(io.StringIO(text), io.StringIO(), workers=2, chunk_size=25, stats=stats)
+    expected = collect_stats(sheets, workers=1).result()
+    result = stats.result()
+
+    assert result["sheets"] == expected["sheets"] == 120
+    assert result["invalid_sheets"] == expected["invalid_sheets"]
+    for family, counts in expected["families"].items():
+        assert result["families"][family]["checked"] == counts["checked"]
+        assert result["families"][family]["violations"] == counts["violations"]
@@ -1,5 +1,5 @@
 import pytest
-from pricing.parsing import parse_price_key
+from pricing.parsing import PriceKey, parse_price_key
 
 
 def test_parse_mtpl():
@@ -30,4 +30,14 @@ def test_invalid_key_format():
 
 def test_invalid_deductible():
     with pytest.raises(ValueError, match="Invalid deductible"):
-        parse_price_key("casco_basic_abc")
\ No newline at end of file
+        parse_price_key("casco_basic_abc")
+
+
+def test_price_key_unpacks_like_parse_result():
+    price_key = PriceKey("casco_basic_100", "casco", "basic", 100, 5)
+    product, variant, deductible = price_key
+
+    assert (product, variant, deductible) == parse_price_key("casco_basic_100")
+    assert price_key.slot == 5
+    with pytest.raises(AttributeError):
+        price_key.extra = 1
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from pricing.correction import correct_prices
+from pricing.pricebook import PriceBook
+from pricing.validation import validate_prices
+
+
+def test_pricebook_matches_validate_prices():
+    prices = {
+        "mtpl": 450,
+        "limited_casco_basic_100": 420,
+        "limited_casco_basic_200": 450,
+        "casco_basic_100": 400,
+    }
+    book = PriceBook(prices)
+
+    assert book.issues() == validate_prices(prices)
+    assert not book.is_valid()
+
+
+def test_pricebook_updates_fix_and_break_rules():
+    book = PriceBook({"mtpl": 400, "casco_basic_100": 900, "casco_basic_200": 950})
+    assert len(book.issues()) == 1
+
+    book.set("casco_basic_200", 810)
+    assert book.is_valid()
+
+    book.set("limited_casco_basic_100", 950)
+    assert book.issues() == validate_prices(book.prices())
+    assert len(book.issues()) == 1
+
+
+def test_pricebook_remove():
+    book = PriceBook({"casco_basic_100": 700, "casco_basic_200": 750})
+    book.remove("casco_basic_200")
+
+    assert book.is_valid()
+    assert book.get("casco_basic_200") is None
+    assert book.prices() == {"casco_basic_100": 700}
+
+
+def test_pricebook_random_edits_match_full_validation():
+    rng = random.Random(1)
+    keys = ["mtpl"] + [
+        f"{product}_{variant}_{deductible}"
+        for product in ["limited_casco", "casco"]
+        for variant in ["compact", "basic", "comfort", "premium"]
+        for deductible in [100, 200, 500]
+    ]
+    book = PriceBook()
+    prices = {}
+
+    for _ in range(500):
+        key = rng.choice(keys)
+        if rng.random() < 0.1:
+            book.remove(key)
+            prices.pop(key, None)
+        else:
+            price = rng.randint(300, 1200)
+            book.set(key, price)
+            prices[key] = price
+
+        assert book.issues() == validate_prices(prices)
+        assert book.is_valid() == (not validate_prices(prices))
+
+
+def test_pricebook_rejects_keys_outside_the_catalog():
+    with pytest.raises(ValueError, match="not in the catalog: other_basic_100"):
+        PriceBook({"other_basic_100": 5})
+    with pytest.raises(ValueError, match="not in the catalog"):
+        PriceBook().get("casco_basic_1000")
+
+
+def test_pricebook_rejects_invalid_keys():
+    with pytest.raises(ValueError, match="Unexpected key format"):
+        PriceBook().set("invalid_key", 100)
+
+
+def test_pricebook_repair_matches_component_strategy():
+    rng = random.Random(11)
+    book = PriceBook({"mtpl": 400, "casco_basic_100": 900, "casco_basic_200": 850, "casco_comfort_100": 990})
+    for _ in range(20):
+        key = rng.choice(["mtpl", "casco_basic_100", "casco_basic_200", "casco_comfort_100", "limited_casco_basic_100"])
+        book.set(key, rng.randint(300, 1200))
+
+        expected = correct_prices(book.prices(), strategy="component")
+        changes = book.repair()
+
+        assert book.prices() == expected
+        assert book.is_valid()
+        assert all(expected[change.key] == change.new for change in changes)
+        assert book.repair() == []
@@ -0,0 +1,202 @@
+import pytest
+
+from pricing.ruleset import (
+    DEDUCTIBLE,
+    HIERARCHY,
+    VARIANT,
+    active_bridges,
+    compile_bridges,
+    compile_rules,
+    is_present,
+    lookup_key,
+    presence_mask,
+    slot_values,
+)
+
+
+def test_compile_rules_is_cached():
+    assert compile_rules() is compile_rules()
+
+
+def test_slot_layout():
+    rules = compile_rules()
+
+    assert rules.keys[0] == "mtpl"
+    assert len(rules.keys) == 1 + 2 * 4 * 3
+    price_key = rules.price_keys[rules.slots["casco_premium_500"]]
+    assert tuple(price_key) == ("casco", "premium", 500)
+    assert price_key.slot == rules.slots["casco_premium_500"]
+
+
+def test_constraint_counts_per_family():
+    families = [constraint.family for constraint in compile_rules().constraints]
+
+    assert families.count(HIERARCHY) == 12 + 12
+    assert families.count(VARIANT) == 2 * 3 * 3
+    assert families.count(DEDUCTIBLE) == 2 * 4 * 2
+
+
+def test_deductible_constraint_direction():
+    rules = compile_rules()
+    lower = rules.slots["casco_basic_200"]
+    higher = rules.slots["casco_basic_100"]
+
+    assert (lower, higher, DEDUCTIBLE) in rules.constraints
+
+
+def test_slot_values():
+    rules = compile_rules()
+    values = slot_values({"mtpl": 400, "casco_basic_100": 900})
+
+    assert values[rules.slots["mtpl"]] == 400
+    assert values[rules.slots["casco_basic_100"]] == 900
+    assert sum(not is_present(value) for value in values) == len(rules.keys) - 2
+
+
+def test_slot_values_rejects_invalid_keys():
+    with pytest.raises(ValueError, match="Invalid deductible"):
+        slot_values({"casco_basic_abc": 100})
+
+
+def test_slot_values_rejects_keys_outside_the_catalog():
+    for key in ["other_basic_100", "casco_ultra_100", "limited_casco_basic_1000"]:
+        with pytest.raises(ValueError, match=f"not in the catalog: {key}"):
+            slot_values({"mtpl": 400, key: 300})
+
+
+def test_lookup_key_is_interned():
+    assert lookup_key("casco_basic_100") is lookup_key("casco_basic_100")
+    assert lookup_key("other_basic_100").slot is None
+
+
+def test_reference_table_matches_formula():
+    from pricing.correction import calculate_reference_price
+
+    rules = compile_rules()
+    for price_key, reference in zip(rules.price_keys, rules.reference):
+        assert reference == calculate_reference_price(*price_key)
+
+
+def test_reference_table_rebuilt_when_values_change(monkeypatch):
+    from pricing import rules as business_rules
+
+    before = compile_rules()
+    monkeypatch.setattr(business_rules, "VARIANT_STEP_PERCENT", 0.10)
+    after = compile_rules()
+
+    assert after is not before
+    assert after.reference[after.slots["casco_premium_100"]] == pytest.approx(900 * 1.2)
+
+
+def test_presence_mask():
+    rules = compile_rules()
+    values = slot_values({"mtpl": 400, "casco_basic_100": 900}, rules)
+
+    assert presence_mask(values) == (1 << rules.slots["mtpl"]) | (1 << rules.slots["casco_basic_100"])
+
+
+def test_bridges_span_only_missing_groups():
+    rules = compile_rules()
+    keys = rules.keys
+
+    pairs = {(keys[bridge.lower], keys[bridge.higher]) for bridge in compile_bridges(rules)}
+    assert ("casco_basic_100", "casco_premium_100") in pairs
+    assert ("casco_basic_500", "casco_basic_100") in pairs
+    assert ("mtpl", "casco_comfort_200") in pairs
+    assert ("casco_basic_100", "casco_comfort_100") not in pairs
+
+    without_comfort = slot_values({"casco_basic_100": 900, "casco_premium_100": 800}, rules)
+    with_comfort = slot_values({"casco_basic_100": 900, "casco_comfort_100": 950, "casco_premium_100": 800}, rules)
+
+    assert [(keys[b.lower], keys[b.higher]) for _i, b in active_bridges(rules, without_comfort)] == [
+        ("casco_basic_100", "casco_premium_100"),
+    ]
+    assert active_bridges(rules, with_comfort) == []
+
+
+@pytest.fixture
+def large_catalog(monkeypatch):
+    from pricing import rules as business_rules
+
+    monkeypatch.setattr(business_rules, "PRODUCT_ORDER", ["mtpl", "limited_casco", "extended_casco", "casco"])
+    monkeypatch.setattr(business_rules, "REFERENCE_PRICES", {**business_rules.REFERENCE_PRICES, "extended_casco": 800})
+    monkeypatch.setattr(business_rules, "VARIANT_TIERS", [
+        ["compact", "basic"], ["plus"], ["comfort"], ["comfortplus"], ["premium", "elite"], ["ultimate"],
+    ])
+    monkeypatch.setattr(business_rules, "DEDUCTIBLE_ORDER", [0, 50, 100, 150, 200, 300, 400, 500, 750, 1000, 1500, 2000])
+
+
+def test_product_without_reference_price_is_rejected(monkeypatch):
+    from pricing import rules as business_rules
+
+    monkeypatch.setattr(business_rules, "PRODUCT_ORDER", ["mtpl", "limited_casco", "plus", "casco"])
+    with pytest.raises(ValueError, match="No reference price for product: plus"):
+        compile_rules()
+
+
+def test_reference_prices_must_follow_the_rules(monkeypatch):
+    from pricing import rules as business_rules
+
+    monkeypatch.setattr(business_rules, "REFERENCE_PRICES", {**business_rules.REFERENCE_PRICES, "casco": 650})
+    with pytest.raises(ValueError, match="limited_casco_compact_100 .* must be lower than casco_compact_100"):
+        compile_rules()
+
+
+def test_large_catalog_reference_follows_the_rules(large_catalog):
+    rules = compile_rules()
+    reference = rules.reference
+
+    assert min(reference) > 0
+    assert all(reference[lower] < reference[higher] for lower, higher, _family in rules.constraints)
+
+
+def test_large_catalog_constraints_grow_linearly(large_catalog):
+    rules = compile_rules()
+    families = [constraint.family for constraint in rules.constraints]
+    tiered_products, variants, deductibles = 3, 8, 12
+
+    assert len(rules.keys) == 1 + tiered_products * variants * deductibles
+    assert families.count(HIERARCHY) == tiered_products * variants * deductibles
+    # Adjacent tiers only: 2x1 + 1x1 + 1x1 + 1x2 + 2x1 pairs per product and deductible.
+    assert families.count(VARIANT) == tiered_products * deductibles * 8
+    assert families.count(DEDUCTIBLE) == tiered_products * variants * (deductibles - 1)
+
+
+def test_large_catalog_matches_all_pairs_check(large_catalog):
+    from pricing.synthetic import generate_sheets
+    from pricing.validation import is_valid, validate_prices
+    from pricing import rules as business_rules
+
+    tiers = {variant: index for index, tier in enumerate(business_rules.VARIANT_TIERS) for variant in tier}
+    products = business_rules.PRODUCT_ORDER
+    deductibles = business_rules.DEDUCTIBLE_ORDER
+
+    def valid_all_pairs(prices):
+        parsed = [(lookup_key(key), price) for key, price in prices.items()]
+        for a, price_a in parsed:
+            for b, price_b in parsed:
+                if a.variant is None or b.variant is None:
+                    if products.index(a.product) < products.index(b.product) and price_a >= price_b:
+                        return False
+                    continue
+                same_variant = a.variant == b.variant
+                same_deductible = a.deductible == b.deductible
+                if same_variant and same_deductible:
+                    if products.index(a.product) < products.index(b.product) and price_a >= price_b:
+                        return False
+                if a.product == b.product and same_deductible and tiers[a.variant] < tiers[b.variant]:
+                    if price_a >= price_b:
+                        return False
+                if a.product == b.product and same_variant:
+                    if deductibles.index(a.deductible) > deductibles.index(b.deductible) and price_a >= price_b:
+                        return False
+        return True
+
+    assert all(validate_prices(prices) == [] for prices in generate_sheets(5, seed=1))
+
+    for prices in generate_sheets(40, seed=2, violation_rate=0.01):
+        assert is_valid(prices) == valid_all_pairs(prices)
+
+    # On partial sheets only the nearest-present policy sees across gaps.
+    for prices in generate_sheets(40, seed=3, coverage=0.4, violation_rate=0.05):
+        assert is_valid(prices, missing="nearest") == valid_all_pairs(prices)
@@ -0,0 +1,84 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from pricing.correction import correct_prices
+from pricing.ruleset import RULE_FAMILIES, compile_rules, lookup_key
+from pricing.scenarios import scenario, simulate, simulate_file
+from pricing.storage import write_sheets
+from pricing.synthetic import generate_sheets
+from pricing.validation import find_violations
+
+
+SCENARIOS = [
+    scenario("current"),
+    scenario("steep variants", variant_step_percent=0.12),
+    scenario("cheap casco", reference_prices={"mtpl": 400, "limited_casco": 700, "casco": 800}),
+    scenario("two tiers", variant_tiers=[["compact", "basic", "comfort"], ["premium"]]),
+    scenario("new deductible", deductible_order=[0, 100, 200, 500]),
+]
+
+
+def _expected(sheets, item):
+    rules = compile_rules(item.config)
+    violations = {family: 0 for family in RULE_FAMILIES}
+    invalid = changed_sheets = 0
+    by_product = {}
+    for prices in sheets:
+        found = find_violations(prices, rules)
+        invalid += bool(found)
+        for violation in found:
+            violations[violation.rule] += 1
+        corrected = correct_prices(prices, rules=rules)
+        changed_sheets += corrected != prices
+        for key, price in prices.items():
+            product = lookup_key(key).product
+            by_product[product] = by_product.get(product, 0.0) + corrected[key] - price
+    return violations, invalid, changed_sheets, by_product
+
+
+def test_simulate_matches_scalar_loop():
+    sheets = list(generate_sheets(300, seed=4, coverage=0.8, violation_rate=0.05))
+
+    results = simulate(sheets, SCENARIOS, chunk_size=128)
+
+    assert [result["name"] for result in results] == [item.name for item in SCENARIOS]
+    for item, result in zip(SCENARIOS, results):
+        violations, invalid, changed_sheets, by_product = _expected(sheets, item)
+        assert result["sheets"] == 300
+        assert result["violations"] == violations
+        assert result["invalid_sheets"] == invalid
+        assert result["changed_sheets"] == changed_sheets
+        assert result["unresolved_sheets"] == 0
+        for product, delta in by_product.items():
+            assert result["premium_delta"]["by_product"].get(product, 0.0) == pytest.approx(delta)
+        assert result["premium_delta"]["total"] == pytest.approx(sum(by_product.values()))
+
+
+def test_reference_changes_do_not_change_validity():
+    sheets = list(generate_sheets(100, seed=5, violation_rate=0.05))
+
+    current, cheap = simulate(sheets, [SCENARIOS[0], SCENARIOS[2]])
+
+    assert current["violations"] == cheap["violations"]
+    assert current["premium_delta"]["by_product"]["casco"] > cheap["premium_delta"]["by_product"]["casco"]
+
+
+def test_simulate_file(tmp_path):
+    sheets = list(generate_sheets(200, seed=6, violation_rate=0.05))
+    path = str(tmp_path / "portfolio.bin")
+    write_sheets(path, sheets)
+
+    for from_file, in_memory in zip(simulate_file(path, SCENARIOS, chunk_rows=64), simulate(sheets, SCENARIOS)):
+        delta = from_file.pop("premium_delta")
+        expected = in_memory.pop("premium_delta")
+        assert from_file == in_memory
+        assert delta["total"] == pytest.approx(expected["total"])
+        assert delta["by_product"] == pytest.approx(expected["by_product"])
+
+
+def test_scenario_validation():
+    with pytest.raises(ValueError, match="unknown rule settings: step"):
+        scenario("typo", step=0.1)
+    with pytest.raises(ValueError, match="unique"):
+        simulate([], [scenario("a"), scenario("a")])
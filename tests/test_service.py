@@ -0,0 +1,198 @@
+import asyncio
+import json
+
+import pytest
+
+from pricing.service import BatchingService, start_server
+from pricing.stream import analyze_sheet
+from pricing.synthetic import generate_sheets
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_service_matches_analyze_sheet_and_batches():
+    sheets = list(generate_sheets(50, seed=3, violation_rate=0.2))
+
+    async def scenario():
+        async with BatchingService(max_batch_size=16, max_latency=0.01) as service:
+            results = await asyncio.gather(*(service.submit(prices) for prices in sheets))
+            return results, service.metrics()
+
+    results, metrics = _run(scenario())
+
+    assert results == [analyze_sheet(prices) for prices in sheets]
+    assert metrics["completed"] == 50
+    assert metrics["batches"] < 50
+    assert metrics["mean_batch_size"] <= 16
+    assert metrics["queue_depth"] == 0
+    assert metrics["latency_us"]["max"] > 0
+
+
+def test_service_errors_do_not_fail_batch():
+    async def scenario():
+        async with BatchingService(max_latency=0.01) as service:
+            return await asyncio.gather(
+                service.submit({"invalid_key": 1}),
+                service.submit({"mtpl": 400}, correct=False),
+                return_exceptions=True,
+            )
+
+    error, result = _run(scenario())
+
+    assert isinstance(error, ValueError)
+    assert result == {"issues": []}
+
+
+def test_service_backpressure():
+    async def scenario():
+        service = BatchingService(max_queue=2, max_latency=0.05)
+        await service.start()
+        # Fill the queue without letting the batcher run.
+        for _ in range(2):
+            future = asyncio.get_running_loop().create_future()
+            service._queue.put_nowait((({}, False, "reference", None), future, 0.0))
+        with pytest.raises(asyncio.QueueFull):
+            await service.submit({"mtpl": 400}, block=False)
+        rejected = service.metrics()["rejected"]
+        await service.stop()
+        return rejected
+
+    assert _run(scenario()) == 1
+
+
+def test_service_rejects_bad_policy():
+    with pytest.raises(ValueError, match="max_batch_size"):
+        BatchingService(max_batch_size=0)
+
+
+def test_service_tcp_protocol():
+    prices = {"mtpl": 400, "limited_casco_basic_100": 820, "casco_basic_100": 750}
+
+    async def scenario():
+        async with BatchingService(max_latency=0.005) as service:
+            server = await start_server(service)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for request_id in range(10):
+                writer.write(json.dumps({"id": request_id, "prices": prices}).encode() + b"\n")
+            writer.write(b'{"id": "x", "op": "nope"}\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(11)]
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return responses
+
+    responses = {response["id"]: response for response in _run(scenario())}
+
+    assert set(responses) == set(range(10)) | {"x"}
+    assert responses[3]["corrected"] == analyze_sheet(prices)["corrected"]
+    assert responses["x"]["error"] == "Unknown operation: nope"
+
+
+def test_service_socket_does_not_replace_other_files(tmp_path):
+    regular = tmp_path / "results.jsonl"
+    regular.write_text("keep me\n")
+
+    async def scenario():
+        async with BatchingService() as service:
+            with pytest.raises(ValueError, match="not a socket"):
+                await start_server(service, str(regular))
+
+    _run(scenario())
+    assert regular.read_text() == "keep me\n"
+
+
+def test_service_with_worker_processes():
+    sheets = list(generate_sheets(20, seed=6, violation_rate=0.2))
+
+    async def scenario():
+        async with BatchingService(max_latency=0.01, concurrency=2, processes=True) as service:
+            return await asyncio.gather(*(service.submit(prices) for prices in sheets))
+
+    assert _run(scenario()) == [analyze_sheet(prices) for prices in sheets]
+
+
+def test_service_connection_reads_at_most_max_queue_ahead(monkeypatch):
+    import threading
+
+    import pricing.service
+
+    release = threading.Event()
+    analyze_batch = pricing.service.analyze_batch
+
+    def slow_batch(requests):
+        release.wait()
+        return analyze_batch(requests)
+
+    monkeypatch.setattr(pricing.service, "analyze_batch", slow_batch)
+
+    async def scenario():
+        async with BatchingService(max_queue=4, max_latency=0) as service:
+            server = await start_server(service)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"".join(b'{"id": %d, "prices": {"mtpl": 400}}\n' % index for index in range(200)))
+            await writer.drain()
+            await asyncio.sleep(0.1)
+            open_tasks = len(asyncio.all_tasks())
+            release.set()
+            responses = [json.loads(await reader.readline()) for _ in range(200)]
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return open_tasks, responses
+
+    open_tasks, responses = _run(scenario())
+
+    assert open_tasks < 20
+    assert sorted(response["id"] for response in responses) == list(range(200))
+
+
+def test_service_reports_unexpected_errors_per_request(monkeypatch):
+    def broken(request):
+        raise RecursionError("too deep")
+
+    monkeypatch.setattr("pricing.service.check_request", broken)
+
+    async def scenario():
+        async with BatchingService() as service:
+            server = await start_server(service)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b'{"id": 1, "op": "ping"}\n')
+            response = json.loads(await reader.readline())
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response
+
+    assert _run(scenario()) == {"id": 1, "error": "RecursionError: too deep"}
+
+
+def test_service_answers_long_and_oversized_lines():
+    long_id = "x" * 70000
+
+    async def exchange(limit, lines, count):
+        async with BatchingService() as service:
+            kwargs = {"limit": limit} if limit else {}
+            server = await start_server(service, **kwargs)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 20)
+            writer.write(b"".join(lines))
+            responses = [json.loads(await reader.readline()) for _ in range(count)]
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return responses
+
+    long_line = json.dumps({"id": long_id, "op": "ping"}).encode() + b"\n"
+    ping = b'{"id": 2, "op": "ping"}\n'
+
+    assert _run(exchange(None, [long_line, ping], 2)) == [{"id": long_id, "ok": True}, {"id": 2, "ok": True}]
+    assert _run(exchange(1024, [long_line, ping], 2)) == [
+        {"id": None, "error": "Request line exceeds 1024 bytes"},
+        {"id": 2, "ok": True},
+    ]
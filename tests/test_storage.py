@@ -0,0 +1,103 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from pricing.batch import correct_batch, validate_batch
+from pricing.correction import correct_prices
+from pricing.ruleset import compile_rules
+from pricing.storage import SheetFile, correct_file, validate_file, write_sheets
+from pricing.synthetic import generate_sheets
+
+
+def _sheets(count=300):
+    return list(generate_sheets(count, seed=8, coverage=0.8, violation_rate=0.3))
+
+
+def test_round_trip(tmp_path):
+    sheets = _sheets()
+    path = tmp_path / "sheets.bin"
+
+    assert write_sheets(str(path), sheets) == len(sheets)
+
+    stored = SheetFile(str(path))
+    assert len(stored) == len(sheets)
+    assert stored.sheet(5) == sheets[5]
+    assert isinstance(stored.values, np.memmap)
+
+
+def test_validate_file_matches_batch(tmp_path):
+    sheets = _sheets()
+    path = tmp_path / "sheets.bin"
+    write_sheets(str(path), sheets)
+
+    counts, flags = validate_file(str(path), chunk_rows=64)
+    expected_counts, expected_flags = validate_batch(sheets)
+
+    assert list(counts) == list(expected_counts)
+    assert list(flags) == list(expected_flags)
+
+
+def test_correct_file(tmp_path):
+    sheets = _sheets(100)
+    source = tmp_path / "sheets.bin"
+    target = tmp_path / "corrected.bin"
+    write_sheets(str(source), sheets)
+
+    assert correct_file(str(source), str(target), chunk_rows=32) == len(sheets)
+
+    corrected = SheetFile(str(target))
+    for row, prices in enumerate(sheets):
+        assert corrected.sheet(row) == pytest.approx(correct_prices(prices))
+    assert not validate_file(str(target))[0].any()
+
+
+def test_rules_and_missing_policy(tmp_path):
+    rules = compile_rules(compile_rules().config._replace(variant_step_percent=0.2))
+    sheets = _sheets(100)
+    source = tmp_path / "sheets.bin"
+    target = tmp_path / "corrected.bin"
+    write_sheets(str(source), sheets, rules)
+
+    counts, flags = validate_file(str(source), rules, missing="nearest")
+    expected_counts, expected_flags = validate_batch(sheets, rules, missing="nearest")
+    assert list(counts) == list(expected_counts)
+    assert list(flags) == list(expected_flags)
+
+    correct_file(str(source), str(target), rules, missing="nearest")
+    corrected = SheetFile(str(target), rules)
+    for row, prices in enumerate(correct_batch(sheets, rules, missing="nearest")):
+        assert corrected.sheet(row) == pytest.approx(prices)
+
+
+def test_truncated_file(tmp_path):
+    path = tmp_path / "sheets.bin"
+    write_sheets(str(path), _sheets(10))
+    path.write_bytes(path.read_bytes()[:-3])
+
+    with pytest.raises(ValueError, match="truncated"):
+        validate_file(str(path))
+
+
+def test_float32_rows(tmp_path):
+    path = tmp_path / "sheets.bin"
+    write_sheets(str(path), [{"mtpl": 400, "casco_basic_100": 900}], dtype="float32")
+
+    stored = SheetFile(str(path))
+    assert stored.dtype == np.float32
+    assert stored.sheet(0) == {"mtpl": 400.0, "casco_basic_100": 900.0}
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.bin"
+    write_sheets(str(path), [])
+
+    assert len(SheetFile(str(path))) == 0
+    assert len(validate_file(str(path))[0]) == 0
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a sheet file")
+
+    with pytest.raises(ValueError, match="Not a price sheet file"):
+        SheetFile(str(path))
@@ -0,0 +1,95 @@
+import io
+import json
+
+from pricing.stream import analyze_sheet, process_stream
+from pricing.validation import validate_prices
+
+
+def _run(text, **kwargs):
+    outfile = io.StringIO()
+    count = process_stream(io.StringIO(text), outfile, **kwargs)
+    records = [json.loads(line) for line in outfile.getvalue().splitlines()]
+    return count, records
+
+
+def test_analyze_sheet_reports_changes():
+    prices = {
+        "mtpl": 400,
+        "limited_casco_basic_100": 820,
+        "casco_basic_100": 750,
+    }
+    result = analyze_sheet(prices)
+
+    assert len(result["issues"]) == 1
+    assert validate_prices(result["corrected"]) == []
+    assert set(result["changed"]) == {"limited_casco_basic_100", "casco_basic_100"}
+
+
+def test_stream_plain_and_wrapped_records():
+    lines = [
+        json.dumps({"mtpl": 400, "casco_basic_100": 900}),
+        "",
+        json.dumps({"id": "seg-7", "prices": {"casco_basic_100": 700, "casco_basic_200": 750}}),
+    ]
+    count, records = _run("\n".join(lines) + "\n")
+
+    assert count == 2
+    assert records[0]["line"] == 1
+    assert records[0]["issues"] == []
+    assert records[0]["changed"] == []
+    assert records[1]["id"] == "seg-7"
+    assert len(records[1]["issues"]) == 1
+    assert validate_prices(records[1]["corrected"]) == []
+
+
+def test_stream_validate_only():
+    count, records = _run(json.dumps({"casco_basic_100": 700, "casco_basic_200": 750}) + "\n", correct=False)
+
+    assert count == 1
+    assert "corrected" not in records[0]
+    assert len(records[0]["issues"]) == 1
+
+
+def test_stream_reports_bad_lines_and_continues():
+    lines = [
+        "not json",
+        json.dumps({"invalid_key": 100}),
+        json.dumps([1, 2]),
+        json.dumps({"mtpl": 400}),
+    ]
+    count, records = _run("\n".join(lines))
+
+    assert count == 4
+    assert [record.get("line") for record in records] == [1, 2, 3, 4]
+    assert all("error" in record for record in records[:3])
+    assert "Unexpected key format" in records[1]["error"]
+    assert records[3]["issues"] == []
+
+
+def test_stream_reports_unexpected_errors_per_record():
+    count, records = _run("[" * 100000 + "\n" + json.dumps({"mtpl": 400}))
+
+    assert count == 2
+    assert records[0]["line"] == 1
+    assert records[0]["error"].startswith("RecursionError")
+    assert records[1]["issues"] == []
+
+
+def test_stream_reports_undecodable_lines_and_continues(tmp_path):
+    path = tmp_path / "sheets.jsonl"
+    path.write_bytes(
+        b'{"mtpl": 400}\n'
+        b'\xff\n'
+        b'{"id": "caf\xe9", "prices": {"mtpl": 400}}\n'
+        b'{"id": "caf\xc3\xa9", "prices": {"mtpl": 400}}\n'
+    )
+    outfile = io.StringIO()
+    with open(path, encoding="utf-8", errors="surrogateescape") as infile:
+        count = process_stream(infile, outfile)
+    records = [json.loads(line) for line in outfile.getvalue().splitlines()]
+
+    assert count == 4
+    assert records[0]["line"] == 1 and records[0]["issues"] == []
+    assert records[1]["line"] == 2 and "can't decode byte 0xff" in records[1]["error"]
+    assert records[2]["line"] == 3 and "can't decode byte 0xe9" in records[2]["error"]
+    assert records[3]["id"] == "café"
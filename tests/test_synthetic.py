@@ -0,0 +1,54 @@
+from pricing.correction import correct_prices
+from pricing.synthetic import generate_sheets, layout_rules, sheet_layout
+from pricing.validation import count_violations, validate_prices
+
+
+def test_generator_is_deterministic():
+    first = list(generate_sheets(20, seed=4, violation_rate=0.3))
+    second = list(generate_sheets(20, seed=4, violation_rate=0.3))
+
+    assert first == second
+
+
+def test_clean_sheets_are_valid():
+    for prices in generate_sheets(50, seed=1):
+        assert len(prices) == 1 + 2 * 4 * 3
+        assert validate_prices(prices) == []
+
+
+def test_clean_sheets_with_extra_tiers_are_valid():
+    layout = sheet_layout(extra_variants=2, extra_deductibles=3)
+
+    for prices in generate_sheets(20, seed=2, extra_variants=2, extra_deductibles=3):
+        assert len(prices) == 1 + 2 * len(layout["variants"]) * len(layout["deductibles"])
+        assert "casco_extra2_2000" in prices
+        assert validate_prices(prices, layout_rules(2, 3)) == []
+
+
+def test_extra_tiers_take_part_in_the_rules():
+    rules = layout_rules(extra_variants=2, extra_deductibles=3)
+    assert len(rules.keys) == 1 + 2 * 6 * 6
+
+    prices = next(generate_sheets(1, seed=2, extra_variants=2, extra_deductibles=3))
+    prices["casco_extra2_2000"] = prices["casco_extra2_1500"] + 1
+
+    assert count_violations(prices, rules) == 1
+
+
+def test_large_layout_can_be_repaired():
+    rules = layout_rules(extra_variants=4, extra_deductibles=9)
+
+    for prices in generate_sheets(50, seed=5, extra_variants=4, extra_deductibles=9, violation_rate=0.2):
+        assert validate_prices(correct_prices(prices, "component", rules), rules) == []
+
+
+def test_partial_sheets():
+    sheets = list(generate_sheets(50, seed=3, coverage=0.5))
+
+    assert all(len(prices) < 25 for prices in sheets)
+
+
+def test_violation_rate_produces_violations():
+    sheets = list(generate_sheets(50, seed=5, violation_rate=1.0))
+
+    assert sum(1 for prices in sheets if validate_prices(prices)) > 40
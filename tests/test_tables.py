@@ -0,0 +1,165 @@
+import csv
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from pricing.batch import validate_batch
+from pricing.correction import correct_prices
+from pricing.markets import parse_config
+from pricing.ruleset import compile_rules
+from pricing.synthetic import generate_sheets
+from pricing.tables import WideTable, correct_table, validate_table
+from pricing.validation import validate_prices
+
+
+def _write_table(path, sheets, keys=None):
+    keys = keys or list(compile_rules().keys)
+    with open(path, "w", newline="") as handle:
+        handle.write("segment," + ",".join(keys) + "\n")
+        for index, prices in enumerate(sheets):
+            cells = [repr(float(prices[key])) if key in prices else "" for key in keys]
+            handle.write(f"seg{index}," + ",".join(cells) + "\n")
+
+
+def _read_prices(path):
+    with open(path, newline="") as handle:
+        return [
+            {key: float(cell) for key, cell in row.items() if key != "segment" and cell != ""}
+            for row in csv.DictReader(handle)
+        ]
+
+
+def _sheets(count=300):
+    return list(generate_sheets(count, seed=9, coverage=0.8, violation_rate=0.3))
+
+
+def test_validate_table_matches_batch(tmp_path):
+    sheets = _sheets()
+    path = tmp_path / "table.csv"
+    _write_table(path, sheets)
+
+    counts, flags = validate_table(str(path))
+    expected_counts, expected_flags = validate_batch(sheets)
+
+    assert (counts == expected_counts).all()
+    assert (flags == expected_flags).all()
+
+
+def test_chunk_size_does_not_change_results(tmp_path):
+    sheets = _sheets()
+    path = tmp_path / "table.csv"
+    _write_table(path, sheets)
+
+    whole = validate_table(str(path))
+    small = validate_table(str(path), chunk_bytes=100)
+
+    assert (whole[0] == small[0]).all() and (whole[1] == small[1]).all()
+    assert sum(chunk.rows for chunk in WideTable(str(path), chunk_bytes=1000).chunks()) == len(sheets)
+
+
+def test_correct_table_matches_correct_prices(tmp_path):
+    sheets = _sheets()
+    source, target = tmp_path / "table.csv", tmp_path / "corrected.csv"
+    _write_table(source, sheets)
+
+    changed = correct_table(str(source), str(target), chunk_bytes=4096)
+    corrected = _read_prices(target)
+
+    assert corrected == [correct_prices(prices) for prices in sheets]
+    assert changed == sum(
+        1 for prices, fixed in zip(sheets, corrected) for key in prices if prices[key] != fixed[key]
+    )
+
+
+def test_correct_table_keeps_layout_and_other_columns(tmp_path):
+    source, target = tmp_path / "table.csv", tmp_path / "corrected.csv"
+    source.write_bytes(
+        b"casco_basic_100,segment,note,mtpl,casco_basic_200,region\r\n"
+        b"700,north,\"big, old\",400,750,12\r\n"
+        b"900,south,,400,,13\r\n"
+    )
+
+    assert correct_table(str(source), str(target)) == 2
+
+    data = target.read_bytes()
+    assert data.count(b"\r\n") == data.count(b"\n") == 3
+    lines = data.split(b"\r\n")
+    assert lines[0] == b"casco_basic_100,segment,note,mtpl,casco_basic_200,region"
+    assert lines[2] == b"900,south,,400,,13"
+    cells = next(csv.reader([lines[1].decode()]))
+    assert cells[1:4] == ["north", "big, old", "400"]
+    assert cells[5] == "12"
+    assert float(cells[0]) > float(cells[4])
+
+
+def test_bad_rows_report_line_numbers(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("segment,mtpl,casco_basic_100\na,400,900\nb,4OO,900\n")
+    with pytest.raises(ValueError, match="Line 3: mtpl is not a number"):
+        validate_table(str(path))
+
+    path.write_text("segment,mtpl,casco_basic_100\na,400,900\nb,400\n")
+    with pytest.raises(ValueError, match="Line 3: expected 3 fields"):
+        validate_table(str(path))
+
+    # A short row followed by a long one must not cancel out.
+    path.write_text("id,mtpl,casco_basic_100\n1,400\n2,500,900,800\n")
+    with pytest.raises(ValueError, match="Line 2: expected 3 fields, found 2"):
+        validate_table(str(path))
+
+
+def test_blank_lines_keep_line_numbers_and_are_written_back(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("segment,mtpl,casco_basic_100\n\nb,4OO,900\n")
+    with pytest.raises(ValueError, match="Line 3: mtpl is not a number"):
+        validate_table(str(path))
+
+    path.write_bytes(b"segment,mtpl,casco_basic_100\r\n\r\na,400,900\r\n\r\nb,400,900\r\n\r\n")
+    assert validate_table(str(path))[0].tolist() == [0, 0]
+
+    target = tmp_path / "corrected.csv"
+    correct_table(str(path), str(target), chunk_bytes=20)
+    assert target.read_bytes() == path.read_bytes()
+
+
+def test_price_column_outside_the_catalog(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("segment,mtpl,casco_ultra_100\na,400,900\n")
+    with pytest.raises(ValueError, match="not in the catalog: casco_ultra_100"):
+        WideTable(str(path))
+
+
+def test_untiered_market_products_and_key_like_metadata(tmp_path):
+    config = parse_config({
+        "product_order": ["mtpl", "gap", "limited_casco", "casco"],
+        "untiered_products": ["mtpl", "gap"],
+        "reference_prices": {"mtpl": 400, "gap": 500, "limited_casco": 800, "casco": 1200},
+    })
+    rules = compile_rules(config)
+    path = tmp_path / "table.csv"
+    path.write_text("segment_id_2024,mtpl,gap\na,400,300\n")
+
+    table = WideTable(str(path), rules)
+
+    assert [table.columns[column] for column in table.layout.price_columns] == ["mtpl", "gap"]
+    assert validate_table(str(path), rules)[0].tolist() == [len(validate_prices({"mtpl": 400, "gap": 300}, rules))] == [1]
+
+
+def test_duplicate_price_column(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("mtpl,casco_basic_100,mtpl\n400,900,400\n")
+    with pytest.raises(ValueError, match="appears twice"):
+        WideTable(str(path))
+
+
+def test_blank_cells_are_missing(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("mtpl,casco_basic_100,casco_basic_200\n400,,900\n, 800 ,900\n")
+
+    chunk = next(WideTable(str(path)).chunks())
+    rules = compile_rules()
+
+    assert chunk.present[:, rules.slots["mtpl"]].tolist() == [True, False]
+    assert chunk.values[1, rules.slots["casco_basic_100"]] == 800
+    assert validate_table(str(path))[0].tolist() == [0, 1]
@@ -1,4 +1,12 @@
-from pricing.validation import validate_prices
+import pytest
+
+from pricing.validation import (
+    count_violations,
+    find_violations,
+    first_violation,
+    is_valid,
+    validate_prices,
+)
 
 
 def test_mtpl_vs_limited_casco_violation():
@@ -125,4 +133,77 @@ def test_empty_prices():
 def test_only_mtpl():
     prices = {"mtpl": 400}
     issues = validate_prices(prices)
-    assert len(issues) == 0  
\ No newline at end of file
+    assert len(issues) == 0
+
+
+def test_violation_records():
+    prices = {
+        "mtpl": 450,
+        "limited_casco_basic_100": 420,
+        "casco_basic_200": 800,
+        "casco_basic_500": 850,
+    }
+    violations = find_violations(prices)
+
+    assert [violation.rule for violation in violations] == ["hierarchy", "deductible"]
+    assert violations[0].lower_key == "mtpl"
+    assert violations[0].higher_key == "limited_casco_basic_100"
+    assert violations[0].lower_price == 450
+    assert violations[1].lower_key == "casco_basic_500"
+    assert [str(violation) for violation in violations] == validate_prices(prices)
+
+
+def test_count_and_fail_fast_modes():
+    prices = {
+        "mtpl": 450,
+        "limited_casco_basic_100": 420,
+        "limited_casco_basic_200": 450,
+        "casco_basic_100": 400,
+    }
+
+    assert count_violations(prices) == len(validate_prices(prices))
+    assert first_violation(prices).message == validate_prices(prices)[0]
+    assert not is_valid(prices)
+
+
+def test_fail_fast_modes_on_valid_prices():
+    prices = {"mtpl": 400, "limited_casco_basic_100": 700, "casco_basic_100": 900}
+
+    assert count_violations(prices) == 0
+    assert first_violation(prices) is None
+    assert is_valid(prices)
+
+
+def test_missing_middle_tier_policies():
+    prices = {"casco_basic_100": 900, "casco_premium_100": 850}
+
+    assert validate_prices(prices) == []
+    assert validate_prices(prices, missing="nearest") == [
+        "casco 100: basic (900) must be lower than premium (850)",
+    ]
+    violation = first_violation(prices, missing="nearest")
+    assert violation.bridged
+    assert violation.rule == "variant"
+    assert count_violations(prices, missing="nearest") == 1
+
+
+def test_nearest_policy_ignores_partly_present_groups():
+    # mtpl -> limited casco basic 100 -> casco basic 100 are all present, so
+    # mtpl is compared with its neighbour only, not bridged to casco.
+    prices = {
+        "limited_casco_basic_100": 700,
+        "casco_basic_100": 650,
+        "mtpl": 680,
+    }
+
+    assert validate_prices(prices, missing="nearest") == validate_prices(prices)
+
+
+def test_unknown_missing_policy():
+    with pytest.raises(ValueError, match="Unknown missing-slot policy: closest"):
+        validate_prices({}, missing="closest")
+
+
+def test_keys_outside_the_catalog_are_rejected():
+    with pytest.raises(ValueError, match="not in the catalog: limited_casco_basic_1000"):
+        validate_prices({"mtpl": 400, "limited_casco_basic_1000": 300})
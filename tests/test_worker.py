@@ -0,0 +1,159 @@
+import io
+import json
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+import main
+from pricing.stream import analyze_sheet
+from pricing.worker import Worker, WorkerServer
+
+
+PRICES = {"mtpl": 400, "limited_casco_basic_100": 820, "casco_basic_100": 750}
+
+
+def _serve(requests, **kwargs):
+    text = "".join(json.dumps(request) + "\n" for request in requests)
+    outfile = io.StringIO()
+    count = Worker(**kwargs).serve(io.StringIO(text), outfile)
+    return count, [json.loads(line) for line in outfile.getvalue().splitlines()]
+
+
+def test_worker_answers_pipelined_requests_in_order():
+    requests = [
+        {"id": 1, "op": "validate", "prices": PRICES},
+        {"id": "b", "prices": PRICES},
+        {"id": 3, "op": "correct", "prices": PRICES, "strategy": "projection"},
+        {"id": 4, "op": "ping"},
+    ]
+    count, responses = _serve(requests)
+
+    assert count == 4
+    assert [response["id"] for response in responses] == [1, "b", 3, 4]
+    assert responses[0]["issues"] == analyze_sheet(PRICES, correct=False)["issues"]
+    assert "corrected" not in responses[0]
+    assert responses[1]["corrected"] == analyze_sheet(PRICES)["corrected"]
+    assert responses[2]["corrected"] == analyze_sheet(PRICES, strategy="projection")["corrected"]
+    assert responses[3] == {"id": 4, "ok": True}
+
+
+def test_worker_reports_errors_and_keeps_going():
+    outfile = io.StringIO()
+    infile = io.StringIO(
+        "not json\n"
+        + json.dumps({"id": 2, "op": "explode"}) + "\n"
+        + json.dumps({"id": 3, "prices": {"invalid_key": 1}}) + "\n"
+        + "\n"
+        + json.dumps({"id": 4, "op": "stats"}) + "\n"
+    )
+    Worker(cache_size=10).serve(infile, outfile)
+    responses = [json.loads(line) for line in outfile.getvalue().splitlines()]
+
+    assert responses[0]["id"] is None and "error" in responses[0]
+    assert responses[1]["error"] == "Unknown operation: explode"
+    assert "Unexpected key format" in responses[2]["error"]
+    assert responses[3]["requests"] == 4
+    assert responses[3]["errors"] == 3
+    assert responses[3]["cache"]["maxsize"] == 10
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets not available")
+def test_worker_unix_socket(tmp_path):
+    path = str(tmp_path / "worker.sock")
+    server = WorkerServer(path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            stream = client.makefile("rwb")
+            for request_id in range(5):
+                stream.write(json.dumps({"id": request_id, "prices": PRICES}).encode() + b"\n")
+            stream.flush()
+            responses = [json.loads(stream.readline()) for _ in range(5)]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert [response["id"] for response in responses] == list(range(5))
+    assert all(response["issues"] for response in responses)
+    assert not os.path.exists(path)
+
+
+def test_worker_socket_replaces_only_stale_sockets(tmp_path):
+    regular = tmp_path / "results.jsonl"
+    regular.write_text("keep me\n")
+    with pytest.raises(ValueError, match="not a socket"):
+        WorkerServer(str(regular))
+    assert regular.read_text() == "keep me\n"
+
+    stale = str(tmp_path / "stale.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as leftover:
+        leftover.bind(stale)
+    server = WorkerServer(stale)
+    server.server_close()
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets not available")
+def test_worker_socket_leaves_live_servers_alone(tmp_path):
+    path = str(tmp_path / "worker.sock")
+    server = WorkerServer(path)
+    try:
+        with pytest.raises(ValueError, match="server is listening"):
+            WorkerServer(path)
+        assert os.path.exists(path)
+
+        # A server whose socket was replaced does not delete the new one.
+        os.unlink(path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as replacement:
+            replacement.bind(path)
+            server.server_close()
+            assert os.path.exists(path)
+    finally:
+        server.server_close()
+
+
+def test_worker_survives_deeply_nested_requests():
+    outfile = io.StringIO()
+    infile = io.StringIO("[" * 100000 + "\n" + json.dumps({"id": 2, "op": "ping"}) + "\n")
+    count = Worker().serve(infile, outfile)
+    responses = [json.loads(line) for line in outfile.getvalue().splitlines()]
+
+    assert count == 2
+    assert responses[0]["error"].startswith("RecursionError")
+    assert responses[1] == {"id": 2, "ok": True}
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets not available")
+def test_worker_socket_answers_invalid_utf8_and_keeps_going(tmp_path):
+    path = str(tmp_path / "worker.sock")
+    server = WorkerServer(path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            stream = client.makefile("rwb")
+            stream.write(b'{"id": 1, "op": "ping", "note": "\xff"}\n{"id": 2, "op": "ping"}\n')
+            stream.flush()
+            responses = [json.loads(stream.readline()) for _ in range(2)]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert "can't decode byte 0xff" in responses[0]["error"]
+    assert responses[1] == {"id": 2, "ok": True}
+
+
+def test_serve_on_strict_stdin_answers_invalid_utf8(monkeypatch, capsys):
+    stdin = io.TextIOWrapper(io.BytesIO(b'\xff\n{"id": 2, "op": "ping"}\n'), encoding="utf-8", errors="strict")
+    monkeypatch.setattr(sys, "stdin", stdin)
+
+    main.run_worker(main.parse_args(["--serve"]))
+
+    responses = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert "can't decode byte 0xff" in responses[0]["error"]
+    assert responses[1] == {"id": 2, "ok": True}